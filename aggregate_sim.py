@@ -1,36 +1,49 @@
 # aggregate_sim.py
 # Aggregate Queries + Costs 
 
+from aggregation import AggregateSpec
+from cost_engine import CostEngine
+from tracing import traced
+
+
 class AggregateSimulator:
     def __init__(self, nosql_simulator):
         """Connects to the main NoSQLSimulator"""
         self.sim = nosql_simulator
+        self.engine = CostEngine(nosql_simulator)
 
-    def simulate_aggregate(self, collection, shard_key=None):
-        """Simulate aggregate query (group by, sum, count, etc.)"""
-        total_docs = self.sim.stats.get("cardinality", {}).get(collection, 0)
-        
-        if shard_key:
-            docs_scanned = total_docs // self.sim.servers  # Sharded: 1 server
-        else:
-            docs_scanned = total_docs  # Full scan
-        
-        # Output size (aggregates return fewer rows, e.g., groups or top N)
-        output_docs = max(1, docs_scanned // 100)  # e.g. top 100 or groups
-        output_size_gb = (output_docs * 200) / (1024**3)  # rough 200 bytes per row
+    @traced
+    def simulate_aggregate(self, collection, shard_key=None, group_by=None, functions=None, where=None):
+        """
+        Simulate aggregate query (group by, sum, count, etc.)
+        group_by: grouping field or fields; output groups come from their NDV (see selectivity.py),
+        without one the old rough 1% of the scanned documents is kept
+        functions: [(function, field)] aggregates, e.g. [("sum", "quantity")] (default: a count)
+        where: predicate applied before grouping, e.g. ("eq", "IDP", 42)
+        """
+        spec = AggregateSpec(group_by or (), functions or (), where) if functions or where else None
+        if spec is None and group_by is not None and not isinstance(group_by, str):
+            spec = AggregateSpec(group_by)
+        # Partial aggregation per shard, shuffle, merge (see aggregation.py); sharded on the
+        # group key the shards' groups are final
+        cost = self.engine.evaluate_one(collection, "aggregate", shard_key, field=group_by if spec is None else None,
+                                        aggregate=spec)
+        docs_scanned = cost["docs_scanned"]
         
-        time_seconds = docs_scanned * 0.03      # Aggregates medium speed
-        carbon_grams = docs_scanned * 0.0003
-        price_usd = docs_scanned * 0.000003
+        # Output size (aggregates return fewer rows: one per group)
+        output_docs = cost["output_docs"]
+        output_size_gb = cost["output_bytes"] / (1024**3)
         
         return {
             "query_type": "aggregate",
             "collection": collection,
             "sharded": bool(shard_key),
+            "group_by": group_by,
             "docs_scanned": docs_scanned,
             "output_docs": output_docs,
             "output_size_gb": round(output_size_gb, 4),
-            "time_seconds": round(time_seconds, 2),
-            "carbon_grams": round(carbon_grams, 2),
-            "price_usd": round(price_usd, 6)
-        }
\ No newline at end of file
+            "network_gb": round(cost["network_bytes"] / (1024**3), 4),
+            "time_seconds": round(cost["time_seconds"], 2),
+            "carbon_grams": round(cost["carbon_grams"], 2),
+            "price_usd": round(cost["price_usd"], 6)
+        }
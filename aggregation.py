@@ -0,0 +1,263 @@
+# aggregation.py
+# Two-phase distributed aggregation: GROUP BY keys, aggregate functions, pre-filter
+#
+# An aggregation is a spec of group-by keys, aggregate functions and an optional
+# predicate applied before grouping (selectivity.py tuples):
+#   spec = AggregateSpec(["IDC"], [("sum", "quantity"), ("count", None)], where=("range", "date", a, b))
+#   sim.aggregation.cost("OrderLine", shard_key="IDP", spec=spec)
+# On a sharded collection every server runs it in phases:
+#   partial - scan the local documents (index seek when the predicate allows it, see
+#             indexes.py) and fold the matches into a hash table of partial states,
+#             one entry per distinct group key among them (the combiner)
+#   shuffle - send the partial groups to the server owning their group key
+#   merge   - fold the partials received into the final groups
+# and the final groups are gathered on the router (topology.py). When the group
+# keys include the shard key every group lives on one shard: the partials are
+# final, there is no shuffle and no merge. Unsharded collections aggregate in one
+# pass on their node.
+# The combiner is as good as the group key: IDP on OrderLine has ~40 rows per
+# product on a shard, so each shard sends one partial per product; IDC is nearly
+# unique per shard and ships almost every matching row. Partial states are
+# AGGREGATE_BYTES per value (avg keeps a sum and a count); a hash table past the
+# memory budget spills, writing its input to disk and reading it back once
+# (grace hash, as the hash join of join_algorithms.py).
+#
+# Usage: python aggregation.py [--collection OrderLine] [--shard-key IDP] [--group-by IDP IDC ...]
+#                              [--function sum:quantity ...]
+
+import math
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from cost_engine import OPERATOR_COSTS
+from join_algorithms import HASH_ENTRY_OVERHEAD, IO_SECONDS_PER_GB, MEMORY_BUDGET_BYTES, NO_MOVEMENT
+from size_plan import item_properties
+from topology import Topology, combine
+from tracing import note, traced
+
+AGGREGATE_BYTES = 8        # one computed value (count, sum...) per output row
+FUNCTIONS = {              # partial state values kept per group
+    "count": 1,
+    "sum": 1,
+    "min": 1,
+    "max": 1,
+    "avg": 2,              # sum and count, divided at the merge
+}
+
+
+class AggregateSpec:
+    """GROUP BY keys, aggregate functions [(function, field)] and an optional pre-filter predicate"""
+
+    __slots__ = ("group_by", "functions", "where")
+
+    def __init__(self, group_by: Sequence[str] = (), functions: Sequence[Tuple[str, Optional[str]]] = (),
+                 where: Optional[tuple] = None):
+        self.group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+        self.functions = [(name, field) for name, field in functions] or [("count", None)]
+        for name, _ in self.functions:
+            if name not in FUNCTIONS:
+                raise ValueError(f"Unknown aggregate function {name!r} ({', '.join(FUNCTIONS)})")
+        self.where = tuple(where) if where else None
+
+    @classmethod
+    def from_query(cls, query: Dict[str, Any]) -> "AggregateSpec":
+        """Spec of a workload query: group_by (field or list), functions [[name, field]], where"""
+        return cls(query.get("group_by") or (), query.get("functions") or (), query.get("where"))
+
+    @property
+    def state_bytes(self) -> int:
+        """Bytes of the partial states of one group"""
+        return AGGREGATE_BYTES * sum(FUNCTIONS[name] for name, _ in self.functions)
+
+    @property
+    def value_bytes(self) -> int:
+        """Bytes of the final values of one group"""
+        return AGGREGATE_BYTES * len(self.functions)
+
+    def key(self) -> tuple:
+        return tuple(self.group_by), tuple(self.functions), repr(self.where)
+
+    def describe(self) -> str:
+        functions = ", ".join(f"{name}({field or '*'})" for name, field in self.functions)
+        text = f"{functions} by {', '.join(self.group_by) or '(all)'}"
+        return text + (f" where {self.where}" if self.where else "")
+
+
+def two_phase(rows: int, rows_local: int, groups_of: Callable[[int], int], key_bytes: int, state_bytes: int,
+              output_bytes: int, servers: int, partitioned: bool, aligned: bool,
+              topology: Optional[Topology] = None, gather: bool = True) -> Dict[str, Any]:
+    """
+    Phases of aggregating `rows` rows, `rows_local` of them on the busiest server.
+    groups_of(n) is the number of groups among n rows; partitioned = the rows are
+    spread over `servers` (else one node holds them all), aligned = partitioned on
+    one of the group keys. gather adds sending the final groups (output_bytes each)
+    to one node. The partial phase folds rows as they are read, so its CPU is the
+    caller's; usage["cpu_docs"] counts the merge's hash-table updates.
+    """
+    topology = topology or Topology()
+    groups = groups_of(rows)
+    entry = key_bytes + state_bytes + HASH_ENTRY_OVERHEAD
+    moves = []
+    if not partitioned or servers <= 1:
+        strategy, partial_groups, shuffled, merged, final_groups = "single", groups, 0, 0, groups
+    elif aligned:
+        strategy, shuffled, merged = "co-located", 0, 0
+        partial_groups = final_groups = max(1, min(rows_local, math.ceil(groups / servers)))
+    else:
+        strategy = "two-phase"
+        partial_groups = groups_of(rows_local)
+        shuffled = min(rows, groups_of(math.ceil(rows / servers)) * servers)
+        merged = math.ceil(shuffled / servers)
+        final_groups = max(1, math.ceil(groups / servers))
+        moves.append(topology.movement("shuffle", shuffled * (key_bytes + state_bytes), servers))
+    if gather and strategy != "single":
+        moves.append(topology.movement("gather", groups * output_bytes, servers))
+
+    io_bytes = 0
+    if partial_groups * entry > MEMORY_BUDGET_BYTES:
+        io_bytes += 2 * rows_local * (key_bytes + state_bytes)
+    if merged and final_groups * entry > MEMORY_BUDGET_BYTES:
+        io_bytes += 2 * merged * (key_bytes + state_bytes)
+    return {
+        "strategy": strategy,
+        "groups": groups,
+        "partial_groups": partial_groups,
+        "shuffled_rows": shuffled,
+        "merged_rows": merged,
+        "final_groups": final_groups,
+        "usage": {"cpu_docs": merged,
+                  "memory_bytes": min(max(partial_groups, final_groups) * entry, MEMORY_BUDGET_BYTES),
+                  "io_bytes": io_bytes},
+        "movement": combine(moves) if moves else NO_MOVEMENT,
+    }
+
+
+def phase_cost(usage: Dict[str, float], unit_costs: Tuple[float, float, float],
+               movement: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Time / carbon / price of the busiest server's work plus the data movement, charged
+    like the other aggregates of cost_engine.py: network time adds to the latency,
+    the transfer is paid at the movement's own price and carbon
+    """
+    seconds_per_doc, carbon_per_doc, price_per_doc = unit_costs
+    work = usage["cpu_docs"] * seconds_per_doc + usage["io_bytes"] / 1024 ** 3 * IO_SECONDS_PER_GB
+    return {
+        "time_seconds": work + movement["seconds"],
+        "carbon_grams": work * carbon_per_doc / seconds_per_doc + movement["carbon_grams"],
+        "price_usd": work * price_per_doc / seconds_per_doc + movement["price_usd"],
+    }
+
+
+class AggregationModel:
+    def __init__(self, nosql_simulator):
+        """Connects to the main NoSQLSimulator (stats, indexes, sharding, memory, topology)"""
+        self.sim = nosql_simulator
+
+    def has_field(self, collection: str, field: str) -> bool:
+        """Whether a (possibly dotted) field is in the collection's schema, inside objects or array items"""
+        props = self.sim.get_collection_schema(collection)
+        for part in field.split("."):
+            if part not in props:
+                return False
+            spec = props[part]
+            props = spec.get("properties") or item_properties(spec.get("items") or {})
+        return True
+
+    @traced
+    def cost(self, collection: str, group_by: Optional[str] = None, shard_key: Optional[str] = None,
+             servers: Optional[int] = None, spec: Optional[AggregateSpec] = None) -> Dict[str, Any]:
+        """
+        One aggregation of `collection` sharded on `shard_key`: the spec, or a count
+        grouped by `group_by`. Latency and cost are the busiest server's scan and merge
+        plus the shuffle and the final gather
+        """
+        sim = self.sim
+        servers = servers or sim.servers
+        spec = spec or AggregateSpec([group_by] if group_by else [])
+        unknown = [field for _, field in spec.functions if field and not self.has_field(collection, field)]
+        if unknown:
+            raise ValueError(f"Aggregate function fields {unknown} are not in {collection}")
+        keys = spec.group_by
+        card = sim.stats.get("cardinality", {}).get(collection, 0)
+
+        # Partial phase input: the matches of the pre-filter on the busiest server
+        where = spec.where
+        field = where[1] if where and where[0] != "and" else None
+        sel = sim.selectivity.estimate(collection, where) if where else 1.0
+        access = sim.indexes.plan_filter(collection, field, shard_key, servers, sel)
+        read = sim.memory.read_cost(collection, access["docs_examined"], shard_key, servers,
+                                    "point" if access["access_path"] == "index" else "scan")
+        rows = math.ceil(round(card * sel, 6))
+        node_docs = sim.sharding.hot_docs(collection, shard_key, servers) if shard_key else card
+        targeted = bool(shard_key) and field == shard_key and where[0] == "eq"
+        rows_local = min(node_docs, rows) if targeted else math.ceil(round(node_docs * sel, 6))
+
+        key_bytes = sim.compute_fields_size(collection, keys) if keys else 0
+        note(selectivity=sel, rows=rows, rows_local=rows_local, key_bytes=key_bytes, state_bytes=spec.state_bytes)
+        phases = two_phase(rows, rows_local, lambda n: sim.selectivity.group_count(collection, keys, n),
+                           key_bytes, spec.state_bytes, key_bytes + spec.value_bytes, servers,
+                           bool(shard_key) and not targeted, shard_key in keys, sim.topology)
+        usage = dict(phases["usage"])
+        # Folding a document into the partial table is part of scanning it; an index seek folds its matches
+        usage["cpu_docs"] += access["cost_docs"] + read["disk_cost_docs"]
+        if access["access_path"] == "index":
+            usage["cpu_docs"] += rows_local
+        movement = phases["movement"]
+        result = {
+            "collection": collection,
+            "aggregate": spec.describe(),
+            "strategy": phases["strategy"],
+            "access_path": access["access_path"],
+            "docs_scanned": access["docs_examined"],
+            "rows_aggregated": rows_local,
+            "groups": phases["groups"],
+            "partial_groups": phases["partial_groups"],
+            "shuffled_rows": phases["shuffled_rows"],
+            "merged_rows": phases["merged_rows"],
+            "output_docs": phases["final_groups"],
+            "output_bytes": phases["final_groups"] * (key_bytes + spec.value_bytes),
+            "memory_bytes": int(usage["memory_bytes"]),
+            "io_bytes": int(usage["io_bytes"]),
+            "network_bytes": int(movement["bytes_moved"]),
+            "network_seconds": movement["seconds"],
+            "hit_ratio": read["hit_ratio"],
+            "disk_pages": read["disk_pages"],
+            "disk_cost_docs": read["disk_cost_docs"],
+        }
+        result.update(phase_cost(usage, OPERATOR_COSTS["aggregate"], movement))
+        return result
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from main import NoSQLSimulator
+
+    parser = argparse.ArgumentParser(description="Compare group keys of an aggregation on every model")
+    parser.add_argument("--collection", default="OrderLine")
+    parser.add_argument("--shard-key", default="IDP", help="shard key of the collection ('' = unsharded)")
+    parser.add_argument("--group-by", nargs="+", default=["IDP", "IDC"], help="group keys to compare")
+    parser.add_argument("--function", nargs="+", default=["count"], help="aggregates, e.g. count sum:quantity")
+    args = parser.parse_args()
+
+    functions = [tuple(f.split(":")) if ":" in f else (f, None) for f in args.function]
+    schemas_folder = "schemas"
+    db_files = sorted(f for f in os.listdir(schemas_folder) if f.startswith("db") and f.endswith(".json"))
+    print(f"AGGREGATION: {AggregateSpec((), functions).describe().split(' by ')[0]} on {args.collection}, "
+          f"sharded on {args.shard_key or '(unsharded)'}")
+    print(f"{'Model':<6}{'Group by':<10}{'Strategy':<12}{'Partial groups':>16}{'Shuffled rows':>18}"
+          f"{'Network GB':>12}{'Table MB':>10}{'Spill GB':>10}{'Time (s)':>18}{'Price ($)':>16}")
+    for db_file in db_files:
+        sim = NoSQLSimulator(os.path.join(schemas_folder, db_file), "stats.json", "indexes.json")
+        fields = sim.get_collection_schema(args.collection)
+        if not fields:
+            continue
+        for key in args.group_by:
+            if key not in fields:
+                continue
+            report = sim.aggregation.cost(args.collection, shard_key=args.shard_key or None,
+                                          spec=AggregateSpec([key], functions))
+            print(f"{db_file[:-5].upper():<6}{key:<10}{report['strategy']:<12}{report['partial_groups']:>16,}"
+                  f"{report['shuffled_rows']:>18,}{report['network_bytes'] / 1024 ** 3:>12,.2f}"
+                  f"{report['memory_bytes'] / 1024 ** 2:>10,.1f}{report['io_bytes'] / 1024 ** 3:>10,.2f}"
+                  f"{report['time_seconds']:>18,.2f}{report['price_usd']:>16,.6f}")
@@ -0,0 +1,307 @@
+# benchmark.py
+# Throughput benchmarks of the simulator: scenarios per second of sizing, sharding and every operator
+#
+# Each benchmark runs a fixed set of scenarios on a set of models:
+#   db1-db5    the five schemas of the challenge
+#   generated  one generated model of --collections collections nested --depth
+#              levels deep (objects and arrays at every level, see generate_model)
+# The operator benchmarks run at the models' own server count; servers_sweep runs
+# every operator's scenarios again at each of SWEEP_SERVERS servers (the engine
+# batches them but costs every server count on its own, see cost_engine.py).
+# Each benchmark reports the best of --repeat runs. The caches keyed on inputs (sharding
+# reports, hit ratios) are cleared before every run, so a run computes what a new
+# scenario would; compression calibrations (storage.py) are one-off per collection
+# and stay warm. Every result carries a checksum of every output column the
+# scenarios computed (numbers: their sum, labels such as the join algorithm: a
+# CRC-32): the same checksums prove a faster simulator still gives the same
+# answers (tests/test_snapshots.py checks the DB1–DB5 outputs field by field).
+#
+# Results are JSON (--output): one record per (benchmark, model set) with the
+# commit they were measured on, so runs on two commits can be compared:
+#   python benchmark.py --output base.json              (on the base commit)
+#   python benchmark.py --compare base.json             (on the new one)
+# --compare exits with status 1 when a checksum changed or a benchmark got slower
+# than --tolerance.
+#
+# Usage: python benchmark.py [--repeat 3] [--collections 300] [--depth 4] [--output bench.json] [--compare base.json]
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import memory
+import sharding
+from cost_engine import CostEngine, np
+from main import NoSQLSimulator
+
+FORMAT_VERSION = 2
+OPERATORS = ("filter", "join", "aggregate", "write")
+SWEEP_SERVERS = (10, 100, 1000, 10000)
+
+
+def generate_model(collections: int = 300, depth: int = 4, fields: int = 6,
+                   seed: int = 0) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    A large synthetic model → (schemas, stats). Collection i has its own ID field,
+    a reference to a parent collection, `fields` scalar fields and an object and an
+    array at every nesting level down to `depth`.
+    """
+    rng = random.Random(seed)
+    types = ("integer", "number", "string", "date", "longstring")
+
+    def level(d: int) -> Dict[str, Any]:
+        props: Dict[str, Any] = {f"f{d}_{k}": {"type": rng.choice(types)} for k in range(fields)}
+        if d < depth:
+            props["detail"] = {"type": "object", "properties": level(d + 1)}
+            props["lines"] = {"type": "array", "items": {"properties": level(d + 1)}}
+        return props
+
+    def array_paths(props: Dict[str, Any], path: str) -> List[str]:
+        found = []
+        for name, spec in props.items():
+            field = f"{path}.{name}" if path else name
+            if spec["type"] == "object":
+                found += array_paths(spec["properties"], field)
+            elif spec["type"] == "array":
+                found += [field] + array_paths(spec["items"]["properties"], field)
+        return found
+
+    schemas = []
+    stats: Dict[str, Any] = {"cardinality": {}, "distinct": {}, "avg": {}}
+    for i in range(collections):
+        name = f"C{i}"
+        props = {f"ID{i}": {"type": "integer"}}
+        parent = (i - 1) // 4 if i else None
+        if parent is not None:
+            props[f"ID{parent}"] = {"type": "integer"}
+        props.update(level(1))
+        schemas.append({"collection": name, "properties": props})
+        card = 10 ** rng.randint(3, 8)
+        stats["cardinality"][name] = card
+        stats["distinct"][name] = {f"ID{i}": card}
+        if parent is not None:
+            stats["distinct"][name][f"ID{parent}"] = max(1, card // 10)
+        stats["avg"][name] = {path: rng.choice((1, 2, 3)) for path in array_paths(props, "")}
+    return schemas, stats
+
+
+def id_fields(sim, collection: str) -> List[str]:
+    return [f for f in sim.get_collection_schema(collection) if f.startswith("ID")]
+
+
+def scenarios(sims: List[Any], operator: str) -> Dict[str, list]:
+    """CostEngine.evaluate arguments of every scenario of one operator on the models"""
+    columns: Dict[str, list] = {"collections": [], "operators": [], "shard_keys": [], "models": [],
+                                "others": [], "fields": [], "changes": []}
+
+    def add(m, collection, op, key=None, other=None, field=None, changes=None):
+        for column, value in zip(columns, (collection, op, key, m, other, field, changes)):
+            columns[column].append(value)
+
+    for m, sim in enumerate(sims):
+        for collection in sim.collections:
+            keys = id_fields(sim, collection)
+            if operator == "filter":
+                add(m, collection, "filter")
+                for key in keys:
+                    add(m, collection, "filter", key)
+                    add(m, collection, "filter", None, field=key)
+            elif operator == "join":
+                for other in sim.collections:
+                    shared = [k for k in keys if k in sim.get_collection_schema(other)]
+                    if other != collection and shared:
+                        add(m, collection, "join", shared[0], other)
+            elif operator == "aggregate":
+                for key in keys:
+                    add(m, collection, "aggregate", key, field=key)
+                    add(m, collection, "aggregate", None, field=key)
+            elif keys:
+                changed = [f for f in sim.get_collection_schema(collection) if not f.startswith("ID")][:1]
+                add(m, collection, "insert", keys[0])
+                add(m, collection, "update", keys[0], field=keys[0], changes=changed or None)
+                add(m, collection, "delete", keys[0], field=keys[0])
+    return columns
+
+
+def clear_caches() -> None:
+    """Forget the results cached on their inputs (layout reports, hit ratios)"""
+    sharding._cached_report.cache_clear()
+    memory._hit_ratio.cache_clear()
+
+
+def _doc_size(sims):
+    return {"doc_bytes": [sim.compute_doc_size(c) for sim in sims for c in sim.collections]}
+
+
+def _database_size(sims):
+    return {"database_gb": [sim.database_size_gb() for sim in sims]}
+
+
+def _sharding(sims):
+    reports = [sim.sharding_stats(c, key, scheme)
+               for sim in sims for c in sim.collections for key in id_fields(sim, c)
+               for scheme in (sharding.HASH, sharding.RANGE)]
+    return {field: [report[field] for report in reports] for field in (reports[0] if reports else {})}
+
+
+def _costs(sims, batch):
+    """Every output column of the engine, as plain Python values"""
+    return {column: [v.item() if hasattr(v, "item") else v for v in values]
+            for column, values in CostEngine(sims).evaluate(**batch).items()}
+
+
+def _operator(operator: str) -> Callable:
+    def run(sims):
+        return _costs(sims, scenarios(sims, operator))
+    return run
+
+
+def _servers_sweep(sims):
+    batch: Dict[str, list] = {}
+    for operator in OPERATORS:
+        one = scenarios(sims, operator)
+        for servers in SWEEP_SERVERS:
+            for column, values in one.items():
+                batch.setdefault(column, []).extend(values)
+            batch.setdefault("servers", []).extend([servers] * len(one["collections"]))
+    return _costs(sims, batch)
+
+
+BENCHMARKS: Dict[str, Callable[[List[Any]], Dict[str, list]]] = {
+    "doc_size": _doc_size,
+    "database_size": _database_size,
+    "sharding_stats": _sharding,
+    **{op: _operator(op) for op in OPERATORS},
+    "servers_sweep": _servers_sweep,
+}
+
+
+def checksum(columns: Dict[str, list]) -> Dict[str, Any]:
+    """
+    Per output column: the sum of its numbers rounded to 9 significant digits (None
+    counts 0, summation order stays fixed), or a CRC-32 of its labels
+    """
+    sums: Dict[str, Any] = {}
+    for column, values in columns.items():
+        if any(isinstance(v, str) for v in values):
+            sums[column] = zlib.crc32("\n".join(map(str, values)).encode())
+        else:
+            sums[column] = float(f"{math.fsum(v or 0 for v in values):.9g}")
+    return sums
+
+
+def digest(sums: Dict[str, Any]) -> str:
+    """Short form of a result's checksums for the table"""
+    return f"{zlib.crc32(json.dumps(sums, sort_keys=True).encode()):08x}"
+
+
+def run(sims: List[Any], model_set: str, repeat: int = 3,
+        only: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """One record per benchmark: scenarios, best seconds, scenarios per second, checksum of every column"""
+    records = []
+    for name, bench in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        best, outputs = math.inf, {}
+        for _ in range(repeat):
+            clear_caches()
+            started = time.perf_counter()
+            outputs = bench(sims)
+            best = min(best, time.perf_counter() - started)
+        count = len(next(iter(outputs.values()), []))
+        records.append({
+            "benchmark": name,
+            "models": model_set,
+            "scenarios": count,
+            "seconds": round(best, 6),
+            "scenarios_per_second": round(count / best, 2) if best else None,
+            "checksum": checksum(outputs),
+        })
+    return records
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np is not None,
+            "machine": platform.machine(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(base: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Per benchmark: base and current rate, their ratio, whether the checksum or the speed regressed"""
+    before = {(r["benchmark"], r["models"]): r for r in base["results"]}
+    rows = []
+    for r in current["results"]:
+        b = before.get((r["benchmark"], r["models"]))
+        if b is None:
+            continue
+        ratio = r["scenarios_per_second"] / b["scenarios_per_second"] if b["scenarios_per_second"] else None
+        # Results of another FORMAT_VERSION (a single checksum) never compare as the same
+        same = (isinstance(b["checksum"], dict) and b["checksum"].keys() == r["checksum"].keys()
+                and r["scenarios"] == b["scenarios"]
+                and all(math.isclose(v, b["checksum"][k], rel_tol=1e-9) for k, v in r["checksum"].items()))
+        rows.append({"benchmark": r["benchmark"], "models": r["models"],
+                     "base": b["scenarios_per_second"], "current": r["scenarios_per_second"], "ratio": ratio,
+                     "same_results": same, "slower": ratio is not None and ratio < 1 - tolerance})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scenarios per second of the simulator, comparable across commits")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark (the best one counts)")
+    parser.add_argument("--collections", type=int, default=300, help="collections of the generated model")
+    parser.add_argument("--depth", type=int, default=4, help="nesting depth of the generated model")
+    parser.add_argument("--only", nargs="*", choices=list(BENCHMARKS), help="run these benchmarks only")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--compare", help="results JSON of a base commit to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="slowdown allowed by --compare")
+    args = parser.parse_args()
+
+    schemas_folder = "schemas"
+    db_files = sorted(f for f in os.listdir(schemas_folder) if f.startswith("db") and f.endswith(".json"))
+    sims = [NoSQLSimulator(os.path.join(schemas_folder, f), "stats.json", "indexes.json") for f in db_files]
+    generated = NoSQLSimulator.from_data(*generate_model(args.collections, args.depth))
+
+    result = {"version": FORMAT_VERSION, **environment(), "results": []}
+    result["results"] += run(sims, "db1-db5", args.repeat, args.only)
+    result["results"] += run([generated], f"generated-{args.collections}x{args.depth}", args.repeat, args.only)
+
+    print(f"BENCHMARK: commit {result['commit']}, Python {result['python']}, "
+          f"NumPy {'on' if result['numpy'] else 'off'}, best of {args.repeat}")
+    print(f"{'Benchmark':<16}{'Models':<20}{'Scenarios':>10}{'Seconds':>12}{'Scenarios/s':>16}{'Checksum':>20}")
+    for r in result["results"]:
+        print(f"{r['benchmark']:<16}{r['models']:<20}{r['scenarios']:>10,}{r['seconds']:>12.4f}"
+              f"{r['scenarios_per_second'] or 0:>16,.1f}{digest(r['checksum']):>20}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+        rows = compare(base, result, args.tolerance)
+        print(f"\nCOMPARED WITH {base.get('commit')} (slower than {1 - args.tolerance:.0%} of the base rate fails)")
+        print(f"{'Benchmark':<16}{'Models':<20}{'Base /s':>14}{'Now /s':>14}{'Ratio':>8}  Results")
+        for c in rows:
+            ratio = f"{c['ratio']:.2f}" if c["ratio"] is not None else "-"
+            print(f"{c['benchmark']:<16}{c['models']:<20}{c['base'] or 0:>14,.1f}{c['current'] or 0:>14,.1f}"
+                  f"{ratio:>8}  {'same' if c['same_results'] else 'CHANGED'}{'  SLOWER' if c['slower'] else ''}")
+        if any(not c["same_results"] or c["slower"] for c in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,9 @@
 from main import NoSQLSimulator
-from query_sim import QuerySimulator
-import os
+from query_plan import QueryPlanner, Scan, Filter, Project, Join, format_explain
 
 # Load DB1 (the best model) for the challenge
-sim = NoSQLSimulator("schemas/db1.json", "stats.json")
-qs = QuerySimulator(sim)
+sim = NoSQLSimulator("schemas/db1.json", "stats.json", "indexes.json")
+planner = QueryPlanner(sim, shard_keys={"OrderLine": "IDC"})
 
 print("QUERY COST CALCULATION")
 print("Using DB1 model \n")
@@ -12,53 +11,42 @@ print("Using DB1 model \n")
 #  Filter on category = 'smartphone' 
 print("Query 1: SELECT description FROM Product WHERE categorie = 'smartphone'")
 
-# Filter on Product collection
-# Assume category is NOT the shard key → without sharding (worst case)
-filter_q1 = qs.filter_without_sharding("Product")
-
-# But if we had a shard key on category (low cardinality), it would be bad anyway
-print("  Result (without sharding):")
-print(f"    Docs scanned: {filter_q1['docs_scanned']:,}")
-print(f"    Estimated time: {filter_q1['time_seconds']:,} seconds")
-print(f"    Carbon footprint: {filter_q1['carbon_grams']:,} g CO₂")
-print(f"    Estimated price: ${filter_q1['price_usd']:.4f}")
-
-# Output size (rough: 5% of products have category 'smartphone')
-output_docs_q1 = int(filter_q1['docs_scanned'] * 0.05)
-output_size_gb_q1 = (output_docs_q1 * 200) / (1024**3)  # ~200 bytes per output row
-print(f"    Output documents: ~{output_docs_q1:,}")
-print(f"    Output size: ~{output_size_gb_q1:.4f} GB\n")
+# Query plans (see query_plan.py): row counts, widths and costs are propagated
+# through the operator tree instead of being summed by hand.
+# Category is NOT the shard key → without sharding (worst case); the share of
+# smartphones comes from the categories MCV list in stats.json (selectivity.py)
+q1 = planner.explain(Project(Filter(Scan("Product"), "categories", "smartphone"), ["description"]))
+filter_q1 = q1["operators"][1]
+
+print(f"  Result (without sharding, access path: {filter_q1['access_path']}):")
+print(f"    Docs scanned: {q1['docs_scanned']:,}")
+print(f"    Estimated time: {q1['time_seconds']:,} seconds")
+print(f"    Carbon footprint: {q1['carbon_grams']:,} g CO₂")
+print(f"    Estimated price: ${q1['price_usd']:.4f}")
+print(f"    Output documents: ~{q1['rows']:,} ({q1['width']} bytes each)")
+print(f"    Output size: ~{q1['output_size_gb']:.4f} GB\n")
 
 # QUERY 2: Join OrderLine + Product + filters 
 print("Query 2: SELECT ol.quantity, p.price FROM OrderLine ol JOIN Product p ON ol.IDP = p.IDP")
 print("         WHERE p.brand = 'Apple' AND ol.IDC = 125")
 
-# Step 1: Filter Product on brand = 'Apple' (without sharding, since brand has low cardinality)
-filter_product = qs.filter_without_sharding("Product")  # ~5,000 products for brand Apple (5%)
-
-# Step 2: Join filtered Product with OrderLine on IDP (with sharding on IDP)
-join_q2 = qs.join_with_sharding("OrderLine", "Product", "IDP")
-
-# Step 3: Filter OrderLine on IDC = 125 (with sharding on IDC)
-filter_orderline = qs.filter_with_sharding("OrderLine", "IDC")
-
-# Total scanned = join scanned + filter scanned
-total_scanned_q2 = join_q2['docs_scanned'] + filter_orderline['docs_scanned']
-total_time = join_q2['time_seconds'] + filter_orderline['time_seconds']
-total_carbon = join_q2['carbon_grams'] + filter_orderline['carbon_grams']
-total_price = join_q2['price_usd'] + filter_orderline['price_usd']
-
-print("  Result (with sharding on IDP & IDC):")
-print(f"    Docs scanned (join + filter): {total_scanned_q2:,}")
-print(f"    Estimated time: {total_time:,.0f} seconds")
-print(f"    Carbon footprint: {total_carbon:,.0f} g CO₂")
-print(f"    Estimated price: ${total_price:.4f}")
-
-# Output size (rough: 1% of OrderLines match the filters)
-output_docs_q2 = int(4100000000 * 0.01)  # ~41 million
-output_size_gb_q2 = (output_docs_q2 * 150) / (1024**3)  # ~150 bytes per joined row
-print(f"    Output documents: ~{output_docs_q2:,}")
-print(f"    Output size: ~{output_size_gb_q2:.4f} GB")
+# Written as in SQL (filters above the join); the planner pushes brand = 'Apple'
+# down to Product (brand index) and IDC = 125 down to OrderLine (sharded on IDC)
+q2 = planner.explain(Project(Filter(Filter(Join(Scan("OrderLine"), Scan("Product"), "IDP"),
+                                           "brand", "Apple"), "IDC", 125), ["quantity", "price"]))
+
+print("  Result (OrderLine sharded on IDC, filters pushed down):")
+print("    Plan:")
+print("\n".join("      " + line for line in q2["plan"].tree().splitlines()))
+print(f"    Docs scanned (filters + join): {q2['docs_scanned']:,}")
+print(f"    Estimated time: {q2['time_seconds']:,.0f} seconds")
+print(f"    Carbon footprint: {q2['carbon_grams']:,.0f} g CO₂")
+print(f"    Estimated price: ${q2['price_usd']:.4f}")
+print(f"    Output documents: ~{q2['rows']:,} ({q2['width']} bytes each)")
+print(f"    Output size: ~{q2['output_size_gb']:.4f} GB\n")
+
+print("  Cost per operator:")
+print(format_explain(q2))
 
 print("\n" + "="*80)
 print(" Costs estimated ")
@@ -0,0 +1,283 @@
+# cluster_sim.py
+# Discrete-event simulation of a weighted workload on the cluster: queues, tail latency, saturation
+#
+# Every other cost in the project is one query on an idle cluster. Here the
+# queries of a workload file (workload.py) arrive as Poisson streams and queue
+# on the servers they touch:
+#   - a targeted query (filter on the shard key) goes to one server, picked in
+#     proportion to the documents it holds (hot shards get hot keys' traffic)
+#   - other sharded work runs on every server holding documents, and finishes
+#     with its slowest server (fork-join)
+#   - unsharded work runs on the primary server (server 0)
+# With replica sets (placement.py) every server is `replication_factor` members,
+# each with its own queues: a read runs on one member taking reads (picked at
+# random among placement.serving_members), a write on every member and finishes
+# with the slowest one.
+# Each server has a FIFO CPU queue followed by a FIFO disk queue. CPU service is
+# the cost engine's time without its disk reads (disk_seconds, in base-document
+# equivalents as in workload.py), scaled by the server's share of the hottest
+# shard; disk service is the bytes read from disk (documents scanned × stored
+# size, see storage.py, or one page per index fetch, times the share missing
+# from the cache, see memory.py) plus the bytes a write rewrites, at
+# DISK_BYTES_PER_SECOND.
+#
+# Arrival streams are merged with a heap; with FIFO queues a task's completion
+# follows from its arrival and the server's previous completion, so the loop
+# keeps two floats per server and no per-query objects. A million queries take
+# under a second per model (simulation_seconds of the report).
+#
+# Usage: python cluster_sim.py [--workload workload.json] [--queries 1000000] [--load 0.8] [--scale X]
+#   --load   offered load as a fraction of the saturation point (default 0.8)
+#   --scale  run the workload's own rates × X instead
+
+import argparse
+import bisect
+import heapq
+import math
+import os
+import random
+import time
+from array import array
+from typing import Any, Dict, Iterator, List, Optional
+
+from cost_engine import WRITE_OPERATORS
+from join_algorithms import PAGE_BYTES
+from workload import WorkloadEvaluator, load_workload, per_hour
+
+DISK_BYTES_PER_SECOND = 500 * 1024 ** 2    # sequential read of one server's SSD
+PERCENTILES = (50, 95, 99)
+WARMUP = 0.1                               # share of the first queries left out of the percentiles
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    """Nearest-rank percentile of a sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class QueryClass:
+    """One workload query on one model: arrival rate, the servers it touches and their service times"""
+
+    __slots__ = ("name", "rate", "slo", "targeted", "servers", "cumulative", "cpu", "disk", "members", "replicated")
+
+    def __init__(self, name: str, rate: float, slo: Optional[float], targeted: bool,
+                 servers: List[int], weights: List[float], cpu: List[float], disk: List[float],
+                 members: List[int] = (0,), replicated: bool = False):
+        self.name = name
+        self.rate = rate              # arrivals per second
+        self.slo = slo
+        self.targeted = targeted      # one server per query (chosen by weight) or all of `servers`
+        self.servers = servers
+        self.cumulative = list(_accumulate(weights))
+        self.cpu = cpu
+        self.disk = disk
+        self.members = list(members)   # queue offsets of the replica members serving it (member × servers)
+        self.replicated = replicated   # runs on every one of `members` (writes) or on one of them (reads)
+
+    def route_share(self, k: int) -> float:
+        """Share of this class's queries served by servers[k]"""
+        if not self.targeted:
+            return 1.0
+        total = self.cumulative[-1]
+        return (self.cumulative[k] - (self.cumulative[k - 1] if k else 0.0)) / total if total else 0.0
+
+
+def _accumulate(values):
+    total = 0.0
+    for v in values:
+        total += v
+        yield total
+
+
+class ClusterSimulator:
+    def __init__(self, simulators: List[Any], names: List[str]):
+        """One NoSQLSimulator per model, with its display name (DB1...)"""
+        self.evaluator = WorkloadEvaluator(simulators, names)
+        self.sims = simulators
+        self.names = names
+
+    def query_classes(self, workload: Dict[str, Any]) -> Dict[int, List[QueryClass]]:
+        """Query classes of every model at the workload's own rates"""
+        scenarios, costs = self.evaluator.costed(workload)
+        classes: Dict[int, List[QueryClass]] = {}
+        layouts = {}
+        for i, (m, query, s) in enumerate(scenarios):
+            sim = self.sims[m]
+            write = s["operator"] in WRITE_OPERATORS
+            members = range(sim.placement.replication_factor) if write else sim.placement.serving_members()
+            # Disk reads go to the disk queue below, the rest of the engine's time is CPU
+            cpu_time = (float(costs["time_seconds"][i]) - costs["disk_seconds"][i]) * s["size_factor"]
+            docs = int(costs["docs_scanned"][i])
+            per_doc = (PAGE_BYTES if costs["access_path"][i] == "index"
+                       else sim.storage.stored_doc_size(s["collection"]))
+            hit = costs["cache_hit_ratio"][i]
+            read = docs * per_doc * (1 - hit if hit is not None else 1)
+            disk_time = (read + int(costs["bytes_written"][i])) / DISK_BYTES_PER_SECOND
+            key = s["shard_key"]
+            if key:
+                memo = (m, s["collection"], key)
+                if memo not in layouts:
+                    layouts[memo] = sim.sharding.layout(s["collection"], key)
+                loads = layouts[memo]
+                servers = [srv for srv, load in enumerate(loads) if load > 0]
+                hottest = max(loads)
+                shares = [loads[srv] / hottest for srv in servers]
+            else:
+                servers, shares = [0], [1.0]
+            classes.setdefault(m, []).append(QueryClass(
+                query.get("name", f"query{i}"), per_hour(query) / 3600, query.get("slo_seconds"),
+                bool(key) and self.evaluator._servers_touched(m, s) == 1, servers, shares,
+                [cpu_time * share for share in shares], [disk_time * share for share in shares],
+                [member * sim.servers for member in members], write))
+        return classes
+
+    @staticmethod
+    def saturation(classes: List[QueryClass], servers: int, replicas: int = 1) -> Dict[str, Any]:
+        """
+        Utilization of the busiest server's CPU and disk at the classes' rates; the
+        rates can grow by 1 / utilization before that server's queue never drains.
+        Queues are per replica member: `servers` × `replicas` of them
+        """
+        queues = servers * replicas
+        cpu_util = [0.0] * queues
+        disk_util = [0.0] * queues
+        for c in classes:
+            spread = 1.0 if c.replicated else 1 / len(c.members)
+            for k, srv in enumerate(c.servers):
+                share = c.route_share(k) * c.rate * spread
+                for offset in c.members:
+                    cpu_util[srv + offset] += share * c.cpu[k]
+                    disk_util[srv + offset] += share * c.disk[k]
+        busiest = max(range(queues), key=lambda q: max(cpu_util[q], disk_util[q]))
+        utilization = max(cpu_util[busiest], disk_util[busiest])
+        member = f" member {busiest // servers}" if replicas > 1 else ""
+        return {
+            "utilization": utilization,
+            "bottleneck": f"server {busiest % servers}{member} "
+                          f"{'cpu' if cpu_util[busiest] >= disk_util[busiest] else 'disk'}",
+            "saturation_factor": 1 / utilization if utilization else math.inf,
+        }
+
+    @staticmethod
+    def simulate(classes: List[QueryClass], servers: int, queries: int, seed: int = 0,
+                 replicas: int = 1) -> Dict[str, Any]:
+        """Run `queries` arrivals through the per-member FIFO queues; latencies per class"""
+        rng = random.Random(seed)
+        expovariate, uniform = rng.expovariate, rng.random
+        queues = servers * replicas
+        cpu_free = [0.0] * queues
+        disk_free = [0.0] * queues
+        busy = [0.0] * queues
+        latencies = [array('d') for _ in classes]
+        heap = [(expovariate(c.rate), i) for i, c in enumerate(classes) if c.rate > 0]
+        heapq.heapify(heap)
+        last_done = now = 0.0
+        for _ in range(queries if heap else 0):
+            now, i = heap[0]
+            c = classes[i]
+            heapq.heapreplace(heap, (now + expovariate(c.rate), i))
+            if c.targeted:
+                k = bisect.bisect_left(c.cumulative, uniform() * c.cumulative[-1])
+                tasks = ((c.servers[k], c.cpu[k], c.disk[k]),)
+            else:
+                tasks = zip(c.servers, c.cpu, c.disk)
+            members = c.members
+            if c.replicated:
+                tasks = [(srv + offset, cpu, disk) for srv, cpu, disk in tasks for offset in members]
+            elif len(members) > 1:
+                offset = members[int(uniform() * len(members))]
+                tasks = [(srv + offset, cpu, disk) for srv, cpu, disk in tasks]
+            elif members[0]:
+                tasks = [(srv + members[0], cpu, disk) for srv, cpu, disk in tasks]
+            finish = now
+            for srv, cpu, disk in tasks:
+                start = cpu_free[srv]
+                if start < now:
+                    start = now
+                cpu_free[srv] = start = start + cpu
+                busy[srv] += cpu
+                done = disk_free[srv]
+                if done < start:
+                    done = start
+                disk_free[srv] = done = done + disk
+                if done > finish:
+                    finish = done
+            latencies[i].append(finish - now)
+            if finish > last_done:
+                last_done = finish
+        return {"latencies": latencies, "last_arrival": now, "last_done": last_done,
+                "max_cpu_busy": max(busy) if busy else 0.0}
+
+    def run(self, workload: Dict[str, Any], queries: int = 1_000_000, load: float = 0.8,
+            scale: Optional[float] = None, seed: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        One report per model. Rates are the workload's × `scale`, or scaled so the
+        busiest server runs at `load` of its capacity (load 1.0 = saturation point).
+        """
+        for m, classes in self.query_classes(workload).items():
+            servers = self.sims[m].servers
+            replicas = self.sims[m].placement.replication_factor
+            sat = self.saturation(classes, servers, replicas)
+            factor = scale if scale is not None else load * sat["saturation_factor"]
+            for c in classes:
+                c.rate *= factor
+            offered = sum(c.rate for c in classes)
+            started = time.perf_counter()
+            result = self.simulate(classes, servers, queries, seed, replicas)
+            elapsed = time.perf_counter() - started
+
+            every: List[float] = []
+            per_query = {}
+            for c, lat in zip(classes, result["latencies"]):
+                kept = sorted(lat[int(len(lat) * WARMUP):])
+                every.extend(kept)
+                per_query[c.name] = {"count": len(lat), "slo_seconds": c.slo,
+                                     **{f"p{p}": round(percentile(kept, p), 4) for p in PERCENTILES}}
+            every.sort()
+            span = max(result["last_done"], result["last_arrival"])
+            yield {
+                "model": self.names[m],
+                "queries": queries,
+                "rate_factor": factor,
+                "offered_qps": round(offered, 4),
+                "throughput_qps": round(queries / span, 4) if span else 0.0,
+                "saturation_qps": round(offered / factor * sat["saturation_factor"], 4) if factor else 0.0,
+                "bottleneck": sat["bottleneck"],
+                "max_cpu_utilization": round(result["max_cpu_busy"] / span, 4) if span else 0.0,
+                **{f"p{p}": round(percentile(every, p), 4) for p in PERCENTILES},
+                "slo_misses": sum(1 for c in classes if c.slo is not None and per_query[c.name]["p99"] > c.slo),
+                "per_query": per_query,
+                "simulation_seconds": round(elapsed, 2),
+            }
+
+
+if __name__ == "__main__":
+    from main import NoSQLSimulator
+
+    parser = argparse.ArgumentParser(description="Simulate a weighted workload under load on every model")
+    parser.add_argument("--workload", default="workload.json", help="weighted workload file")
+    parser.add_argument("--queries", type=int, default=1_000_000, help="queries to simulate per model")
+    parser.add_argument("--load", type=float, default=0.8, help="offered load as a fraction of saturation")
+    parser.add_argument("--scale", type=float, help="use the workload's rates × SCALE instead of --load")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    schemas_folder = "schemas"
+    db_files = sorted(f for f in os.listdir(schemas_folder) if f.startswith("db") and f.endswith(".json"))
+    names = [f.replace('.json', '').upper() for f in db_files]
+    sims = [NoSQLSimulator(os.path.join(schemas_folder, f), "stats.json", "indexes.json") for f in db_files]
+    workload = load_workload(args.workload)
+
+    print(f"CLUSTER SIMULATION: {workload.get('name', args.workload)}, {args.queries:,} queries per model, "
+          + (f"workload rates × {args.scale:g}" if args.scale is not None else f"{args.load:.0%} of saturation"))
+    print(f"{'Model':<6}{'Offered q/s':>14}{'Done q/s':>14}{'Saturation q/s':>16}{'CPU max':>9}"
+          f"{'p50 (s)':>20}{'p95 (s)':>20}{'p99 (s)':>20}{'SLO miss':>10}  Bottleneck")
+    for report in ClusterSimulator(sims, names).run(workload, args.queries, args.load, args.scale, args.seed):
+        print(f"{report['model']:<6}{report['offered_qps']:>14,.4f}{report['throughput_qps']:>14,.4f}"
+              f"{report['saturation_qps']:>16,.4f}{report['max_cpu_utilization']:>9.0%}"
+              f"{report['p50']:>20,.2f}{report['p95']:>20,.2f}{report['p99']:>20,.2f}{report['slo_misses']:>10}"
+              f"  {report['bottleneck']} ({report['simulation_seconds']:.1f}s)")
+        for name, q in report["per_query"].items():
+            print(f"      {name:<28}{q['count']:>10,}  p50 {q['p50']:>20,.2f}  p95 {q['p95']:>20,.2f}"
+                  f"  p99 {q['p99']:>20,.2f}")
@@ -0,0 +1,132 @@
+# cost_client.py
+# Lightweight client of the local cost service (cost_service.py)
+#
+# Standard library only: planning tools import this module, not the simulator.
+# Requests are JSON objects with an "op" and the model's "schema" (a path, or a
+# name such as "db1" for schemas/db1.json), sent in batches over one connection:
+#   client = CostClient()
+#   results = client.batch([
+#       {"op": "size", "schema": "db1", "collection": "Stock"},
+#       {"op": "shard", "schema": "db1", "collection": "Stock", "shard_key": "IDW"},
+#       {"op": "filter", "schema": "db1", "collection": "Stock", "shard_key": "IDP", "field": "IDP"},
+#       {"op": "join", "schema": "db1", "collection": "OrderLine", "other": "Product", "shard_key": "IDP"},
+#       {"op": "aggregate", "schema": "db1", "collection": "OrderLine", "shard_key": "IDP",
+#        "group_by": ["IDC"], "functions": [["sum", "quantity"]]},
+#   ])
+# Every result is the cost dict of the matching request, or {"error": message}
+# when that request alone failed. The wire format is one JSON line per batch each
+# way: {"requests": [...]} → {"results": [...]}.
+#
+# Usage: python cost_client.py '{"op": "filter", "schema": "db1", "collection": "Stock", "shard_key": "IDP"}' ...
+
+import json
+import os
+import socket
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "nosql-cost.sock")
+OPERATIONS = ("size", "shard", "filter", "join", "aggregate", "status")
+
+
+class CostServiceError(RuntimeError):
+    """The service refused a whole batch (malformed message) or could not be reached"""
+
+
+class CostClient:
+    def __init__(self, path: str = DEFAULT_SOCKET, host: Optional[str] = None, port: Optional[int] = None,
+                 timeout: Optional[float] = 300.0):
+        """Connects lazily to the service's Unix socket `path`, or to host:port when a port is given"""
+        self.path = path
+        self.host = host or "127.0.0.1"
+        self.port = port
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+
+    def _connect(self):
+        if self.port is not None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+        self._sock = sock
+        self._reader = sock.makefile("rb")
+
+    def close(self):
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+            self._sock = self._reader = None
+
+    def __enter__(self) -> "CostClient":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def batch(self, requests: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Results of a batch of requests, in order"""
+        message = (json.dumps({"requests": list(requests)}) + "\n").encode("utf-8")
+        for attempt in (0, 1):
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(message)
+                line = self._reader.readline()
+                if line:
+                    break
+            except OSError as e:
+                if attempt:
+                    raise CostServiceError(f"Cost service unreachable: {e}") from e
+            self.close()     # the service restarted: reconnect once
+        else:
+            raise CostServiceError("Cost service closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise CostServiceError(reply["error"])
+        return reply["results"]
+
+    def request(self, op: str, schema: str, **fields: Any) -> Dict[str, Any]:
+        """One request; a failed request raises instead of returning {"error"}"""
+        result = self.batch([{"op": op, "schema": schema, **fields}])[0]
+        if "error" in result:
+            raise CostServiceError(result["error"])
+        return result
+
+    def size(self, schema: str, collection: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        return self.request("size", schema, collection=collection, **fields)
+
+    def shard(self, schema: str, collection: str, shard_key: str, **fields: Any) -> Dict[str, Any]:
+        return self.request("shard", schema, collection=collection, shard_key=shard_key, **fields)
+
+    def filter(self, schema: str, collection: str, shard_key: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+        return self.request("filter", schema, collection=collection, shard_key=shard_key, **fields)
+
+    def join(self, schema: str, collection: str, other: str, shard_key: Optional[str] = None,
+             **fields: Any) -> Dict[str, Any]:
+        return self.request("join", schema, collection=collection, other=other, shard_key=shard_key, **fields)
+
+    def aggregate(self, schema: str, collection: str, shard_key: Optional[str] = None,
+                  **fields: Any) -> Dict[str, Any]:
+        return self.request("aggregate", schema, collection=collection, shard_key=shard_key, **fields)
+
+    def status(self) -> Dict[str, Any]:
+        """Loaded models, cache size and hit / miss counts"""
+        return self.batch([{"op": "status"}])[0]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Send a batch of requests to the local cost service")
+    parser.add_argument("requests", nargs="*", help="JSON requests (none: the service status)")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket of the service")
+    parser.add_argument("--port", type=int, help="TCP port of the service instead of the socket")
+    args = parser.parse_args()
+
+    with CostClient(args.socket, port=args.port) as client:
+        batch = [json.loads(r) for r in args.requests] or [{"op": "status"}]
+        for result in client.batch(batch):
+            print(json.dumps(result))
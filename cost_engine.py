@@ -0,0 +1,476 @@
+# cost_engine.py
+# Batch cost engine: evaluates many (collection, operator, shard key, servers, model)
+# scenarios in one call. QuerySimulator / AggregateSimulator are thin wrappers over it.
+#
+# This is a batching API, not a vectorized one: every stage (hot shard, access
+# plan, cache hit ratio, join / aggregate / write plans) runs the scalar models
+# once per distinct scenario in a Python loop, memoized within the batch, so a
+# sweep over server counts costs one scalar evaluation per count. Only the final
+# per-scenario arithmetic uses NumPy when it is installed (a plain Python loop
+# otherwise); the two give the same results at about the same speed.
+
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+from join_algorithms import choose_join
+from sharding import HASH
+from tracing import note, traced
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the project has no required dependencies
+    np = None
+
+# Per-document cost constants: (seconds, grams CO2, USD)
+OPERATOR_COSTS = {
+    "filter": (0.01, 0.0001, 0.000001),      # 10 ms per document scanned
+    "join": (0.05, 0.0005, 0.000005),        # Joins are slower (~50 ms/doc)
+    "aggregate": (0.03, 0.0003, 0.000003),   # Aggregates medium speed
+    "write": (0.02, 0.0002, 0.000002),       # Per 4 KB page of a rewritten document (see write_path.py)
+}
+WRITE_OPERATORS = ("insert", "update", "delete")
+
+
+def scale_documents(operator: str, time_seconds: float, carbon_grams: float, price_usd: float,
+                    disk_seconds: float, factor: float):
+    """
+    (time, carbon, price) of a scenario whose documents are `factor` times larger than
+    the ones it was costed for: the per-document work scales, the disk reads already
+    follow the stored size (disk_seconds, see memory.py)
+    """
+    seconds, carbon, price = OPERATOR_COSTS["write" if operator in WRITE_OPERATORS else operator]
+    return (disk_seconds + (time_seconds - disk_seconds) * factor,
+            disk_seconds * carbon / seconds + (carbon_grams - disk_seconds * carbon / seconds) * factor,
+            disk_seconds * price / seconds + (price_usd - disk_seconds * price / seconds) * factor)
+
+
+class CostEngine:
+    def __init__(self, simulators):
+        """
+        simulators: one NoSQLSimulator per model (index = model id),
+        or a single simulator.
+        """
+        if not isinstance(simulators, (list, tuple)):
+            simulators = [simulators]
+        self.sims = list(simulators)
+
+    def _cardinality_table(self, names: List[str]):
+        """Rows = models, columns = collection ids"""
+        return [
+            [sim.stats.get("cardinality", {}).get(name, 0) for name in names]
+            for sim in self.sims
+        ]
+
+    @traced
+    def evaluate(self,
+                 collections: Sequence[str],
+                 operators: Sequence[str],
+                 shard_keys: Optional[Sequence[Optional[str]]] = None,
+                 servers: Optional[Sequence[int]] = None,
+                 models: Optional[Sequence[int]] = None,
+                 others: Optional[Sequence[Optional[str]]] = None,
+                 fields: Optional[Sequence[Optional[str]]] = None,
+                 values: Optional[Sequence[Any]] = None,
+                 other_shard_keys: Optional[Sequence[Optional[str]]] = None,
+                 changes: Optional[Sequence[Optional[Sequence[str]]]] = None,
+                 aggregates: Optional[Sequence[Any]] = None,
+                 schemes: Optional[Sequence[str]] = None) -> Dict[str, Sequence]:
+        """
+        Cost a batch of scenarios. Every argument is a sequence of the same length:
+          collections -> scanned collection (left side for joins, written entity for writes)
+          operators   -> "filter", "join", "aggregate", or a write: "insert", "update", "delete"
+          shard_keys  -> shard key used by the query, None/"" = no sharding (full scan).
+                         For joins: the left side's shard key, also the join key when
+                         both collections have it (otherwise their shared ID field)
+          servers     -> server count (default: the model's sim.servers)
+          models      -> index into self.sims (default 0)
+          others      -> right-hand collection for joins
+          fields      -> filter predicate field (equality); lets the planner use an index.
+                         For aggregates: the group-by key. For writes: the field locating the documents
+          values      -> filter constant (None = a typical value), for MCV-aware selectivity
+          other_shard_keys -> shard key of the right-hand collection of joins
+                         (default: the same as shard_keys, i.e. co-partitioned; "" = unsharded)
+          changes     -> fields changed by updates (None = the whole entity)
+          aggregates  -> AggregateSpec of aggregates (group keys, functions, pre-filter;
+                         None = a count grouped by the `fields` key, see aggregation.py)
+          schemes     -> sharding scheme of filters ("hash" / "range", default hash, see sharding.py);
+                         joins, aggregates and writes are costed on hash layouts
+        Returns arrays of docs_scanned, time_seconds, carbon_grams, price_usd,
+        join_algorithm and data_movement (None for non-joins), aggregate_strategy
+        ("single" / "co-located" / "two-phase", None for the rest), access_path ("scan" /
+        "index", None for joins), the estimated output_docs / output_bytes (see
+        selectivity.py), network_bytes, docs_written / bytes_written (0 for reads),
+        and cache_hit_ratio / disk_pages / disk_seconds (the part of time_seconds
+        spent reading them) of filters and aggregates (None / 0 for joins and
+        writes, see memory.py), and the cross_region_bytes of the model's
+        placement (see placement.py).
+        Time, carbon and price include moving the inputs of joins, shuffling the
+        partial groups of aggregates, gathering the results of sharded filters and
+        aggregates (see topology.py), reading the documents missing from the
+        servers' cache from disk, and the round trip / transfer to replicas in
+        other regions. A query runs once, on one member: replicas add read
+        capacity (workload.py, cluster_sim.py), not speed.
+        """
+        n = len(collections)
+        shard_keys = shard_keys if shard_keys is not None else [None] * n
+        models = models if models is not None else [0] * n
+        others = others if others is not None else [None] * n
+        fields = fields if fields is not None else [None] * n
+        values = values if values is not None else [None] * n
+        other_shard_keys = other_shard_keys if other_shard_keys is not None else shard_keys
+        changes = changes if changes is not None else [None] * n
+        aggregates = aggregates if aggregates is not None else [None] * n
+        schemes = [s if op == "filter" else HASH for s, op in zip(schemes, operators)] if schemes else [HASH] * n
+        if servers is None:
+            servers = [self.sims[m].servers for m in models]
+
+        names = sorted(set(collections))
+        coll_ids = {name: i for i, name in enumerate(names)}
+        table = self._cardinality_table(names)
+        left = [coll_ids[c] for c in collections]
+        sharded = [bool(k) for k in shard_keys]
+        unit_costs = [OPERATOR_COSTS["write" if op in WRITE_OPERATORS else op] for op in operators]
+
+        # Sharded queries scan the hottest shard, not the average one (see sharding.py)
+        hot = self._hot_docs(collections, shard_keys, servers, models, schemes)
+        # Joins are costed by the cheapest join algorithm (see join_algorithms.py)
+        joins = self._join_plans(collections, others, operators, shard_keys, other_shard_keys, servers, models)
+        # Filters on a field go through the index-or-scan planner (see indexes.py)
+        accesses = self._access_plans(collections, fields, values, operators, shard_keys, servers, models, schemes)
+        # Writes are costed with their update amplification (see write_path.py)
+        writes = self._write_plans(collections, operators, fields, shard_keys, changes, servers, models)
+        # Grouped aggregates run as partial / shuffle / merge phases (see aggregation.py)
+        groups = self._aggregate_plans(collections, operators, fields, aggregates, shard_keys, servers, models)
+        plans = [join or write or group for join, write, group in zip(joins, writes, groups)]
+        # Filters and aggregates split their reads into cache hits and disk reads (see memory.py)
+        reads = self._cache_reads(table, left, collections, shard_keys, servers, models, schemes, hot, plans,
+                                  accesses)
+        note(scenarios=n, hot_docs=hot, access_plans=accesses, cache_reads=reads)
+
+        if np is not None:
+            result = self._evaluate_numpy(table, left, models, hot, sharded, unit_costs, plans, accesses, reads)
+        else:
+            result = self._evaluate_python(table, left, models, hot, sharded, unit_costs, plans, accesses, reads)
+        result["join_algorithm"] = [plan["join_algorithm"] if plan else None for plan in joins]
+        result["data_movement"] = [plan["data_movement"] if plan else None for plan in joins]
+        result["aggregate_strategy"] = [plan["strategy"] if plan else None for plan in groups]
+        result["access_path"] = [
+            write["access_path"] if write else group["access_path"] if group else
+            None if join else (access["access_path"] if access else "scan")
+            for join, write, group, access in zip(joins, writes, groups, accesses)
+        ]
+        result["docs_written"] = [write["docs_written"] if write else 0 for write in writes]
+        result["bytes_written"] = [write["bytes_written"] if write else 0 for write in writes]
+        reads = [read or group for read, group in zip(reads, groups)]
+        result["cache_hit_ratio"] = [read["hit_ratio"] if read else None for read in reads]
+        result["disk_pages"] = [math.ceil(round(read["disk_pages"], 6)) if read else 0 for read in reads]
+        result["disk_seconds"] = [read["disk_cost_docs"] * unit[0] if read else 0.0
+                                  for read, unit in zip(reads, unit_costs)]
+        rows, row_bytes = self._outputs(collections, operators, shard_keys, models, others, fields, values,
+                                        result["docs_scanned"], joins, groups)
+        moves = self._result_movements(operators, shard_keys, fields, servers, models, groups)
+        # Replicas in other regions: results travel back to the client (join outputs stay where
+        # they were produced, as above), writes to every member
+        routes = self._placements(operators, models)
+        planned = [(join or group or {}).get("network_bytes", 0) for join, group in zip(joins, groups)]
+        finish = self._finish_numpy if np is not None else self._finish_python
+        result.update(finish(result, operators, rows, row_bytes, planned, moves, routes))
+        return result
+
+    def _hot_docs(self, collections, shard_keys, servers, models, schemes):
+        """Hottest-shard document counts, one layout per distinct combination"""
+        memo = {}
+        hot = []
+        for c, k, srv, m, scheme in zip(collections, shard_keys, servers, models, schemes):
+            if not k:
+                hot.append(0)
+                continue
+            key = (m, c, k, srv, scheme)
+            if key not in memo:
+                memo[key] = self.sims[m].sharding.hot_docs(c, k, srv, scheme)
+            hot.append(memo[key])
+        return hot
+
+    def _cache_reads(self, table, left, collections, shard_keys, servers, models, schemes, hot, plans, accesses):
+        """
+        Cache-hit / disk-read split per filter and aggregate (None for joins and writes):
+        scans read the resident share of the data, index fetches follow the access skew
+        """
+        memo = {}
+        reads = []
+        for l, c, k, srv, m, scheme, h, plan, access in zip(left, collections, shard_keys, servers, models, schemes,
+                                                            hot, plans, accesses):
+            if plan is not None:
+                reads.append(None)
+                continue
+            kind = "point" if access and access["access_path"] == "index" else "scan"
+            docs = access["docs_examined"] if access else (h if k else table[m][l])
+            key = (m, c, k, srv, scheme, kind, docs)
+            if key not in memo:
+                memo[key] = self.sims[m].memory.read_cost(c, docs, k or None, srv, kind, scheme=scheme)
+            reads.append(memo[key])
+        return reads
+
+    def _join_plans(self, collections, others, operators, shard_keys, other_shard_keys, servers, models):
+        """Cheapest join plan per join scenario (None elsewhere), one plan per distinct combination"""
+        memo = {}
+        plans = []
+        for c, o, op, k, ok, srv, m in zip(collections, others, operators, shard_keys, other_shard_keys,
+                                           servers, models):
+            if op != "join":
+                plans.append(None)
+                continue
+            key = (m, c, o, k, ok, srv)
+            if key not in memo:
+                # The join key is the left shard key (or the shared ID field); each side
+                # lies on its own shard key and is moved as needed (see join_algorithms.py)
+                memo[key] = choose_join(self.sims[m], c, o, k, bool(k), OPERATOR_COSTS["join"], srv,
+                                        shard_keys=(k or None, ok or None))
+            plans.append(memo[key])
+        return plans
+
+    def _result_movements(self, operators, shard_keys, fields, servers, models, groups):
+        """
+        Network cost of bringing each result to the router: a targeted filter sends
+        its matches from one shard, other sharded filters gather theirs from every
+        server, an ungrouped sharded aggregate gathers every shard's partial result
+        (output_bytes is one shard's share). Unsharded work already sits on one node.
+        Returns (output bytes carried per output byte, bytes moved / seconds / price / carbon
+        per byte carried) per scenario; movements are linear in their volume (topology.py).
+        """
+        memo = {}
+        moves = []
+        for op, k, f, srv, m, group in zip(operators, shard_keys, fields, servers, models, groups):
+            if op == "join" or op in WRITE_OPERATORS or group or not k:
+                # Join outputs stay where they were produced (their inputs' movement is in the plan),
+                # grouped aggregates already include their shuffle and final gather
+                pattern, scale = "transfer", 0
+            elif op == "aggregate":
+                pattern, scale = "gather", srv
+            elif f in (None, k):
+                pattern, scale = "transfer", 1
+            else:
+                pattern, scale = "gather", 1
+            key = (m, pattern, srv)
+            if key not in memo:
+                topology = self.sims[m].topology
+                moved, seconds = topology.per_byte(pattern, srv)
+                memo[key] = (moved, seconds, moved * topology.price_per_gb / 1024 ** 3,
+                             moved * topology.carbon_per_gb / 1024 ** 3)
+            moves.append((scale, *memo[key]))
+        return moves
+
+    def _placements(self, operators, models):
+        """
+        Replica-set terms per scenario: (seconds added, cross-region bytes / price / carbon
+        per byte read or written), see placement.py
+        """
+        memo = {}
+        routes = []
+        for op, m in zip(operators, models):
+            key = (m, op in WRITE_OPERATORS, op == "join")
+            if key not in memo:
+                placement = self.sims[m].placement
+                seconds, copies = placement.rates(op)
+                if op == "join":
+                    copies = 0.0      # join outputs stay where they were produced
+                memo[key] = (seconds, copies, copies * placement.transfer_usd_per_gb / 1024 ** 3,
+                             copies * placement.carbon_per_gb / 1024 ** 3)
+            routes.append(memo[key])
+        return routes
+
+    def _finish_numpy(self, result, operators, rows, row_bytes, planned, moves, routes):
+        """Outputs, result gathering and replica-set terms over the whole batch at once"""
+        rows = np.asarray(rows, dtype=np.int64)
+        output_bytes = np.asarray(row_bytes, dtype=np.int64)
+        written = np.asarray(result["bytes_written"], dtype=np.int64)
+        moves = np.asarray(moves, dtype=np.float64).reshape(-1, 5)
+        routes = np.asarray(routes, dtype=np.float64).reshape(-1, 4)
+        carried = output_bytes * moves[:, 0]
+        sent = np.where(np.asarray([op in WRITE_OPERATORS for op in operators], dtype=bool), written, output_bytes)
+        finished = {
+            "output_docs": rows,
+            "output_bytes": output_bytes,
+            "network_bytes": np.asarray(planned, dtype=np.int64) + (carried * moves[:, 1]).astype(np.int64),
+            "docs_written": np.asarray(result["docs_written"], dtype=np.int64),
+            "bytes_written": written,
+            "disk_pages": np.asarray(result["disk_pages"], dtype=np.int64),
+            "cross_region_bytes": (sent * routes[:, 1]).astype(np.int64),
+        }
+        for field, column in (("time_seconds", 2), ("price_usd", 3), ("carbon_grams", 4)):
+            finished[field] = (np.asarray(result[field], dtype=np.float64) + carried * moves[:, column]
+                               + (routes[:, 0] if column == 2 else sent * routes[:, column - 1]))
+        return finished
+
+    def _finish_python(self, result, operators, rows, row_bytes, planned, moves, routes):
+        """The same as _finish_numpy, one scenario at a time"""
+        finished = {field: [] for field in ("output_docs", "output_bytes", "network_bytes", "cross_region_bytes",
+                                            "time_seconds", "price_usd", "carbon_grams")}
+        for i, (op, docs, size, plan, move, route) in enumerate(zip(operators, rows, row_bytes, planned, moves,
+                                                                    routes)):
+            carried = size * move[0]
+            sent = result["bytes_written"][i] if op in WRITE_OPERATORS else size
+            finished["output_docs"].append(docs)
+            finished["output_bytes"].append(size)
+            finished["network_bytes"].append(plan + int(carried * move[1]))
+            finished["cross_region_bytes"].append(int(sent * route[1]))
+            for field, column in (("time_seconds", 2), ("price_usd", 3), ("carbon_grams", 4)):
+                finished[field].append(float(result[field][i]) + carried * move[column]
+                                       + (route[0] if column == 2 else sent * route[column - 1]))
+        return finished
+
+    def _write_plans(self, collections, operators, fields, shard_keys, changes, servers, models):
+        """Write plan per insert / update / delete scenario (None elsewhere)"""
+        memo = {}
+        plans = []
+        for c, op, f, k, ch, srv, m in zip(collections, operators, fields, shard_keys, changes, servers, models):
+            if op not in WRITE_OPERATORS:
+                plans.append(None)
+                continue
+            key = (m, c, op, f, k, tuple(ch) if ch else None, srv)
+            if key not in memo:
+                memo[key] = self.sims[m].writes.cost(op, c, f, k or None, ch, srv)
+            plans.append(memo[key])
+        return plans
+
+    def _aggregate_plans(self, collections, operators, fields, aggregates, shard_keys, servers, models):
+        """Two-phase plan per aggregate with a group key or a spec (None elsewhere)"""
+        memo = {}
+        plans = []
+        for c, op, f, spec, k, srv, m in zip(collections, operators, fields, aggregates, shard_keys, servers,
+                                             models):
+            if op != "aggregate" or not (f or spec):
+                plans.append(None)
+                continue
+            key = (m, c, f, spec.key() if spec else None, k, srv)
+            if key not in memo:
+                memo[key] = self.sims[m].aggregation.cost(c, f, k or None, srv, spec)
+            plans.append(memo[key])
+        return plans
+
+    def _access_plans(self, collections, fields, values, operators, shard_keys, servers, models, schemes):
+        """Index-or-scan plan per filter with a predicate field (None elsewhere)"""
+        memo = {}
+        plans = []
+        for c, f, v, op, k, srv, m, scheme in zip(collections, fields, values, operators, shard_keys, servers,
+                                                  models, schemes):
+            if op != "filter" or not f:
+                plans.append(None)
+                continue
+            key = (m, c, f, repr(v), k, srv, scheme)
+            if key not in memo:
+                sel = self.sims[m].selectivity.equality(c, f, v)
+                memo[key] = self.sims[m].indexes.plan_filter(c, f, k or None, srv, sel, scheme)
+            plans.append(memo[key])
+        return plans
+
+    def _outputs(self, collections, operators, shard_keys, models, others, fields, values, scanned, joins, groups):
+        """
+        (output documents, output bytes) per scenario from the selectivity estimator,
+        one estimate per distinct combination:
+          filter    -> matches of field = value (the shard key when sharded without a field)
+          join      -> |L| x |R| / max NDV of the join key, both documents per output row
+          aggregate -> final groups on the busiest server (see aggregation.py)
+                       (without a key or spec: the old 1% guess at 200 bytes a row)
+        """
+        memo = {}
+        rows, sizes = [], []
+        for c, op, k, m, o, f, v, docs, plan, group in zip(collections, operators, shard_keys, models, others,
+                                                         fields, values, scanned, joins, groups):
+            if op in WRITE_OPERATORS:
+                output = (0, 0)     # a write returns no documents
+            elif group:
+                output = (group["output_docs"], group["output_bytes"])
+            elif op == "aggregate":
+                n = max(1, int(docs) // 100)
+                output = (n, n * 200)
+            else:
+                key = (m, c, op, o, plan["join_key"] if plan else f or k or None, repr(v))
+                if key not in memo:
+                    sim = self.sims[m]
+                    if op == "join":
+                        n = sim.selectivity.join_output(c, o, key[4])
+                        memo[key] = (n, n * (sim.compute_doc_size(c) + sim.compute_doc_size(o)))
+                    else:
+                        n = sim.selectivity.output_docs(c, ("eq", key[4], v))
+                        memo[key] = (n, n * sim.compute_doc_size(c))
+                output = memo[key]
+            rows.append(output[0])
+            sizes.append(output[1])
+        return rows, sizes
+
+    def _evaluate_numpy(self, table, left, models, hot, sharded, unit_costs, plans, accesses, reads):
+        table = np.asarray(table, dtype=np.int64).reshape(len(self.sims), -1)
+        docs_full = table[np.asarray(models, dtype=np.int64), np.asarray(left, dtype=np.int64)]
+        hot = np.asarray(hot, dtype=np.int64)
+        sharded = np.asarray(sharded, dtype=bool)
+        unit = np.asarray(unit_costs, dtype=np.float64).reshape(-1, 3)
+
+        # With sharding: hottest server; without: full scan
+        docs = np.where(sharded, hot, docs_full)
+        cost_docs = docs.astype(np.float64)
+        has_access = np.asarray([a is not None for a in accesses], dtype=bool)
+        if has_access.any():
+            docs = np.where(has_access, np.asarray([a["docs_examined"] if a else 0 for a in accesses],
+                                                   dtype=np.int64), docs)
+            cost_docs = np.where(has_access, np.asarray([a["cost_docs"] if a else 0.0 for a in accesses],
+                                                        dtype=np.float64), cost_docs)
+        cost_docs = cost_docs + np.asarray([r["disk_cost_docs"] if r else 0.0 for r in reads], dtype=np.float64)
+        result = {
+            "docs_scanned": docs,
+            "time_seconds": cost_docs * unit[:, 0],
+            "carbon_grams": cost_docs * unit[:, 1],
+            "price_usd": cost_docs * unit[:, 2],
+        }
+        # Joins, writes and grouped aggregates are costed by their own models
+        planned = np.asarray([plan is not None for plan in plans], dtype=bool)
+        if planned.any():
+            for field in result:
+                values = np.asarray([plan[field] if plan else 0 for plan in plans], dtype=result[field].dtype)
+                result[field] = np.where(planned, values, result[field])
+        return result
+
+    def _evaluate_python(self, table, left, models, hot, sharded, unit_costs, plans, accesses, reads):
+        docs_out, time_out, carbon_out, price_out = [], [], [], []
+        for m, l, h, shard, unit, plan, access, read in zip(models, left, hot, sharded, unit_costs, plans,
+                                                            accesses, reads):
+            if plan is not None:
+                docs_out.append(plan["docs_scanned"])
+                time_out.append(plan["time_seconds"])
+                carbon_out.append(plan["carbon_grams"])
+                price_out.append(plan["price_usd"])
+                continue
+            docs = h if shard else table[m][l]
+            cost_docs = docs
+            if access is not None:
+                docs, cost_docs = access["docs_examined"], access["cost_docs"]
+            cost_docs += read["disk_cost_docs"]
+            docs_out.append(docs)
+            time_out.append(cost_docs * unit[0])
+            carbon_out.append(cost_docs * unit[1])
+            price_out.append(cost_docs * unit[2])
+        return {
+            "docs_scanned": docs_out,
+            "time_seconds": time_out,
+            "carbon_grams": carbon_out,
+            "price_usd": price_out,
+        }
+
+    @traced
+    def explain_join(self, coll1, coll2, shard_key=None, servers=None, model=0, other_shard_key=None):
+        """Full join plan: chosen placement and algorithm, resource usage and every alternative's time"""
+        sim = self.sims[model]
+        other_shard_key = shard_key if other_shard_key is None else other_shard_key
+        return choose_join(sim, coll1, coll2, shard_key, bool(shard_key), OPERATOR_COSTS["join"],
+                           servers or sim.servers, shard_keys=(shard_key or None, other_shard_key or None))
+
+    @traced
+    def evaluate_one(self, collection, operator, shard_key=None, servers=None, model=0, other=None, field=None,
+                     value=None, other_shard_key=None, changes=None, aggregate=None, scheme=HASH):
+        """Scalar helper used by the simulators: returns plain Python numbers"""
+        other_shard_key = shard_key if other_shard_key is None else other_shard_key
+        result = self.evaluate([collection], [operator], [shard_key],
+                               None if servers is None else [servers], [model], [other], [field], [value],
+                               [other_shard_key], [changes], [aggregate], [scheme])
+        return {key: values[0].item() if hasattr(values[0], "item") else values[0]
+                for key, values in result.items()}
@@ -0,0 +1,311 @@
+# cost_service.py
+# Long-running local cost service: models kept in memory, batch API, LRU result cache
+#
+# Planning tools call the simulator thousands of times a minute; building a
+# NoSQLSimulator re-reads stats.json, indexes.json and the schema every time. The
+# service keeps one simulator per schema file and answers batches of size /
+# shard / filter / join / aggregate requests (see cost_client.py for the format)
+# over a Unix socket (or TCP port), one JSON line per batch. The filter, join and
+# aggregate requests of a batch that miss the cache are costed in one CostEngine
+# pass over every model they name.
+#
+# Results are cached in an LRU keyed on (schema hash, stats + indexes hash,
+# request). Before each batch the service compares the files' size and mtime:
+# a changed schema reloads its model, a changed stats.json or indexes.json
+# reloads them all, and the results computed from the old contents are dropped.
+# Requests run one batch at a time on a worker thread, so the event loop keeps
+# accepting connections while a large batch is costed.
+#
+# Usage: python cost_service.py [--socket PATH | --port 8765] [--stats stats.json] [--indexes indexes.json]
+#                               [--schemas schemas] [--cache-size 100000]
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import signal
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from aggregation import AggregateSpec
+from cost_client import DEFAULT_SOCKET, OPERATIONS
+from cost_engine import CostEngine
+from main import NoSQLSimulator
+
+CACHE_SIZE = 100_000             # cached results
+MAX_MESSAGE_BYTES = 64 * 1024 ** 2
+ENGINE_OPERATIONS = ("filter", "join", "aggregate")
+
+
+def file_signature(path: str) -> Tuple[int, int]:
+    """(size, mtime in ns): compared before every batch, the content is hashed only when it changes"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def file_hash(*paths: Optional[str]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        if path:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def plain(value: Any) -> Any:
+    """NumPy scalars to Python numbers"""
+    return value.item() if hasattr(value, "item") else value
+
+
+class ResultCache:
+    """LRU of request results keyed on (schema hash, stats hash, canonical request)"""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key: tuple, result: Dict[str, Any]):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def drop(self, schema_hash: Optional[str] = None, stats_hash: Optional[str] = None):
+        """Forget the results computed from an old schema or old stats"""
+        for key in [k for k in self.entries if k[0] == schema_hash or k[1] == stats_hash]:
+            del self.entries[key]
+
+
+class CostService:
+    def __init__(self, stats_file: str = "stats.json", indexes_file: Optional[str] = "indexes.json",
+                 schemas_folder: str = "schemas", cache_size: int = CACHE_SIZE):
+        self.stats_file = stats_file
+        self.indexes_file = indexes_file
+        self.schemas_folder = schemas_folder
+        self.cache = ResultCache(cache_size)
+        self.models: Dict[str, Dict[str, Any]] = {}    # schema path → {"sim", "hash", "signature"}
+        self.stats_signature = None
+        self.stats_hash = None
+        self.batches = 0
+
+    # ---------- models ----------
+
+    def _refresh_stats(self):
+        signature = tuple(file_signature(p) for p in (self.stats_file, self.indexes_file) if p)
+        if signature == self.stats_signature:
+            return
+        new_hash = file_hash(self.stats_file, self.indexes_file)
+        if new_hash != self.stats_hash:
+            self.cache.drop(stats_hash=self.stats_hash)
+            self.models.clear()      # every simulator holds the old stats
+            self.stats_hash = new_hash
+        self.stats_signature = signature
+
+    def schema_path(self, schema: str) -> str:
+        """A schema path, or a model name (db1 → schemas/db1.json)"""
+        if os.sep in schema or "/" in schema or schema.endswith(".json"):
+            return schema
+        return os.path.join(self.schemas_folder, schema.lower() + ".json")
+
+    def model(self, schema: str) -> Dict[str, Any]:
+        """Simulator of a schema file, rebuilt when the file changed"""
+        path = self.schema_path(schema)
+        signature = file_signature(path)
+        model = self.models.get(path)
+        if model is not None and model["signature"] == signature:
+            return model
+        schema_hash = file_hash(path)
+        if model is None or model["hash"] != schema_hash:
+            if model is not None:
+                self.cache.drop(schema_hash=model["hash"])
+            model = {"sim": NoSQLSimulator(path, self.stats_file, self.indexes_file), "hash": schema_hash}
+            self.models[path] = model
+        model["signature"] = signature
+        return model
+
+    # ---------- requests ----------
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "models": sorted(self.models),
+            "stats_hash": self.stats_hash,
+            "batches": self.batches,
+            "cached_results": len(self.cache.entries),
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+        }
+
+    def handle(self, requests: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Results of a batch, in order; a failing request gets {"error"} without failing the batch"""
+        self.batches += 1
+        self._refresh_stats()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        pending = []     # (position, cache key, model, request) of engine requests to cost
+        for i, request in enumerate(requests):
+            try:
+                op = request.get("op")
+                if op not in OPERATIONS:
+                    raise ValueError(f"Unknown op {op!r} ({', '.join(OPERATIONS)})")
+                if op == "status":
+                    results[i] = self.status()
+                    continue
+                model = self.model(request["schema"])
+                key = (model["hash"], self.stats_hash, json.dumps(request, sort_keys=True))
+                cached = self.cache.get(key)
+                if cached is not None:
+                    results[i] = cached
+                elif op in ENGINE_OPERATIONS:
+                    for name in (request["collection"], request.get("other")):
+                        if name and not model["sim"].get_collection_schema(name):
+                            raise ValueError(f"Collection {name} is not in this model")
+                    pending.append((i, key, model, request))
+                else:
+                    results[i] = self._direct(model["sim"], request)
+                    self.cache.put(key, results[i])
+            except Exception as e:
+                results[i] = {"error": f"{type(e).__name__}: {e}"}
+        if pending:
+            try:
+                costed = self._evaluate([(m["sim"], r) for _, _, m, r in pending])
+            except Exception:
+                # Cost them one by one so only the faulty requests report an error
+                costed = []
+                for _, _, m, r in pending:
+                    try:
+                        costed.append(self._evaluate([(m["sim"], r)])[0])
+                    except Exception as e:
+                        costed.append({"error": f"{type(e).__name__}: {e}"})
+            for (i, key, _, _), result in zip(pending, costed):
+                results[i] = result
+                if "error" not in result:
+                    self.cache.put(key, result)
+        return results
+
+    @staticmethod
+    def _direct(sim, request: Dict[str, Any]) -> Dict[str, Any]:
+        """size / shard requests"""
+        collection = request.get("collection")
+        if request["op"] == "shard":
+            return sim.sharding.stats(collection, request["shard_key"], request.get("servers"),
+                                      scheme=request.get("scheme", "hash"))
+        fmt, codec = request.get("format"), request.get("codec")
+        if collection is None:
+            return {"database_gb": sim.database_size_gb(fmt, codec), "stored_gb": sim.storage.database_size_gb()}
+        if not sim.get_collection_schema(collection):
+            raise ValueError(f"Collection {collection} is not in this model")
+        return {
+            "doc_bytes": sim.compute_doc_size(collection, fmt),
+            "collection_gb": sim.collection_size_gb(collection, fmt, codec),
+            "stored_gb": sim.storage.collection_size_gb(collection),
+        }
+
+    @staticmethod
+    def _evaluate(batch: Sequence[Tuple[Any, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """filter / join / aggregate requests of any models in one engine pass"""
+        sims, model_ids = [], {}
+        for sim, _ in batch:
+            model_ids.setdefault(id(sim), len(sims))
+            if len(sims) < len(model_ids):
+                sims.append(sim)
+        fields, aggregates = [], []
+        for _, r in batch:
+            group_by = r.get("group_by")
+            spec = None
+            if r["op"] == "aggregate" and (isinstance(group_by, list) or r.get("functions") or r.get("where")):
+                spec = AggregateSpec.from_query(r)
+            aggregates.append(spec)
+            fields.append(None if spec else (group_by if r["op"] == "aggregate" else r.get("field")))
+        result = CostEngine(sims).evaluate(
+            collections=[r["collection"] for _, r in batch],
+            operators=[r["op"] for _, r in batch],
+            shard_keys=[r.get("shard_key") for _, r in batch],
+            servers=[r.get("servers") or sim.servers for sim, r in batch],
+            models=[model_ids[id(sim)] for sim, _ in batch],
+            others=[r.get("other") for _, r in batch],
+            fields=fields,
+            values=[r.get("value") for _, r in batch],
+            other_shard_keys=[r.get("other_shard_key", r.get("shard_key")) for _, r in batch],
+            changes=[None] * len(batch),
+            aggregates=aggregates,
+        )
+        return [{name: plain(values[i]) for name, values in result.items()} for i in range(len(batch))]
+
+    # ---------- server ----------
+
+    async def _connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, executor):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    requests = json.loads(line)["requests"]
+                    reply = {"results": await loop.run_in_executor(executor, self.handle, requests)}
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {"error": f"Malformed batch: {e}"}
+                writer.write((json.dumps(reply, default=str) + "\n").encode("utf-8"))
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, path: str = DEFAULT_SOCKET, port: Optional[int] = None, host: str = "127.0.0.1"):
+        """Serve until SIGINT / SIGTERM, one batch at a time on a worker thread"""
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        async def connection(reader, writer):
+            await self._connection(reader, writer, executor)
+
+        if port is not None:
+            server = await asyncio.start_server(connection, host, port, limit=MAX_MESSAGE_BYTES)
+        else:
+            if os.path.exists(path):
+                os.unlink(path)      # stale socket of a previous run
+            server = await asyncio.start_unix_server(connection, path, limit=MAX_MESSAGE_BYTES)
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass     # no signal handlers off the main thread / on Windows: Ctrl+C only
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            executor.shutdown(wait=False)
+            if port is None and os.path.exists(path):
+                os.unlink(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve size / shard / filter / join / aggregate costs")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket to listen on")
+    parser.add_argument("--port", type=int, help="listen on this TCP port (127.0.0.1) instead of the socket")
+    parser.add_argument("--stats", default="stats.json")
+    parser.add_argument("--indexes", default="indexes.json")
+    parser.add_argument("--schemas", default="schemas", help="folder of the schemas named in requests (db1...)")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="results kept in the LRU cache")
+    args = parser.parse_args()
+
+    service = CostService(args.stats, args.indexes or None, args.schemas, args.cache_size)
+    print(f"COST SERVICE: {f'127.0.0.1:{args.port}' if args.port is not None else args.socket} "
+          f"({args.stats}, {args.indexes}, cache {args.cache_size:,} results)")
+    try:
+        asyncio.run(service.serve(args.socket, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,419 @@
+# depgraph.py
+# Incremental re-evaluation: derived quantities as nodes of a dependency graph over the stats / schema inputs
+#
+# Nodes of every model (ModelGraph):
+#   ("doc_size", model, collection)           bytes of one document (compiled size plan)
+#   ("collection_size", model, collection)    GB: cardinality × doc_size
+#   ("database_size", model)                  GB: sum of the collection sizes
+#   ("shard_stats", model, collection, key)   skew report of the collection sharded on an ID field
+#   ("cost", model, label)                    one query of the use case (cost_engine.py)
+#   ("total", model)                          price and time of all the use case queries
+# Edges are recorded while a node computes: the nodes it asks the graph for, and
+# every stats value it reads. The models' stats and field sizes are wrapped in
+# TrackedDict, which reports each lookup with its path, e.g. ("cardinality", "Client"),
+# so the operators need no changes and the edges are exactly what they read.
+#
+# update({"cardinality.Client": 2_000_000}) writes the inputs of every model,
+# recomputes the nodes that read them, then their dependents in computation
+# order, and stops wherever a recomputed value is unchanged (a cost that does not
+# move leaves the model total alone). It returns the diff {node: (old, new)}.
+# Stats derived by model_search.build_model from other stats (average array
+# lengths of nested models) are inputs like any other: they are not re-derived.
+#
+# Usage: python depgraph.py cardinality.Client=2000000 [avg.Product.categories=3 ...] [--generated] [--check]
+#   --generated  also every denormalization of db1.json (model_search.py)
+#   --check      rebuild the graph from scratch with the edited stats and compare
+
+import heapq
+import itertools
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from cost_engine import CostEngine
+
+Path = Tuple[Hashable, ...]
+Node = Tuple[Hashable, ...]
+
+SCHEMA = "#schema"       # input path (SCHEMA, model) stands for the model's schema
+
+# The use case of run_final.py: (label, collection, operator, shard key, other collection)
+USE_CASE = [
+    ("Filter", "Stock", "filter", "IDP", None),
+    ("Join", "OrderLine", "join", "IDP", "Product"),
+    ("Aggregate", "OrderLine", "aggregate", "IDP", None),
+]
+COST_FIELDS = ("docs_scanned", "time_seconds", "carbon_grams", "price_usd")
+COST_INPUTS = [("cardinality",), ("distinct",), ("avg",), ("field_sizes",)]
+
+
+class TrackedDict(dict):
+    """A stats mapping whose lookups are recorded as input paths of the node being computed"""
+
+    __slots__ = ("path", "graph")
+
+    def __init__(self, data: Dict[Hashable, Any], path: Path, graph: "DependencyGraph"):
+        super().__init__()
+        self.path = path
+        self.graph = graph
+        for key, value in data.items():
+            dict.__setitem__(self, key, self._wrap(key, value))
+
+    def _wrap(self, key: Hashable, value: Any) -> Any:
+        return TrackedDict(value, self.path + (key,), self.graph) if isinstance(value, dict) else value
+
+    # Lookups of one key: a nested mapping is not a dependency by itself (what is read in it is)
+    def __getitem__(self, key):
+        try:
+            value = dict.__getitem__(self, key)
+        except KeyError:
+            self.graph.read(self.path + (key,))
+            raise
+        if not isinstance(value, TrackedDict):
+            self.graph.read(self.path + (key,))
+        return value
+
+    def get(self, key, default=None):
+        value = dict.get(self, key, default)
+        if not isinstance(value, TrackedDict):
+            self.graph.read(self.path + (key,))
+        return value
+
+    def __contains__(self, key):
+        self.graph.read(self.path + (key,))
+        return dict.__contains__(self, key)
+
+    # Whole-mapping reads depend on everything below (also used by dict(), json.dumps, update)
+    def __iter__(self):
+        self.graph.read(self.path)
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.graph.read(self.path)
+        return dict.__len__(self)
+
+    def keys(self):
+        self.graph.read(self.path)
+        return dict.keys(self)
+
+    def values(self):
+        self.graph.read(self.path)
+        return dict.values(self)
+
+    def items(self):
+        self.graph.read(self.path)
+        return dict.items(self)
+
+    def copy(self):
+        self.graph.read(self.path)
+        return dict(dict.items(self))
+
+    def assign(self, path: Path, value: Any) -> None:
+        """Write value at path below this mapping (missing levels are created), without recording"""
+        target = self
+        for key in path[:-1]:
+            child = dict.get(target, key)
+            if not isinstance(child, TrackedDict):
+                child = TrackedDict({}, target.path + (key,), self.graph)
+                dict.__setitem__(target, key, child)
+            target = child
+        dict.__setitem__(target, path[-1], target._wrap(path[-1], value))
+
+
+class DependencyGraph:
+    def __init__(self):
+        self.rules: Dict[Hashable, Callable] = {}     # node kind -> function(*node[1:])
+        self.values: Dict[Node, Any] = {}
+        self.order: Dict[Node, int] = {}              # completion sequence: dependencies come first
+        self.inputs: Dict[Node, Set[Path]] = {}       # input paths read by each node
+        self.needs: Dict[Node, Set[Node]] = {}        # nodes read by each node
+        self.readers: Dict[Path, Set[Node]] = {}
+        self.users: Dict[Node, Set[Node]] = {}
+        self.computed = 0                             # node computations so far
+        self._frames: List[Tuple[Node, Set[Path], Set[Node]]] = []
+        self._sequence = itertools.count()
+        self._pending: Set[Node] = set()
+        self._heap: List[Tuple[int, Node]] = []
+        self._diff: Dict[Node, Tuple[Any, Any]] = {}
+
+    def rule(self, kind: Hashable, function: Callable) -> None:
+        """Nodes (kind, *args) are computed by function(*args)"""
+        self.rules[kind] = function
+
+    def read(self, path: Path) -> None:
+        """Record an input read by the node being computed"""
+        if self._frames:
+            self._frames[-1][1].add(path)
+
+    def get(self, node: Node) -> Any:
+        """Value of a node, computed on first use; records the edge from the node being computed"""
+        if self._frames:
+            self._frames[-1][2].add(node)
+        if node in self._pending:
+            self._refresh(node)
+        elif node not in self.values:
+            self._compute(node)
+        return self.values[node]
+
+    def _compute(self, node: Node) -> Any:
+        self._forget(node)
+        frame: Tuple[Node, Set[Path], Set[Node]] = (node, set(), set())
+        self._frames.append(frame)
+        try:
+            value = self.rules[node[0]](*node[1:])
+        finally:
+            self._frames.pop()
+        self.inputs[node], self.needs[node] = frame[1], frame[2]
+        for path in frame[1]:
+            self.readers.setdefault(path, set()).add(node)
+        for need in frame[2]:
+            self.users.setdefault(need, set()).add(node)
+        self.order[node] = next(self._sequence)
+        self.values[node] = value
+        self.computed += 1
+        return value
+
+    def _forget(self, node: Node) -> None:
+        """Drop the edges of a previous computation (a recomputation records its own)"""
+        for path in self.inputs.pop(node, ()):
+            self.readers[path].discard(node)
+        for need in self.needs.pop(node, ()):
+            self.users[need].discard(node)
+
+    def affected(self, paths: Iterable[Path]) -> Set[Node]:
+        """Nodes that read one of the paths, a value below it or a whole mapping above it"""
+        nodes: Set[Node] = set()
+        for path in paths:
+            for i in range(1, len(path) + 1):
+                nodes |= self.readers.get(path[:i], set())
+            n = len(path)
+            for read, readers in self.readers.items():
+                if len(read) > n and read[:n] == path:
+                    nodes |= readers
+        return nodes
+
+    def _refresh(self, node: Node) -> None:
+        """Recompute a pending node; when its value changed, its users become pending"""
+        self._pending.discard(node)
+        old = self.values[node]
+        new = self._compute(node)
+        if new != old:
+            self._diff[node] = (self._diff[node][0] if node in self._diff else old, new)
+            for user in self.users.get(node, ()):
+                if user not in self._pending:
+                    self._pending.add(user)
+                    heapq.heappush(self._heap, (self.order[user], user))
+
+    def invalidate(self, paths: Iterable[Path]) -> Dict[Node, Tuple[Any, Any]]:
+        """Recompute what depends on the changed input paths → {node: (old, new)} of changed values"""
+        self._diff = {}
+        for node in self.affected(paths):
+            if node not in self._pending:
+                self._pending.add(node)
+                heapq.heappush(self._heap, (self.order[node], node))
+        while self._heap:
+            _, node = heapq.heappop(self._heap)
+            if node in self._pending:
+                self._refresh(node)
+        diff, self._diff = self._diff, {}
+        return diff
+
+
+def parse_path(text: str, stats: Dict[str, Any]) -> Path:
+    """'avg.OrderLine.product.categories' → ('avg', 'OrderLine', 'product.categories'): dotted keys win"""
+    parts = text.split(".")
+    path: List[str] = []
+    level: Any = stats
+    i = 0
+    while i < len(parts):
+        # The longest run of parts that is a key at this level, else one part
+        for j in range(len(parts), i, -1):
+            key = ".".join(parts[i:j])
+            if isinstance(level, dict) and dict.__contains__(level, key):
+                break
+        else:
+            key, j = parts[i], i + 1
+        path.append(key)
+        level = dict.get(level, key) if isinstance(level, dict) else None
+        i = j
+    return tuple(path)
+
+
+class ModelGraph:
+    def __init__(self, simulators: Sequence[Any], names: Sequence[str],
+                 queries: Optional[Sequence[Tuple[str, str, str, Optional[str], Optional[str]]]] = None):
+        """One NoSQLSimulator per model with its display name; queries default to the use case"""
+        self.graph = DependencyGraph()
+        self.sims = list(simulators)
+        self.names = list(names)
+        self.models = {name: i for i, name in enumerate(self.names)}
+        self.queries = {q[0]: q for q in (queries or USE_CASE)}
+        self.engines = [CostEngine(sim) for sim in self.sims]
+        for sim in self.sims:
+            self._track(sim)
+        for kind in ("doc_size", "collection_size", "database_size", "shard_stats", "cost", "total"):
+            self.graph.rule(kind, getattr(self, "_" + kind))
+
+    def _track(self, sim) -> None:
+        """Wrap the stats, rebuild the components on them (drops their caches), wrap the field sizes"""
+        stats = sim.stats if isinstance(sim.stats, TrackedDict) else TrackedDict(sim.stats, (), self.graph)
+        servers = sim.servers
+        sim._init_settings(stats, sim.indexes.sidecar)
+        sim.servers = servers
+        sim.field_sizes = TrackedDict(sim.field_sizes, ("field_sizes",), self.graph)
+
+    def _sim(self, model: str):
+        self.graph.read((SCHEMA, model))
+        return self.sims[self.models[model]]
+
+    # ---- rules ----
+
+    def _doc_size(self, model: str, collection: str) -> int:
+        return self._sim(model).compute_doc_size(collection)
+
+    def _collection_size(self, model: str, collection: str) -> float:
+        # NoSQLSimulator.collection_size_gb, on the doc_size node
+        n_docs = self._sim(model).stats.get("cardinality", {}).get(collection, 0)
+        return round((n_docs * self.graph.get(("doc_size", model, collection))) / (1024 ** 3), 3)
+
+    def _database_size(self, model: str) -> float:
+        total = 0
+        for collection in self._sim(model).collections:
+            total += self.graph.get(("collection_size", model, collection))
+        return round(total, 2)
+
+    def _shard_stats(self, model: str, collection: str, shard_key: str) -> Dict[str, Any]:
+        return self._sim(model).sharding_stats(collection, shard_key)
+
+    def _cost(self, model: str, label: str) -> Dict[str, Any]:
+        self._sim(model)
+        # A read shares the server's cache with every collection and index of the model: memory.py
+        # sizes them once per model, so a cost depends on all of their inputs whether it sized them or not
+        for path in COST_INPUTS:
+            self.graph.read(path)
+        _, collection, operator, shard_key, other = self.queries[label]
+        cost = self.engines[self.models[model]].evaluate_one(collection, operator, shard_key, other=other)
+        return {key: cost[key] for key in COST_FIELDS}
+
+    def _total(self, model: str) -> Dict[str, float]:
+        costs = [self.graph.get(("cost", model, label)) for label in self.queries]
+        return {"price_usd": sum(c["price_usd"] for c in costs),
+                "time_seconds": sum(c["time_seconds"] for c in costs)}
+
+    # ---- outputs and edits ----
+
+    def outputs(self, model: str) -> List[Node]:
+        """Every node of a model: sizes, shard stats on each top-level ID field, query costs, total"""
+        sim = self.sims[self.models[model]]
+        nodes: List[Node] = []
+        for collection, props in sim.collections.items():
+            nodes += [("doc_size", model, collection), ("collection_size", model, collection)]
+            nodes += [("shard_stats", model, collection, f) for f in props if f.startswith("ID")]
+        nodes.append(("database_size", model))
+        nodes += [("cost", model, label) for label in self.queries]
+        nodes.append(("total", model))
+        return nodes
+
+    def evaluate(self) -> Dict[Node, Any]:
+        """Values of every output node of every model (computed once, then kept up to date)"""
+        return {node: self.graph.get(node) for model in self.names for node in self.outputs(model)}
+
+    def update(self, edits: Dict[Union[str, Path], Any]) -> Dict[Node, Tuple[Any, Any]]:
+        """
+        Set stats values in every model ("cardinality.Client" or a key tuple) and
+        recompute what read them → {node: (old, new)} of the values that changed
+        """
+        paths = {}
+        for path, value in edits.items():
+            paths[parse_path(path, self.sims[0].stats) if isinstance(path, str) else tuple(path)] = value
+        for sim in self.sims:
+            for path, value in paths.items():
+                sim.stats.assign(path, value)
+            self._track(sim)
+        return self.graph.invalidate(paths)
+
+    def set_schemas(self, model: str, schemas: List[Dict[str, Any]]) -> Dict[Node, Tuple[Any, Any]]:
+        """Replace one model's schema and recompute that model's nodes"""
+        self.sims[self.models[model]].set_schemas(schemas)
+        return self.graph.invalidate([(SCHEMA, model)])
+
+
+def generated_models(stats_file: str = "stats.json", indexes_file: Optional[str] = "indexes.json",
+                     base_schema: str = "schemas/db1.json") -> Tuple[List[Any], List[str]]:
+    """Simulators of every denormalization of the base schema (as enumerated by model_search.py)"""
+    from main import NoSQLSimulator
+    from model_search import CHOICES, build_model, find_relationships, model_name
+
+    base = NoSQLSimulator(base_schema, stats_file, indexes_file)
+    relationships = find_relationships(base.schemas)
+    sims, names = [], []
+    for choices in itertools.product(CHOICES, repeat=len(relationships)):
+        model = build_model(base.schemas, base.stats, relationships, choices)
+        if model is not None:
+            sims.append(NoSQLSimulator.from_data(model[0], model[1], base.indexes.sidecar))
+            names.append(model_name(relationships, choices))
+    return sims, names
+
+
+def _changed(old: Any, new: Any) -> str:
+    if isinstance(old, dict) and isinstance(new, dict):
+        return ", ".join(f"{k} {old.get(k)} → {new.get(k)}" for k in new if old.get(k) != new.get(k))
+    return f"{old} → {new}"
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import os
+    import time
+
+    from main import NoSQLSimulator
+
+    parser = argparse.ArgumentParser(description="Edit stats values and recompute only the affected quantities")
+    parser.add_argument("edits", nargs="+", help="PATH=VALUE, e.g. cardinality.Client=2000000 (VALUE is JSON)")
+    parser.add_argument("--stats", default="stats.json")
+    parser.add_argument("--indexes", default="indexes.json")
+    parser.add_argument("--generated", action="store_true", help="also every denormalization of db1.json")
+    parser.add_argument("--check", action="store_true", help="compare with a full recomputation")
+    args = parser.parse_args()
+
+    def load_models():
+        folder = "schemas"
+        files = sorted(f for f in os.listdir(folder) if f.startswith("db") and f.endswith(".json"))
+        sims = [NoSQLSimulator(os.path.join(folder, f), args.stats, args.indexes) for f in files]
+        names = [f.replace('.json', '').upper() for f in files]
+        if args.generated:
+            more = generated_models(args.stats, args.indexes)
+            sims, names = sims + more[0], names + more[1]
+        return sims, names
+
+    edits = {}
+    for edit in args.edits:
+        path, _, text = edit.partition("=")
+        try:
+            edits[path] = json.loads(text)
+        except ValueError:
+            edits[path] = text
+
+    models = ModelGraph(*load_models())
+    started = time.perf_counter()
+    values = models.evaluate()
+    full = time.perf_counter() - started
+    computed = models.graph.computed
+    print(f"GRAPH: {len(models.names)} models, {len(values):,} outputs, {computed:,} nodes computed in {full:.3f}s")
+
+    started = time.perf_counter()
+    diff = models.update(edits)
+    incremental = time.perf_counter() - started
+    print(f"EDIT: {', '.join(args.edits)} → {models.graph.computed - computed:,} nodes recomputed "
+          f"in {incremental:.3f}s, {len(diff):,} changed")
+    for node, (old, new) in sorted(diff.items(), key=lambda d: [str(k) for k in d[0]]):
+        print(f"  {' / '.join(str(k) for k in node):<60}{_changed(old, new)}")
+
+    if args.check:
+        fresh = ModelGraph(*load_models())
+        fresh.update(edits)
+        expected = fresh.evaluate()
+        current = models.evaluate()
+        wrong = [node for node in expected if expected[node] != current[node]]
+        print(f"CHECK: {len(expected) - len(wrong):,} / {len(expected):,} outputs match a full recomputation")
+        for node in wrong[:20]:
+            print(f"  {' / '.join(str(k) for k in node):<60}{_changed(current[node], expected[node])}")
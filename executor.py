@@ -0,0 +1,271 @@
+# executor.py
+# Synthetic data + columnar execution engine to validate the cost model
+#
+# SyntheticData generates a scaled-down copy of the database from stats.json
+# (cardinality, distinct, avg) and a db*.json schema. Columns are stored as
+# `array` module arrays (8-byte ints), one per top-level scalar field,
+# generated on first use. ShardedExecutor partitions the rows across N simulated
+# shards and really runs filter / join / aggregate, recording measured docs
+# scanned and bytes touched (logical bytes of the column read) next to the cost
+# model's prediction for the same (scaled) instance, in the same units: the
+# predicted docs × the bytes of that column. Like the cost model, sharded work is
+# measured on the hottest shard: docs and seconds of that shard alone. Every
+# operator scans rows with the same Python loop, so their seconds per document
+# compare. Partitioning and column generation happen outside the timed section.
+#
+# Usage: python executor.py [--schema schemas/db1.json] [--scale 0.001] [--shards 10]
+
+import argparse
+import copy
+import random
+import time
+from array import array
+from typing import Any, Dict, List, Optional
+
+from main import NoSQLSimulator
+from cost_engine import CostEngine, OPERATOR_COSTS
+
+CHUNK_ROWS = 1_000_000     # rows generated per batch (bounds temporary memory)
+
+
+def _hash_key(value: int, shards: int) -> int:
+    """Multiplicative hash so neighbouring keys land on different shards"""
+    return ((value * 2654435761) & 0xFFFFFFFF) % shards
+
+
+class SyntheticData:
+    def __init__(self, nosql_simulator: NoSQLSimulator, scale: float = 0.001, seed: int = 42):
+        """
+        Scaled copy of the simulator's database: every cardinality and distinct
+        count is multiplied by `scale` (at least 1), averages are kept.
+        """
+        self.sim = nosql_simulator
+        self.scale = scale
+        self.seed = seed
+        self.stats = self._scaled_stats()
+        self.columns: Dict[str, Dict[str, array]] = {}
+
+    def _scaled_stats(self) -> Dict[str, Any]:
+        stats = copy.deepcopy(self.sim.stats)
+        stats["cardinality"] = {
+            name: max(1, round(n * self.scale)) for name, n in stats.get("cardinality", {}).items()
+        }
+        stats["distinct"] = {
+            name: {field: max(1, min(round(d * self.scale), stats["cardinality"].get(name, 1)))
+                   for field, d in fields.items()}
+            for name, fields in stats.get("distinct", {}).items()
+        }
+        return stats
+
+    def rows(self, collection: str) -> int:
+        return self.stats["cardinality"].get(collection, 0)
+
+    def distinct(self, collection: str, field: str) -> int:
+        """Distinct values of a field: stats first, then the owner of an ID* key, else all rows"""
+        known = self.stats["distinct"].get(collection, {}).get(field)
+        if known:
+            return known
+        for name, fields in self.stats["distinct"].items():
+            if field in fields and fields[field] == self.rows(name):
+                return fields[field]
+        return self.rows(collection)
+
+    def column(self, collection: str, field: str) -> array:
+        """Column of a top-level field as 8-byte ints (strings are dictionary codes)"""
+        cols = self.columns.setdefault(collection, {})
+        if field not in cols:
+            cols[field] = self._generate(collection, field)
+        return cols[field]
+
+    def _generate(self, collection: str, field: str) -> array:
+        n = self.rows(collection)
+        d = self.distinct(collection, field)
+        if d >= n:
+            return array('q', range(n))          # key of its own collection: 0..n-1
+        rng = random.Random(f"{self.seed}.{collection}.{field}")
+        values = range(d)
+        col = array('q')
+        for start in range(0, n, CHUNK_ROWS):
+            col.extend(rng.choices(values, k=min(CHUNK_ROWS, n - start)))
+        return col
+
+    def field_bytes(self, collection: str, field: str) -> int:
+        """Logical size of one value (key overhead + field size), as in compute_doc_size"""
+        spec = self.sim.get_collection_schema(collection).get(field, {})
+        return 12 + self.sim.compute_field_size(spec.get("type", "integer"), field)
+
+    def nbytes(self) -> int:
+        """Memory actually used by the generated columns"""
+        return sum(col.itemsize * len(col) for cols in self.columns.values() for col in cols.values())
+
+
+class ShardedExecutor:
+    def __init__(self, data: SyntheticData, shards: int = 10):
+        """Runs operators on SyntheticData partitioned across `shards` simulated servers"""
+        self.data = data
+        self.shards = shards
+        self.partitions: Dict[tuple, List[array]] = {}
+        # Cost model on the same scaled instance, so predictions are comparable
+        self.model = NoSQLSimulator.from_data(data.sim.schemas, data.stats, data.sim.indexes.sidecar)
+        self.model.servers = shards
+        self.engine = CostEngine(self.model)
+        self.measurements: List[Dict[str, Any]] = []
+
+    def partition(self, collection: str, shard_key: str) -> List[array]:
+        """Row ids held by every shard when `collection` is hash-sharded on `shard_key`"""
+        key = (collection, shard_key)
+        if key not in self.partitions:
+            parts = [array('q') for _ in range(self.shards)]
+            for row, value in enumerate(self.data.column(collection, shard_key)):
+                parts[_hash_key(value, self.shards)].append(row)
+            self.partitions[key] = parts
+        return self.partitions[key]
+
+    def _record(self, operator: str, collection: str, shard_key: Optional[str], measured_docs: int,
+                value_bytes: int, seconds: float, prediction: Dict[str, Any], **extra) -> Dict[str, Any]:
+        """One measurement; bytes are docs × value_bytes (the column read) on both sides"""
+        row = {
+            "operator": operator,
+            "collection": collection,
+            "shard_key": shard_key,
+            "predicted_docs": prediction["docs_scanned"],
+            "measured_docs": measured_docs,
+            "predicted_bytes": prediction["docs_scanned"] * value_bytes,
+            "measured_bytes": measured_docs * value_bytes,
+            "seconds": seconds,
+            "seconds_per_doc": seconds / measured_docs if measured_docs else 0.0,
+            "model_seconds_per_doc": OPERATOR_COSTS[operator][0],
+        }
+        row.update(extra)
+        self.measurements.append(row)
+        return row
+
+    def filter(self, collection: str, field: str, value: int, shard_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Equality filter. When the filter field is the shard key only the owning
+        shard is scanned, otherwise every shard is (timed as one full scan).
+        """
+        col = self.data.column(collection, field)
+        parts = self.partition(collection, shard_key) if shard_key == field else None
+        rows = parts[_hash_key(value, self.shards)] if parts is not None else range(len(col))
+        start = time.perf_counter()
+        matches = sum(1 for row in rows if col[row] == value)
+        seconds = time.perf_counter() - start
+        scanned = len(rows)
+
+        # Predicted by the same rule: the shard key narrows the scan only when it is the filter field
+        prediction = self.engine.evaluate_one(collection, "filter", shard_key if parts is not None else None)
+        return self._record("filter", collection, shard_key, scanned, self.data.field_bytes(collection, field),
+                            seconds, prediction, output_docs=matches,
+                            predicted_output_docs=self.model.selectivity.output_docs(collection, ("eq", field, None)))
+
+    def join(self, left: str, right: str, key: str, sharded: bool = True) -> Dict[str, Any]:
+        """
+        Hash join on `key`. Sharded: both sides are sharded on the key, every shard
+        joins locally and the hottest shard (docs and seconds) is reported.
+        Unsharded: one global join.
+        """
+        lcol, rcol = self.data.column(left, key), self.data.column(right, key)
+        if sharded:
+            scanned, seconds, output = 0, 0.0, 0
+            for lrows, rrows in zip(self.partition(left, key), self.partition(right, key)):
+                start = time.perf_counter()
+                build: Dict[int, int] = {}
+                for row in rrows:
+                    build[rcol[row]] = build.get(rcol[row], 0) + 1
+                output += sum(build.get(lcol[row], 0) for row in lrows)
+                elapsed = time.perf_counter() - start
+                if max(len(lrows), len(rrows)) > scanned:
+                    scanned, seconds = max(len(lrows), len(rrows)), elapsed
+        else:
+            start = time.perf_counter()
+            build = {}
+            for v in rcol:
+                build[v] = build.get(v, 0) + 1
+            output = sum(build.get(v, 0) for v in lcol)
+            seconds = time.perf_counter() - start
+            scanned = len(lcol) + len(rcol)
+
+        prediction = self.engine.evaluate_one(left, "join", key if sharded else None, other=right)
+        return self._record("join", f"{left} + {right}", key if sharded else None, scanned,
+                            self.data.field_bytes(left, key), seconds, prediction, output_docs=output,
+                            predicted_output_docs=prediction["output_docs"])
+
+    def aggregate(self, collection: str, group_key: str, shard_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        COUNT(*) GROUP BY group_key. Sharded: the hottest shard's local aggregation,
+        docs and seconds (what simulate_aggregate charges); otherwise a full scan.
+        """
+        col = self.data.column(collection, group_key)
+        parts = self.partition(collection, shard_key) if shard_key else None
+        if parts is not None:
+            scanned, groups, seconds = 0, 0, 0.0
+            for rows in parts:
+                start = time.perf_counter()
+                counts: Dict[int, int] = {}
+                for row in rows:
+                    counts[col[row]] = counts.get(col[row], 0) + 1
+                elapsed = time.perf_counter() - start
+                if len(rows) > scanned:
+                    scanned, groups, seconds = len(rows), len(counts), elapsed
+        else:
+            start = time.perf_counter()
+            counts = {}
+            for v in col:
+                counts[v] = counts.get(v, 0) + 1
+            seconds = time.perf_counter() - start
+            scanned, groups = len(col), len(counts)
+
+        prediction = self.engine.evaluate_one(collection, "aggregate", shard_key, field=group_key)
+        return self._record("aggregate", collection, shard_key, scanned,
+                            self.data.field_bytes(collection, group_key), seconds, prediction, output_docs=groups,
+                            predicted_output_docs=prediction["output_docs"])
+
+    def calibration(self) -> Dict[str, float]:
+        """Measured seconds per scanned document, per operator (on this machine)"""
+        totals: Dict[str, List[float]] = {}
+        for m in self.measurements:
+            t = totals.setdefault(m["operator"], [0.0, 0])
+            t[0] += m["seconds"]
+            t[1] += m["measured_docs"]
+        return {op: seconds / docs for op, (seconds, docs) in totals.items() if docs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate the cost model on synthetic data")
+    parser.add_argument("--schema", default="schemas/db1.json")
+    parser.add_argument("--stats", default="stats.json")
+    parser.add_argument("--indexes", default="indexes.json")
+    parser.add_argument("--scale", type=float, default=0.001)
+    parser.add_argument("--shards", type=int, default=10)
+    args = parser.parse_args()
+
+    data = SyntheticData(NoSQLSimulator(args.schema, args.stats, args.indexes), scale=args.scale)
+    ex = ShardedExecutor(data, shards=args.shards)
+    print(f"Synthetic data at scale {args.scale} on {args.shards} shards "
+          f"(OrderLine rows: {data.rows('OrderLine'):,})\n")
+
+    ex.filter("Stock", "IDP", 1, shard_key="IDP")
+    ex.filter("Stock", "IDP", 1)
+    ex.filter("Stock", "IDP", 1, shard_key="IDW")     # sharded on another field: every shard is scanned
+    ex.join("OrderLine", "Product", "IDP")
+    ex.aggregate("OrderLine", "IDP", shard_key="IDP")
+    ex.aggregate("OrderLine", "IDP")
+
+    print(f"{'Operator':<10}{'Collection':<22}{'Shard key':<11}{'Predicted docs':>16}{'Measured docs':>16}"
+          f"{'Predicted bytes':>17}{'Measured bytes':>16}{'Predicted out':>15}{'Measured out':>14}{'Seconds':>10}")
+    print("-" * 147)
+    for m in ex.measurements:
+        print(f"{m['operator']:<10}{m['collection']:<22}{str(m['shard_key']):<11}{m['predicted_docs']:>16,}"
+              f"{m['measured_docs']:>16,}{m['predicted_bytes']:>17,}{m['measured_bytes']:>16,}"
+              f"{m['predicted_output_docs']:>15,}"
+              f"{m['output_docs']:>14,}{m['seconds']:>10.4f}")
+
+    print("\nCALIBRATION (seconds per scanned document):")
+    for op, measured in ex.calibration().items():
+        print(f"  {op:<10} measured {measured:.2e}   model {OPERATOR_COSTS[op][0]:.2e}")
+    print(f"\nColumn memory: {data.nbytes() / 1024 ** 2:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
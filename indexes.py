@@ -0,0 +1,162 @@
+# indexes.py
+# Secondary index subsystem: declarations, B-tree sizing, index-vs-scan planning, maintenance
+#
+# Indexes are declared either inside a schema file, per collection:
+#   { "collection": "Product", "properties": {...}, "indexes": [ {"fields": ["brand"]} ] }
+# or in a sidecar file shared by every model (indexes.json):
+#   { "Product": [ {"fields": ["brand"]} ], "OrderLine": [ {"fields": ["IDC", "date"]} ] }
+# A collection's own identifier (distinct values == documents, e.g. Product.IDP) is
+# always indexed, like MongoDB's _id index.
+
+import json
+import math
+from typing import Any, Dict, List, Optional
+
+from sharding import HASH
+from size_plan import item_properties
+from tracing import traced
+
+POINTER_BYTES = 8          # record id stored next to every key
+ENTRY_OVERHEAD = 4         # per-entry slot / header bytes
+LEAF_FILL = 0.7            # average B-tree page fill factor
+PAGE_BYTES = 4096
+INDEX_KEY_COST = 0.1       # one index key comparison, in scanned-document equivalents
+RANDOM_FETCH_COST = 4.0    # fetching a document by record id vs reading it in a scan
+
+
+def load_index_file(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Read a sidecar index declaration file ({collection: [index, ...]})"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class IndexModel:
+    def __init__(self, nosql_simulator, declarations: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        """
+        Connects to the main NoSQLSimulator. `declarations` are the sidecar
+        indexes; per-collection "indexes" in the schema are added on top.
+        """
+        self.sim = nosql_simulator
+        self.sidecar = declarations or {}
+
+    def indexes(self, collection: str) -> List[Dict[str, Any]]:
+        """Every index of a collection: implicit identifier index, sidecar, schema"""
+        if not self.sim.get_collection_schema(collection):
+            return []
+        found, seen = [], set()
+        n_docs = self._cardinality(collection)
+        for field, d in self.sim.stats.get("distinct", {}).get(collection, {}).items():
+            if n_docs and d == n_docs:
+                found.append({"fields": [field], "unique": True, "implicit": True})
+        schema_decl = next((c.get("indexes", []) for c in self.sim.schemas if c.get("collection") == collection), [])
+        for index in list(self.sidecar.get(collection, [])) + list(schema_decl):
+            found.append(index)
+        result = []
+        for index in found:
+            fields = tuple(index.get("fields", []))
+            if fields and fields not in seen and all(self._field_type(collection, f) for f in fields):
+                seen.add(fields)
+                result.append(index)
+        return result
+
+    def _cardinality(self, collection: str) -> int:
+        return self.sim.stats.get("cardinality", {}).get(collection, 0)
+
+    def _field_type(self, collection: str, field: str) -> Optional[str]:
+        """Type of a (possibly dotted) field, None if the model does not have it"""
+        props = self.sim.get_collection_schema(collection)
+        spec: Dict[str, Any] = {}
+        for part in field.split("."):
+            spec = props.get(part, {})
+            props = spec.get("properties") or item_properties(spec.get("items") or {})
+        return spec.get("type")
+
+    def find_index(self, collection: str, field: str) -> Optional[Dict[str, Any]]:
+        """Index usable for an equality on `field` (it must be the index's first field)"""
+        for index in self.indexes(collection):
+            if index["fields"][0] == field:
+                return index
+        return None
+
+    def index_stats(self, collection: str, index: Dict[str, Any], servers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        B-tree estimate: one entry per document; leading-key prefixes are stored once
+        per distinct value (prefix compression), the rest of the entry per document.
+        """
+        servers = servers or self.sim.servers
+        fields = index["fields"]
+        entries = self._cardinality(collection)
+        key_bytes = [self.sim.compute_field_size(self._field_type(collection, f) or "string", f) for f in fields]
+        leading_distinct = self.sim.stats.get("distinct", {}).get(collection, {}).get(fields[0], entries)
+        raw = leading_distinct * key_bytes[0] + entries * (sum(key_bytes[1:]) + POINTER_BYTES + ENTRY_OVERHEAD)
+        leaf_bytes = raw / LEAF_FILL
+        per_page = max(2, int(PAGE_BYTES * LEAF_FILL // (sum(key_bytes) + POINTER_BYTES + ENTRY_OVERHEAD)))
+        leaves = max(1, math.ceil(leaf_bytes / PAGE_BYTES))
+        depth = 1 + (math.ceil(math.log(leaves, per_page)) if leaves > 1 else 0)
+        size_bytes = leaf_bytes * (1 + 1 / per_page)     # + internal levels
+        hot = self.sim.sharding.hot_docs(collection, fields[0], servers) if entries else 0
+        return {
+            "collection": collection,
+            "fields": list(fields),
+            "entries": entries,
+            "depth": depth,
+            "size_gb": round(size_bytes / 1024 ** 3, 4),
+            "per_server_gb": round(size_bytes / max(1, servers) / 1024 ** 3, 6),
+            "hottest_server_gb": round(size_bytes * (hot / entries if entries else 0) / 1024 ** 3, 6),
+        }
+
+    def total_index_size_gb(self) -> float:
+        """Size of every index of the model"""
+        return round(sum(self.index_stats(c, i)["size_gb"] for c in self.sim.collections for i in self.indexes(c)), 3)
+
+    def equality_selectivity(self, collection: str, field: str, value=None) -> float:
+        """Fraction of documents matching field = value (see selectivity.py)"""
+        return self.sim.selectivity.equality(collection, field, value)
+
+    @traced
+    def plan_filter(self, collection: str, field: Optional[str], shard_key: Optional[str] = None,
+                    servers: Optional[int] = None, selectivity: Optional[float] = None,
+                    scheme: str = HASH) -> Dict[str, Any]:
+        """
+        Choose index seek + fetch or collection scan for an equality filter on `field`,
+        on the hottest shard when sharded (`scheme` layout), on every document otherwise.
+        Returns the access path and its cost in scanned-document equivalents.
+        """
+        servers = servers or self.sim.servers
+        n_docs = self._cardinality(collection)
+        node_docs = self.sim.sharding.hot_docs(collection, shard_key, servers, scheme) if shard_key else n_docs
+        scan = {"access_path": "scan", "index": None, "keys_examined": 0,
+                "docs_examined": node_docs, "cost_docs": float(node_docs)}
+        index = self.find_index(collection, field) if field else None
+        if index is None:
+            return scan
+
+        sel = selectivity if selectivity is not None else self.equality_selectivity(collection, field)
+        if shard_key and shard_key == field:
+            matches = min(node_docs, math.ceil(round(n_docs * sel, 6)))   # all matches live on one shard
+        else:
+            matches = math.ceil(round(node_docs * sel, 6))
+        depth = self.index_stats(collection, index, servers)["depth"]
+        seek = {"access_path": "index", "index": index["fields"], "keys_examined": matches,
+                "docs_examined": matches,
+                "cost_docs": (depth + matches) * INDEX_KEY_COST + matches * RANDOM_FETCH_COST}
+        return seek if seek["cost_docs"] < scan["cost_docs"] else scan
+
+    @traced
+    def maintenance(self, collection: str, docs_written: int,
+                    changed_fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Index work caused by writing `docs_written` documents: every affected index
+        descends its B-tree and rewrites one leaf entry per document.
+        changed_fields=None means insert / delete (every index is touched).
+        """
+        index_writes, cost_docs, touched = 0, 0.0, []
+        for index in self.indexes(collection):
+            if changed_fields is not None and not set(index["fields"]) & set(changed_fields):
+                continue
+            depth = self.index_stats(collection, index)["depth"]
+            index_writes += docs_written
+            cost_docs += docs_written * (depth * INDEX_KEY_COST + RANDOM_FETCH_COST)
+            touched.append(index["fields"])
+        return {"indexes_touched": touched, "index_writes": index_writes, "cost_docs": cost_docs}
+
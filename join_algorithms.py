@@ -0,0 +1,294 @@
+# join_algorithms.py
+# Join algorithm cost models: hash, index nested-loop, sort-merge, nested loop
+#
+# Every algorithm turns the two join inputs into resource usage on the busiest
+# server (CPU document visits, memory, disk I/O). choose_join() converts each one
+# to time / carbon / price and keeps the cheapest.
+#
+# Before a local algorithm runs, the inputs must meet on the same servers. The
+# data movement (placement) strategies, costed with topology.py:
+#   co-located - both sides sharded on the join key: every shard joins its own slice
+#   shuffle    - re-partition the misaligned side(s) on the join key, then join per shard
+#   gather     - bring both sides to one node (free when both are unsharded)
+#   broadcast  - copy the smaller side to every server holding the sharded larger one
+# Data that moved has no index any more; only a side read in place keeps its index.
+#
+# New algorithms can be plugged in with register_join_algorithm(name, function).
+
+import math
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from indexes import INDEX_KEY_COST, RANDOM_FETCH_COST
+from topology import Topology, combine
+from tracing import traced
+
+MEMORY_BUDGET_BYTES = 4 * 1024 ** 3   # per server, for hash tables and sort buffers
+HASH_ENTRY_OVERHEAD = 16              # bytes per hash-table entry on top of the document
+IO_SECONDS_PER_GB = 5.0               # sequential disk read or write
+PAGE_BYTES = 4096                     # one random page read per fetched document
+INDEX_FANOUT = 100                    # B-tree fanout → node visits per lookup
+SORT_MERGE_FANOUT = 64                # runs merged per external-sort pass
+NO_MOVEMENT = {"pattern": "none", "bytes_moved": 0, "seconds": 0.0, "price_usd": 0.0, "carbon_grams": 0.0}
+
+
+class JoinInput:
+    """One side of a join as seen by the server executing it"""
+
+    __slots__ = ("collection", "docs", "doc_size", "indexed", "keys")
+
+    def __init__(self, collection: str, docs: int, doc_size: int, indexed: bool, keys: int):
+        self.collection = collection
+        self.docs = docs
+        self.doc_size = doc_size
+        self.indexed = indexed
+        self.keys = max(1, keys)      # distinct join-key values on this server
+
+    @property
+    def docs_per_key(self) -> float:
+        return self.docs / self.keys
+
+    @property
+    def bytes(self) -> int:
+        return self.docs * self.doc_size
+
+
+class JoinSide:
+    """
+    One side of a join as stored in the cluster. placement: "aligned" (sharded on
+    the join key), "sharded" (on another key) or "single" (one node). docs_by_key is
+    the hottest server's share once partitioned on the join key, docs_local its
+    share where it lies now.
+    """
+
+    __slots__ = ("collection", "docs", "doc_size", "indexed", "keys", "placement", "docs_by_key", "docs_local")
+
+    def __init__(self, collection: str, docs: int, doc_size: int, indexed: bool, keys: int,
+                 placement: str = "single", docs_by_key: Optional[int] = None, docs_local: Optional[int] = None):
+        self.collection = collection
+        self.docs = docs
+        self.doc_size = doc_size
+        self.indexed = indexed
+        self.keys = max(1, keys)      # distinct join-key values in the whole side
+        self.placement = placement
+        self.docs_by_key = docs if docs_by_key is None else docs_by_key
+        self.docs_local = docs if docs_local is None else docs_local
+
+    @property
+    def bytes(self) -> int:
+        return self.docs * self.doc_size
+
+    def whole(self, indexed: bool) -> JoinInput:
+        """All the documents on one server"""
+        return JoinInput(self.collection, self.docs, self.doc_size, indexed, min(self.keys, self.docs))
+
+    def by_key(self, servers: int, indexed: bool) -> JoinInput:
+        """The hottest server's slice once partitioned on the join key"""
+        docs = self.docs_by_key
+        return JoinInput(self.collection, docs, self.doc_size, indexed, min(self.keys // servers, docs))
+
+    def local(self, servers: int) -> JoinInput:
+        """The hottest server's slice where it lies now (sharded on another key)"""
+        docs = self.docs_local
+        return JoinInput(self.collection, docs, self.doc_size, self.indexed, min(self.keys, docs))
+
+
+def _usage(cpu_docs, memory_bytes=0, io_bytes=0) -> Dict[str, float]:
+    return {
+        "cpu_docs": cpu_docs,
+        "memory_bytes": memory_bytes,
+        "io_bytes": io_bytes,
+    }
+
+
+def nested_loop_join(left: JoinInput, right: JoinInput, servers: int, co_partitioned: bool):
+    """Every pair of documents is compared (the original model)"""
+    return _usage(left.docs * right.docs)
+
+
+def hash_join(left: JoinInput, right: JoinInput, servers: int, co_partitioned: bool):
+    """Build a hash table on the smaller side, probe with the larger; spill (grace hash) past the budget"""
+    build, probe = (left, right) if left.bytes <= right.bytes else (right, left)
+    table_bytes = build.docs * (build.doc_size + HASH_ENTRY_OVERHEAD)
+    io_bytes = 0
+    if table_bytes > MEMORY_BUDGET_BYTES:
+        # Partition both sides to disk and read them back once
+        io_bytes = 2 * (build.bytes + probe.bytes)
+    return _usage(build.docs + probe.docs, min(table_bytes, MEMORY_BUDGET_BYTES), io_bytes)
+
+
+def index_nested_loop_join(left: JoinInput, right: JoinInput, servers: int, co_partitioned: bool):
+    """
+    For each outer document, descend the inner side's index and fetch the
+    matching documents by record id (needs an index on the inner side)
+    """
+    if right.indexed and (not left.indexed or left.docs >= right.docs):
+        outer, inner, index_side = left, right, 1
+    elif left.indexed:
+        outer, inner, index_side = right, left, 0
+    else:
+        return None
+    depth = max(1, math.ceil(math.log(max(inner.docs, 2), INDEX_FANOUT)))
+    fetched = outer.docs * inner.docs_per_key
+    cpu = outer.docs * (1 + depth * INDEX_KEY_COST) + fetched * RANDOM_FETCH_COST
+    usage = _usage(cpu, 0, fetched * PAGE_BYTES)
+    usage["index_side"] = index_side     # 0 = left, 1 = right: the side read through its index
+    return usage
+
+
+def sort_merge_join(left: JoinInput, right: JoinInput, servers: int, co_partitioned: bool):
+    """Sort both sides on the key and merge; external sort passes past the budget"""
+    cpu = sum(side.docs * max(1.0, math.log2(max(side.docs, 2))) for side in (left, right))
+    total = left.bytes + right.bytes
+    io_bytes = 0
+    if total > MEMORY_BUDGET_BYTES:
+        runs = math.ceil(total / MEMORY_BUDGET_BYTES)
+        passes = max(1, math.ceil(math.log(runs, SORT_MERGE_FANOUT)))
+        io_bytes = 2 * total * passes
+    return _usage(cpu + left.docs + right.docs, min(total, MEMORY_BUDGET_BYTES), io_bytes)
+
+
+JOIN_ALGORITHMS: Dict[str, Callable] = {
+    "hash": hash_join,
+    "index_nested_loop": index_nested_loop_join,
+    "sort_merge": sort_merge_join,
+    "nested_loop": nested_loop_join,
+}
+
+
+def register_join_algorithm(name: str, function: Callable):
+    """Add (or replace) a join algorithm: function(left, right, servers, co_partitioned) -> usage or None"""
+    JOIN_ALGORITHMS[name] = function
+
+
+def usage_cost(usage: Dict[str, float], unit_costs: Tuple[float, float, float],
+               movement: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+    """
+    Time from CPU / I/O usage plus the data movement (topology.movement()). unit_costs
+    are the join per-document (seconds, grams CO2, USD); carbon and price follow the
+    same ratios as time, plus the movement's per-GB transfer price and carbon.
+    """
+    seconds_per_doc, carbon_per_doc, price_per_doc = unit_costs
+    movement = movement or NO_MOVEMENT
+    time_s = (usage["cpu_docs"] * seconds_per_doc
+              + usage["io_bytes"] / 1024 ** 3 * IO_SECONDS_PER_GB
+              + movement["seconds"])
+    return {
+        "time_seconds": time_s,
+        "carbon_grams": time_s * carbon_per_doc / seconds_per_doc + movement["carbon_grams"],
+        "price_usd": time_s * price_per_doc / seconds_per_doc + movement["price_usd"],
+    }
+
+
+def has_index(sim, collection: str, key: str) -> bool:
+    """Index on the join key, declared or implicit (see indexes.py)"""
+    return sim.indexes.find_index(collection, key) is not None
+
+
+def infer_join_key(sim, coll1: str, coll2: str) -> Optional[str]:
+    """Shared top-level ID* field of two collections (e.g. OrderLine / Product → IDP)"""
+    fields1 = sim.get_collection_schema(coll1)
+    for field in sim.get_collection_schema(coll2):
+        if field.startswith("ID") and field in fields1:
+            return field
+    return None
+
+
+def join_side(sim, collection: str, key: Optional[str], shard_key: Optional[str], servers: int) -> JoinSide:
+    """A base collection as a join side, sharded on `shard_key` (None = one node)"""
+    card = sim.stats.get("cardinality", {})
+    docs = card.get(collection, 0)
+    keys = sim.stats.get("distinct", {}).get(collection, {}).get(key, docs) if key else 1
+    if not shard_key:
+        placement = "single"
+    else:
+        placement = "aligned" if shard_key == key else "sharded"
+    return JoinSide(collection, docs, sim.compute_doc_size(collection),
+                    bool(key) and has_index(sim, collection, key), min(keys, docs), placement,
+                    docs_by_key=sim.sharding.hot_docs(collection, key, servers) if key else docs,
+                    docs_local=sim.sharding.hot_docs(collection, shard_key, servers) if shard_key else docs)
+
+
+@traced
+def choose_join(sim, coll1: str, coll2: str, key: Optional[str], co_partitioned: bool,
+                unit_costs: Tuple[float, float, float], servers: Optional[int] = None,
+                shard_keys: Optional[Tuple[Optional[str], Optional[str]]] = None) -> Dict[str, Any]:
+    """
+    Cost every placement and algorithm for coll1 ⋈ coll2 on `key` (the shared ID
+    field when both schemas are known and one lacks `key`) and return the cheapest:
+    {"join_algorithm", "data_movement", "join_key", "docs_scanned", "time_seconds", "carbon_grams", "price_usd",
+     "memory_bytes", "io_bytes", "network_bytes", "network_seconds", "index_side",
+     "alternatives": {"placement/algorithm": time_seconds}}
+    shard_keys gives each side's own shard key; by default both sides are sharded on
+    the join key when co_partitioned, unsharded otherwise.
+    """
+    servers = servers or sim.servers
+    schemas = [sim.get_collection_schema(coll) for coll in (coll1, coll2)]
+    if not key or all(schemas) and not all(key in schema for schema in schemas):
+        key = infer_join_key(sim, coll1, coll2)
+    if shard_keys is None:
+        shard_keys = (key, key) if co_partitioned else (None, None)
+    left, right = (join_side(sim, coll, key, k, servers) for coll, k in zip((coll1, coll2), shard_keys))
+    result = cheapest_join(left, right, bool(key), servers, unit_costs, getattr(sim, "topology", None))
+    result["join_key"] = key
+    return result
+
+
+def placements(left: JoinSide, right: JoinSide, has_key: bool, servers: int, topology: Topology):
+    """Yield (placement, left JoinInput, right JoinInput, movement) for every way the sides can meet"""
+    sides = (left, right)
+    if has_key and servers > 1 and all(s.placement == "aligned" for s in sides):
+        yield "co-located", left.by_key(servers, left.indexed), right.by_key(servers, right.indexed), NO_MOVEMENT
+        return
+    if has_key and servers > 1:
+        moves = []
+        for s in sides:
+            if s.placement == "sharded":
+                moves.append(topology.movement("shuffle", s.bytes, servers))
+            elif s.placement == "single":
+                moves.append(topology.movement("scatter", s.bytes, servers))
+        inputs = [s.by_key(servers, s.indexed and s.placement == "aligned") for s in sides]
+        yield "shuffle", inputs[0], inputs[1], combine(moves)
+    moves = [topology.movement("gather", s.bytes, servers) for s in sides if s.placement != "single"]
+    inputs = [s.whole(s.indexed and s.placement == "single") for s in sides]
+    yield "gather", inputs[0], inputs[1], combine(moves) if moves else NO_MOVEMENT
+    small, large = sorted(sides, key=lambda s: s.bytes)
+    if servers > 1 and large.placement != "single" and small is not large:
+        moves = [topology.movement("gather", small.bytes, servers)] if small.placement != "single" else []
+        moves.append(topology.movement("broadcast", small.bytes, servers))
+        inputs = {id(small): small.whole(False), id(large): large.local(servers)}
+        yield "broadcast", inputs[id(left)], inputs[id(right)], combine(moves)
+
+
+@traced
+def cheapest_join(left: JoinSide, right: JoinSide, has_key: bool, servers: int,
+                  unit_costs: Tuple[float, float, float], topology: Optional[Topology] = None) -> Dict[str, Any]:
+    """Cost every placement × algorithm on two join sides (base collections or intermediate results)"""
+    topology = topology or Topology()
+    best, alternatives = None, {}
+    for placement, l_in, r_in, movement in placements(left, right, has_key, servers, topology):
+        co_partitioned = placement in ("co-located", "shuffle")
+        for name, function in JOIN_ALGORITHMS.items():
+            if not has_key and name != "nested_loop":
+                continue    # without a join key only the cross product is possible
+            usage = function(l_in, r_in, servers, co_partitioned)
+            if usage is None:
+                continue
+            cost = usage_cost(usage, unit_costs, movement)
+            alternatives[f"{placement}/{name}"] = cost["time_seconds"]
+            if best is None or cost["time_seconds"] < best[4]["time_seconds"]:
+                best = (placement, name, usage, movement, cost)
+
+    placement, name, usage, movement, cost = best
+    result = {
+        "join_algorithm": name,
+        "data_movement": placement,
+        "docs_scanned": int(math.ceil(usage["cpu_docs"])),
+        "memory_bytes": int(usage["memory_bytes"]),
+        "io_bytes": int(usage["io_bytes"]),
+        "network_bytes": int(movement["bytes_moved"]),
+        "network_seconds": movement["seconds"],
+        "index_side": usage.get("index_side"),
+        "alternatives": alternatives,
+    }
+    result.update(cost)
+    return result
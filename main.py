@@ -1,17 +1,47 @@
 import json
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+
+from aggregation import AggregationModel
+from cost_engine import CostEngine
+from indexes import IndexModel, load_index_file
+from memory import MemoryModel
+from placement import PlacementModel
+from resharding import ReshardingModel
+from selectivity import SelectivityEstimator
+from sharding import ShardingModel
+from storage import StorageModel
+from size_plan import compile_collection, compile_schema, load_compiled_schema
+from topology import Topology
+from tracing import traced
+from write_path import WriteModel
 
 class NoSQLSimulator:
-    def __init__(self, schema_file: str, stats_file: str):
+    def __init__(self, schema_file: str, stats_file: str, indexes_file: Optional[str] = None):
         """
         Initialize the simulator with a schema file (e.g., db1.json) and stats file.
+        indexes_file is an optional sidecar of index declarations (e.g., indexes.json).
         """
         self.load_schema(schema_file)
         with open(stats_file, 'r', encoding='utf-8') as f:
-            self.stats = json.load(f)
-        
+            stats = json.load(f)
+        self._init_settings(stats, load_index_file(indexes_file) if indexes_file else None)
+
+    def _init_settings(self, stats: Dict[str, Any], index_declarations=None):
+        """Stats plus the cluster / field-size / index settings shared by every constructor"""
+        self.stats = stats
         self.servers = 1000
+        self.sharding = ShardingModel(self)
+        self.indexes = IndexModel(self, index_declarations)
+        self.selectivity = SelectivityEstimator(self)
+        self.topology = Topology()
+        self.writes = WriteModel(self)
+        self.memory = MemoryModel(self)
+        self.storage = StorageModel(self)
+        self.aggregation = AggregationModel(self)
+        self.resharding = ReshardingModel(self)
+        self.placement = PlacementModel(self)
+        self.engine = CostEngine(self)    # costs of the filter / join wrappers below
         self.field_sizes = {
             "integer": 8,
             "number": 8,
@@ -19,18 +49,35 @@ class NoSQLSimulator:
             "date": 20,
             "longstring": 200
         }
+        # Measured sizes (profiler.py) replace the fixed ones
+        self.field_sizes.update(stats.get("field_sizes", {}))
+
+    @classmethod
+    def from_data(cls, schemas: List[Dict[str, Any]], stats: Dict[str, Any], index_declarations=None):
+        """Build a simulator from an in-memory schema list and stats dict (e.g. generated models)"""
+        sim = cls.__new__(cls)
+        sim._init_settings(stats, index_declarations)
+        sim.set_schemas(schemas)
+        return sim
 
     def load_schema(self, schema_file: str):
-        """Load the JSON schema file (db1.json, db2.json, etc.)"""
-        with open(schema_file, 'r', encoding='utf-8') as f:
-            self.schemas = json.load(f)
+        """Load the JSON schema file (db1.json, db2.json, etc.) and its compiled size plans"""
+        self.set_schemas(*load_compiled_schema(schema_file))
+
+    def set_schemas(self, schemas: List[Dict[str, Any]], size_plans=None):
+        """Use a schema list directly; size plans are compiled unless given"""
+        self.schemas = schemas
+        self.size_plans = size_plans if size_plans is not None else compile_schema(schemas)
+        self.collections = {
+            coll["collection"]: coll.get("properties", {})
+            for coll in self.schemas
+            if coll.get("collection")
+        }
+        self._projection_plans = {}
 
     def get_collection_schema(self, name: str):
         """Find the schema for a specific collection (Product, Stock, etc.)"""
-        for coll in self.schemas:
-            if coll.get("collection") == name:
-                return coll.get("properties", {})
-        return {}
+        return self.collections.get(name, {})
 
     def compute_field_size(self, field_type: str, field_name: str = "") -> int:
         """Return size for basic field types"""
@@ -38,50 +85,47 @@ class NoSQLSimulator:
             return self.field_sizes[field_type]
         return 80  # default fallback
 
-    def compute_doc_size(self, collection: str) -> int:
-        """Calculate size of one document in bytes """
-        schema = self.get_collection_schema(collection)
-        if not schema:
+    @traced
+    def compute_doc_size(self, collection: str, fmt: Optional[str] = None) -> float:
+        """
+        Calculate size of one document in bytes.
+        Uses the compiled size plan (see size_plan.py): nested objects and
+        arrays are sized at any depth, arrays multiplied by stats["avg"].
+        fmt: size in a storage format instead ("bson", "compact", "columnar", see storage.py)
+        """
+        if fmt not in (None, "logical"):
+            return self.storage.doc_size(collection, fmt)
+        plan = self.size_plans.get(collection)
+        if plan is None:
             return 0
-        
-        size = 0
-        
-        for field, spec in schema.items():
-            ftype = spec.get("type")
-            if not ftype:
-                continue
-                
-            # Every field has 12B key overhead 
-            size += 12
-
-            if ftype in ["integer", "number", "string", "date", "longstring"]:
-                size += self.compute_field_size(ftype, field)
-            
-            elif ftype == "object":
-                # Nested object (e.g. price, supplier)
-                obj_props = spec.get("properties", {})
-                for subfield, subspec in obj_props.items():
-                    size += 12 + self.compute_field_size(subspec.get("type", "string"), subfield)
-            
-            elif ftype == "array":
-                # Array (e.g. categories, orderlines)
-                avg_count = self.stats.get("avg", {}).get(collection, {}).get(field, 1)
-                item_props = spec.get("items", {}).get("properties", {})
-                item_size = 0
-                for subfield, subspec in item_props.items():
-                    item_size += 12 + self.compute_field_size(subspec.get("type", "string"), subfield)
-                size += 12 + avg_count * item_size  # array overhead + items
-
-        return size
-
-    def collection_size_gb(self, collection: str) -> float:
-        """Size of one collection in GB"""
+        return plan.evaluate(self.field_sizes, self.stats.get("avg", {}).get(collection, {}))
+
+    @traced
+    def compute_fields_size(self, collection: str, fields) -> int:
+        """
+        Size in bytes of a projection of one document: only the given
+        top-level fields (nested objects / arrays are sized in full).
+        """
+        key = (collection, tuple(sorted(fields)))
+        if key not in self._projection_plans:
+            props = self.get_collection_schema(collection)
+            self._projection_plans[key] = compile_collection({f: props[f] for f in key[1] if f in props})
+        return self._projection_plans[key].evaluate(self.field_sizes, self.stats.get("avg", {}).get(collection, {}))
+
+    @traced
+    def collection_size_gb(self, collection: str, fmt: Optional[str] = None, codec: Optional[str] = None) -> float:
+        """Size of one collection in GB; with fmt / codec, its stored size (uncompressed unless codec is given)"""
+        if fmt or codec:
+            return self.storage.collection_size_gb(collection, fmt or self.storage.fmt, codec or "none")
         doc_size = self.compute_doc_size(collection)
         n_docs = self.stats.get("cardinality", {}).get(collection, 0)
         return round((n_docs * doc_size) / (1024 ** 3), 3)
 
-    def database_size_gb(self) -> float:
-        """Total database size in GB across all collections"""
+    @traced
+    def database_size_gb(self, fmt: Optional[str] = None, codec: Optional[str] = None) -> float:
+        """Total database size in GB across all collections; fmt / codec as in collection_size_gb"""
+        if fmt or codec:
+            return self.storage.database_size_gb(fmt or self.storage.fmt, codec or "none")
         total = 0
         for coll in self.schemas:
             coll_name = coll.get("collection")
@@ -89,14 +133,14 @@ class NoSQLSimulator:
                 total += self.collection_size_gb(coll_name)
         return round(total, 2)
 
-    def sharding_stats(self, collection: str, shard_key: str) -> Dict[str, int]:
-        """Simulate sharding over 1000 servers"""
-        n_docs = self.stats.get("cardinality", {}).get(collection, 0)
-        n_keys = self.stats.get("distinct", {}).get(collection, {}).get(shard_key, n_docs)
-        return {
-            "docs_per_server": n_docs // self.servers,
-            "distinct_keys_per_server": n_keys // self.servers
-        }
+    @traced
+    def sharding_stats(self, collection: str, shard_key: str, scheme: str = "hash") -> Dict[str, Any]:
+        """
+        Simulate sharding over 1000 servers (see sharding.py).
+        Keeps the average docs / keys per server and adds the skew report:
+        max / p99 / min docs per server, empty servers, hot-shard factor, max bytes.
+        """
+        return self.sharding.stats(collection, shard_key, scheme=scheme)
 
     def analyze_db(self, db_file: str) -> float:
         """
@@ -125,11 +169,20 @@ class NoSQLSimulator:
                 print(f"  {coll}: {size_gb:.3f} GB")
                 total_gb += size_gb
         print(f"  TOTAL DB: {total_gb:.2f} GB")
+        print(f"  STORED ({self.storage.fmt} + {self.storage.codec}): {self.storage.database_size_gb():.2f} GB")
+        
+        # Index sizes (implicit identifier indexes + declared ones)
+        print("\nINDEX SIZES (GB, total / per server):")
+        for coll in self.collections:
+            for index in self.indexes.indexes(coll):
+                info = self.indexes.index_stats(coll, index)
+                print(f"  {coll}({', '.join(info['fields'])}): {info['size_gb']:.3f} / {info['per_server_gb']:.6f}")
         
         # Sharding examples
         print("\nSHARDING EXAMPLES:")
         if self.get_collection_schema("Stock"):
             print(f"  Stock - IDP: {self.sharding_stats('Stock', 'IDP')}")
+            print(f"  Stock - IDW: {self.sharding_stats('Stock', 'IDW')}")
         if self.get_collection_schema("OrderLine"):
             print(f"  OrderLine - IDC: {self.sharding_stats('OrderLine', 'IDC')}")
         if self.get_collection_schema("Product"):
@@ -139,72 +192,69 @@ class NoSQLSimulator:
     
         # ──────────────── FILTER & JOIN SIMULATION ────────────────
 
-    def filter_with_sharding(self, collection, shard_key):
-        """Fast filter – uses sharding key → only 1 server scanned"""
-        total_docs = self.stats.get("cardinality", {}).get(collection, 0)
-        docs_scanned = total_docs // self.servers
-        
-        time_s = docs_scanned * 0.01      # 10 ms per document scanned
-        carbon_g = docs_scanned * 0.0001  # rough gCO2 per doc
-        price_usd = docs_scanned * 0.000001
+    @traced
+    def filter_with_sharding(self, collection, shard_key, field=None, value=None):
+        """Fast filter – uses sharding key → only 1 server scanned (index on `field` if cheaper)"""
+        cost = self.engine.evaluate_one(collection, "filter", shard_key, field=field, value=value)
         
         return {
             "query_type": "filter_with_sharding",
-            "docs_scanned": docs_scanned,
-            "time_seconds": round(time_s, 2),
-            "carbon_grams": round(carbon_g, 2),
-            "price_usd": round(price_usd, 4)
+            "access_path": cost["access_path"],
+            "docs_scanned": cost["docs_scanned"],
+            "output_docs": cost["output_docs"],
+            "output_size_gb": round(cost["output_bytes"] / 1024 ** 3, 4),
+            "time_seconds": round(cost["time_seconds"], 2),
+            "carbon_grams": round(cost["carbon_grams"], 2),
+            "price_usd": round(cost["price_usd"], 4)
         }
 
-    def filter_without_sharding(self, collection):
-        """Slow filter – full scan of all documents"""
-        total_docs = self.stats.get("cardinality", {}).get(collection, 0)
-        docs_scanned = total_docs
-        
-        time_s = docs_scanned * 0.01
-        carbon_g = docs_scanned * 0.0001
-        price_usd = docs_scanned * 0.000001
+    @traced
+    def filter_without_sharding(self, collection, field=None, value=None):
+        """Slow filter – full scan of all documents, unless an index on `field` is cheaper"""
+        cost = self.engine.evaluate_one(collection, "filter", field=field, value=value)
         
         return {
             "query_type": "filter_without_sharding",
-            "docs_scanned": docs_scanned,
-            "time_seconds": round(time_s, 2),
-            "carbon_grams": round(carbon_g, 2),
-            "price_usd": round(price_usd, 4)
+            "access_path": cost["access_path"],
+            "docs_scanned": cost["docs_scanned"],
+            "output_docs": cost["output_docs"],
+            "output_size_gb": round(cost["output_bytes"] / 1024 ** 3, 4),
+            "time_seconds": round(cost["time_seconds"], 2),
+            "carbon_grams": round(cost["carbon_grams"], 2),
+            "price_usd": round(cost["price_usd"], 4)
         }
 
-    def join_with_sharding(self, coll1, coll2, shard_key):
-        """Fast join – only scans 1 server (assumes join key exists)"""
-        docs1 = self.stats.get("cardinality", {}).get(coll1, 0)
-        docs2 = self.stats.get("cardinality", {}).get(coll2, 0)
-        docs_scanned = max(docs1, docs2) // self.servers
-        
-        time_s = docs_scanned * 0.05      # Joins are slower (~50 ms/doc)
-        carbon_g = docs_scanned * 0.0005
-        price_usd = docs_scanned * 0.000005
+    @traced
+    def join_with_sharding(self, coll1, coll2, shard_key, other_shard_key=None):
+        """Fast join – hottest shard only, cheapest join algorithm (assumes join key exists);
+        other_shard_key shards coll2 differently (the misaligned side is moved first)"""
+        cost = self.engine.evaluate_one(coll1, "join", shard_key, other=coll2, other_shard_key=other_shard_key)
         
         return {
             "query_type": "join_with_sharding",
-            "docs_scanned": docs_scanned,
-            "time_seconds": round(time_s, 2),
-            "carbon_grams": round(carbon_g, 2),
-            "price_usd": round(price_usd, 6)
+            "join_algorithm": cost["join_algorithm"],
+            "data_movement": cost["data_movement"],
+            "docs_scanned": cost["docs_scanned"],
+            "output_docs": cost["output_docs"],
+            "output_size_gb": round(cost["output_bytes"] / 1024 ** 3, 4),
+            "time_seconds": round(cost["time_seconds"], 2),
+            "carbon_grams": round(cost["carbon_grams"], 2),
+            "price_usd": round(cost["price_usd"], 6)
         }
 
+    @traced
     def join_without_sharding(self, coll1, coll2):
-        """Slow join – full nested loop (very expensive)"""
-        docs1 = self.stats.get("cardinality", {}).get(coll1, 0)
-        docs2 = self.stats.get("cardinality", {}).get(coll2, 0)
-        docs_scanned = docs1 * docs2
-        
-        time_s = docs_scanned * 0.05
-        carbon_g = docs_scanned * 0.0005
-        price_usd = docs_scanned * 0.000005
+        """Slow join – whole collections from one node, cheapest placement and algorithm (nested loop if no join key)"""
+        cost = self.engine.evaluate_one(coll1, "join", other=coll2)
         
         return {
             "query_type": "join_without_sharding",
-            "docs_scanned": docs_scanned,
-            "time_seconds": round(time_s, 2),
-            "carbon_grams": round(carbon_g, 2),
-            "price_usd": round(price_usd, 6)
-        }
\ No newline at end of file
+            "join_algorithm": cost["join_algorithm"],
+            "data_movement": cost["data_movement"],
+            "docs_scanned": cost["docs_scanned"],
+            "output_docs": cost["output_docs"],
+            "output_size_gb": round(cost["output_bytes"] / 1024 ** 3, 4),
+            "time_seconds": round(cost["time_seconds"], 2),
+            "carbon_grams": round(cost["carbon_grams"], 2),
+            "price_usd": round(cost["price_usd"], 6)
+        }
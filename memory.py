@@ -0,0 +1,300 @@
+# memory.py
+# Per-server memory: RAM budget, working sets and buffer-cache hit ratios
+#
+# Every server has RAM_BYTES_PER_SERVER, of which the storage engine's cache gets
+# CACHE_SHARE of (RAM - 1 GB) like WiredTiger's default. Indexes are the hottest
+# pages and are kept first; the rest of the cache is shared max-min fairly by the
+# collections on the server: small ones stay resident, the large ones split the rest.
+#
+# What a collection reads from that share depends on the access:
+#   scan  - a scan touches every document once, so it hits the resident fraction
+#           of the data (cache share / bytes on the server)
+#   point - lookups (index fetches) follow the access skew in stats["access"]
+#           (e.g. {"OrderLine": {"type": "zipf", "s": 0.8}}, uniform by default):
+#             lru - Che's characteristic-time approximation of an LRU cache
+#             arc - a frequency-aware cache (ARC / LFU on a stable popularity)
+#                   keeps the hottest documents: the top of the distribution
+# Every miss reads the document's (compressed, see storage.py) pages from disk: SEQUENTIAL_PAGE_COST scanned-
+# document equivalents a page, plus DISK_PAGE_COST for the seek of an index fetch
+# (which reads whole pages), so large documents that do not fit in memory cost more than their size
+# alone would suggest. replay_lru() checks the LRU estimate against a synthetic
+# key trace run through an actual LRU cache (on a TRACE_ITEMS-document sample of
+# the same distribution and cache / data ratio).
+#
+# Usage: python memory.py   (working sets and hit ratios of every model)
+
+import bisect
+import json
+import math
+import random
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from indexes import PAGE_BYTES
+from sharding import HASH, key_groups
+from tracing import traced
+
+RAM_BYTES_PER_SERVER = 8 * 1024 ** 3
+CACHE_SHARE = 0.5            # of (RAM - 1 GB), the rest is left to the OS and connections
+DISK_PAGE_COST = 1.0         # one random 4 KB page read on a miss, in scanned-document equivalents
+SEQUENTIAL_PAGE_COST = 0.1   # a page of a sequential read (read-ahead fetches ~10 pages a seek)
+WORKING_SET_SHARE = 0.9      # the working set holds the documents serving 90% of the accesses
+TRACE_ITEMS = 10_000         # documents in the synthetic trace of replay_lru()
+POLICIES = ("lru", "arc")
+ACCESSES = ("scan", "point")
+
+
+def che_hit_ratio(groups: List[Tuple[int, float]], cache_items: float) -> float:
+    """
+    LRU hit ratio of (items, weight per item) popularity groups by Che's approximation:
+    the characteristic time T fills the cache, sum(n * (1 - e^(-p T))) = cache_items,
+    and the hit ratio is sum(n * p * (1 - e^(-p T))); T is solved by Newton's method
+    """
+    total_items = sum(n for n, _ in groups)
+    if cache_items >= total_items:
+        return 1.0
+    if cache_items <= 0:
+        return 0.0
+    total = sum(n * w for n, w in groups)
+    probs = [(n, w / total) for n, w in groups]
+
+    # Newton's method: occupancy is increasing and concave in T, so from T = 0 every
+    # step stays below the root and the iteration climbs to it monotonically
+    t = 0.0
+    for _ in range(100):
+        occupancy = slope = 0.0
+        for n, p in probs:
+            missed = math.expm1(-p * t)      # e^(-p T) - 1
+            occupancy -= n * missed
+            slope += n * p * (1 + missed)
+        step = (cache_items - occupancy) / slope if slope else 0.0
+        t += step
+        if step <= 1e-13 * t:
+            break
+    return min(1.0, sum(-n * p * math.expm1(-p * t) for n, p in probs))
+
+
+def top_hit_ratio(groups: List[Tuple[int, float]], cache_items: float) -> float:
+    """Hit ratio of a cache holding the `cache_items` most popular items"""
+    total = sum(n * w for n, w in groups)
+    if not total or cache_items <= 0:
+        return 0.0
+    hits, room = 0.0, cache_items
+    for n, w in sorted(groups, key=lambda g: -g[1]):
+        kept = min(n, room)
+        hits += kept * w
+        room -= kept
+        if room <= 0:
+            break
+    return min(1.0, hits / total)
+
+
+def hot_items(groups: List[Tuple[int, float]], share: float) -> float:
+    """Most popular items serving `share` of the accesses"""
+    total = sum(n * w for n, w in groups)
+    needed, items = share * total, 0.0
+    for n, w in sorted(groups, key=lambda g: -g[1]):
+        if n * w >= needed:
+            return items + (needed / w if w else 0.0)
+        needed -= n * w
+        items += n
+    return items
+
+
+def replay_lru(groups: List[Tuple[int, float]], cache_items: float, requests: int = 400_000,
+               seed: int = 0) -> float:
+    """
+    Hit ratio measured by replaying a synthetic key trace (independent draws from the
+    popularity groups) through an LRU cache; the first half of the trace warms it up
+    """
+    if cache_items >= sum(n for n, _ in groups):
+        return 1.0
+    capacity = int(cache_items)
+    if capacity <= 0:
+        return 0.0
+    starts, cumulative, first, mass = [], [], 0, 0.0
+    for n, w in groups:
+        starts.append(first)
+        first += n
+        mass += n * w
+        cumulative.append(mass)
+    rng = random.Random(seed)
+    cache: OrderedDict = OrderedDict()
+    hits = 0
+    warmup = requests // 2
+    for r in range(requests):
+        g = bisect.bisect_left(cumulative, rng.random() * mass)
+        item = starts[g] + rng.randrange(groups[g][0])
+        if item in cache:
+            cache.move_to_end(item)
+            hits += r >= warmup
+        else:
+            cache[item] = None
+            if len(cache) > capacity:
+                cache.popitem(last=False)
+    return hits / (requests - warmup)
+
+
+def fair_shares(cache: float, sizes: List[float]) -> List[float]:
+    """Max-min fair split of a cache: the smallest sizes are served in full first"""
+    shares = [0.0] * len(sizes)
+    left = cache
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    for rank, i in enumerate(order):
+        shares[i] = min(sizes[i], left / (len(sizes) - rank))
+        left -= shares[i]
+    return shares
+
+
+@lru_cache(maxsize=4096)
+def _hit_ratio(n_items, cache_items, distribution_json, policy):
+    """Point-access hit ratios are cached on their inputs (the Che solve is the slow part)"""
+    groups = key_groups(n_items, n_items, json.loads(distribution_json))
+    if policy == "arc":
+        return top_hit_ratio(groups, cache_items)
+    return che_hit_ratio(groups, cache_items)
+
+
+class MemoryModel:
+    def __init__(self, nosql_simulator, ram_bytes: int = RAM_BYTES_PER_SERVER, cache_share: float = CACHE_SHARE):
+        """Connects to the main NoSQLSimulator (stats, sharding, indexes, document sizes)"""
+        self.sim = nosql_simulator
+        self.ram_bytes = ram_bytes
+        self.cache_share = cache_share
+        self._inputs: Optional[tuple] = None
+        self._sizes: Dict[str, Any] = {}
+
+    def cache_bytes(self) -> float:
+        """Storage-engine cache of one server"""
+        return max(0.0, self.cache_share * (self.ram_bytes - 1024 ** 3))
+
+    def access_distribution(self, collection: str) -> Optional[Dict[str, Any]]:
+        return self.sim.stats.get("access", {}).get(collection)
+
+    def _cached_sizes(self) -> Dict[str, Any]:
+        """
+        Sizes every read needs (index bytes per server count, bytes of every
+        collection), kept while the model's schemas, stats and field sizes are the
+        same objects: they are not edited in place (depgraph.py rebuilds the
+        components on the edited stats, set_schemas installs a new schema list)
+        """
+        sim = self.sim
+        inputs = (id(sim.schemas), id(sim.stats), id(sim.field_sizes), id(sim.indexes.sidecar))
+        if inputs != self._inputs:
+            self._inputs = inputs
+            self._sizes = {"index_bytes": {}, "collection_bytes": None}
+        return self._sizes
+
+    def index_bytes(self, servers: Optional[int] = None) -> float:
+        """Index bytes held by one server (every index, spread over the servers)"""
+        servers = servers or self.sim.servers
+        cached = self._cached_sizes()["index_bytes"]
+        if servers not in cached:
+            cached[servers] = sum(self.sim.indexes.index_stats(c, i, servers)["per_server_gb"]
+                                  for c in self.sim.collections for i in self.sim.indexes.indexes(c)) * 1024 ** 3
+        return cached[servers]
+
+    def collection_bytes(self) -> Dict[str, float]:
+        """Bytes of every collection of the model"""
+        sizes = self._cached_sizes()
+        if sizes["collection_bytes"] is None:
+            card = self.sim.stats.get("cardinality", {})
+            sizes["collection_bytes"] = {c: card.get(c, 0) * self.sim.compute_doc_size(c) for c in self.sim.collections}
+        return sizes["collection_bytes"]
+
+    def server_docs(self, collection: str, shard_key: Optional[str] = None, servers: Optional[int] = None,
+                    scheme: str = HASH) -> int:
+        """Documents of `collection` on its busiest server: the hottest shard, or all of them unsharded"""
+        if shard_key:
+            return self.sim.sharding.hot_docs(collection, shard_key, servers or self.sim.servers, scheme)
+        return self.sim.stats.get("cardinality", {}).get(collection, 0)
+
+    def working_set(self, collection: str, shard_key: Optional[str] = None,
+                    servers: Optional[int] = None, scheme: str = HASH) -> Dict[str, Any]:
+        """Bytes of a collection on its busiest server, its share of the cache and its hot part"""
+        sim = self.sim
+        servers = servers or sim.servers
+        doc_size = sim.compute_doc_size(collection)
+        docs = self.server_docs(collection, shard_key, servers, scheme)
+        data_bytes = docs * doc_size
+        # The other collections are sharded over every server
+        sizes = [size / servers for c, size in self.collection_bytes().items() if c != collection]
+        index_bytes = self.index_bytes(servers)
+        share = fair_shares(max(0.0, self.cache_bytes() - index_bytes), [data_bytes] + sizes)[0]
+        groups = key_groups(docs, docs, self.access_distribution(collection)) if docs else []
+        return {
+            "collection": collection,
+            "docs_per_server": docs,
+            "data_bytes": int(data_bytes),
+            "index_bytes": int(index_bytes),
+            "cache_bytes": int(share),
+            "working_set_bytes": int(hot_items(groups, WORKING_SET_SHARE) * doc_size) if groups else 0,
+            "fits": data_bytes <= share,
+        }
+
+    def hit_ratio(self, collection: str, shard_key: Optional[str] = None, servers: Optional[int] = None,
+                  access: str = "scan", policy: str = "lru", scheme: str = HASH) -> float:
+        """Share of a collection's document reads served from the cache"""
+        if access not in ACCESSES or policy not in POLICIES:
+            raise ValueError(f"Unknown access {access!r} / policy {policy!r}")
+        ws = self.working_set(collection, shard_key, servers, scheme)
+        if ws["fits"]:
+            return 1.0
+        if access == "scan":
+            return ws["cache_bytes"] / ws["data_bytes"]
+        doc_size = self.sim.compute_doc_size(collection)
+        return _hit_ratio(ws["docs_per_server"], ws["cache_bytes"] / doc_size,
+                          json.dumps(self.access_distribution(collection), sort_keys=True), policy)
+
+    @traced
+    def read_cost(self, collection: str, docs: int, shard_key: Optional[str] = None,
+                  servers: Optional[int] = None, access: str = "scan", policy: str = "lru",
+                  scheme: str = HASH) -> Dict[str, Any]:
+        """Cache-hit and disk-read split of reading `docs` documents; disk_cost_docs is the extra work"""
+        hit = self.hit_ratio(collection, shard_key, servers, access, policy, scheme)
+        doc_size = self.sim.storage.stored_doc_size(collection)      # compressed pages come off the disk
+        if access == "scan":
+            pages, page_cost = doc_size / PAGE_BYTES, SEQUENTIAL_PAGE_COST
+        else:
+            pages = math.ceil(doc_size / PAGE_BYTES)
+            page_cost = (DISK_PAGE_COST + (pages - 1) * SEQUENTIAL_PAGE_COST) / pages
+        misses = docs * (1 - hit)
+        return {
+            "hit_ratio": hit,
+            "cache_docs": docs - misses,
+            "disk_docs": misses,
+            "disk_pages": misses * pages,
+            "disk_cost_docs": misses * pages * page_cost,
+        }
+
+
+if __name__ == "__main__":
+    import os
+
+    from main import NoSQLSimulator
+
+    schemas_folder = "schemas"
+    db_files = sorted(f for f in os.listdir(schemas_folder) if f.startswith("db") and f.endswith(".json"))
+    gb = 1024 ** 3
+    print(f"MEMORY: {RAM_BYTES_PER_SERVER / gb:.0f} GB RAM per server, "
+          f"{MemoryModel(None).cache_bytes() / gb:.1f} GB cache")
+    print(f"{'Model':<6}{'Collection':<12}{'Sharding':<10}{'Data GB':>12}{'Cache GB':>10}{'Hot 90% GB':>12}"
+          f"{'Scan':>8}{'LRU':>8}{'ARC':>8}  {'Trace LRU / replay':>18}")
+    for db_file in db_files:
+        sim = NoSQLSimulator(os.path.join(schemas_folder, db_file), "stats.json", "indexes.json")
+        for collection in sim.collections:
+            key = next(iter(sim.get_collection_schema(collection)), None)
+            for shard_key in (key, None):
+                ws = sim.memory.working_set(collection, shard_key)
+                hits = [sim.memory.hit_ratio(collection, shard_key, access=a, policy=p)
+                        for a, p in (("scan", "lru"), ("point", "lru"), ("point", "arc"))]
+                # Validation on a sample with the same access distribution and cache / data ratio
+                items = min(ws["docs_per_server"], TRACE_ITEMS)
+                ratio = min(1.0, ws["cache_bytes"] / ws["data_bytes"]) if ws["data_bytes"] else 1.0
+                groups = key_groups(items, items, sim.memory.access_distribution(collection))
+                trace = (che_hit_ratio(groups, ratio * items), replay_lru(groups, ratio * items))
+                print(f"{db_file[:-5].upper():<6}{collection:<12}{shard_key or '-':<10}"
+                      f"{ws['data_bytes'] / gb:>12,.2f}{ws['cache_bytes'] / gb:>10,.2f}"
+                      f"{ws['working_set_bytes'] / gb:>12,.2f}"
+                      + "".join(f"{h:>8.1%}" for h in hits) + f"  {trace[0]:>9.1%} /{trace[1]:>7.1%}")
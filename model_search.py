@@ -0,0 +1,306 @@
+# model_search.py
+# Automatic denormalization search
+# Starts from db1.json (fully referenced model), enumerates every embed / reference
+# choice per relationship, prunes candidates with size bounds and scores the
+# survivors against a query mix on a process pool → Pareto front of storage vs cost.
+# Before a model is scored in full, a lower bound of its cost (its driving scans,
+# joins only add to them) is checked against the models already scored: one that
+# needs no more storage and costs no more than the bound dominates it, and the
+# model is dropped without costing its joins.
+#
+# Usage: python model_search.py [--workers N] [--max-storage-gb X] [--output front.json]
+
+import argparse
+import copy
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from cost_engine import scale_documents
+from main import NoSQLSimulator
+
+# One relationship = (child collection, parent collection, foreign key)
+# Choices per relationship:
+REFERENCE = "reference"        # DB1 style: child keeps the key only
+EMBED_PARENT = "embed_parent"  # DB3 / DB4 style: child embeds a copy of the parent object
+NEST_CHILDREN = "nest_children"  # DB2 / DB5 style: parent embeds an array of children,
+                                 # the child collection disappears
+CHOICES = (REFERENCE, EMBED_PARENT, NEST_CHILDREN)
+
+MAX_DOC_BYTES = 16 * 1024 ** 2  # MongoDB's 16 MB document limit
+
+# Query mix of the use case (challenge.py / run_final.py).
+# collections[0] is the driving collection, key is the filter / group key.
+DEFAULT_QUERY_MIX = [
+    {"name": "Stock by product", "operator": "filter", "collections": ["Stock"], "key": "IDP", "weight": 1},
+    {"name": "Products by category", "operator": "filter", "collections": ["Product"], "key": None, "weight": 1},
+    {"name": "Client orderlines with product", "operator": "filter",
+     "collections": ["OrderLine", "Product"], "key": "IDC", "weight": 1},
+    {"name": "Orderlines per product", "operator": "aggregate", "collections": ["OrderLine"], "key": "IDP", "weight": 1},
+]
+
+
+def find_relationships(schemas: List[Dict[str, Any]]) -> List[Tuple[str, str, str]]:
+    """
+    Derive (child, parent, key) relationships from a normalized schema.
+    A collection with exactly one ID* field owns that key; any other collection
+    holding the same field references it.
+    """
+    id_fields = {
+        coll["collection"]: [f for f in coll.get("properties", {}) if f.startswith("ID")]
+        for coll in schemas
+    }
+    owners = {fields[0]: name for name, fields in id_fields.items() if len(fields) == 1}
+    relationships = []
+    for child, fields in id_fields.items():
+        for key in fields:
+            parent = owners.get(key)
+            if parent and parent != child:
+                relationships.append((child, parent, key))
+    return relationships
+
+
+def _array_field(child: str) -> str:
+    return child.lower() + "s"
+
+
+def build_model(base_schemas: List[Dict[str, Any]], base_stats: Dict[str, Any],
+                relationships: List[Tuple[str, str, str]],
+                choices: Tuple[str, ...]) -> Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    Apply one choice per relationship to the base model.
+    Returns (schemas, stats) or None when the combination is not a valid model.
+    Embedded copies always use the base properties (one level, like DB2–DB5).
+    """
+    base = {coll["collection"]: coll.get("properties", {}) for coll in base_schemas}
+    removed = {child for (child, _, _), c in zip(relationships, choices) if c == NEST_CHILDREN}
+    for (child, parent, _), choice in zip(relationships, choices):
+        # Nothing to embed into a collection that no longer exists
+        if choice == EMBED_PARENT and child in removed:
+            return None
+        if choice == NEST_CHILDREN and parent in removed:
+            return None
+
+    props = {name: dict(p) for name, p in base.items()}
+    stats = copy.deepcopy(base_stats)
+    avg = stats.setdefault("avg", {})
+    card = stats.get("cardinality", {})
+
+    for (child, parent, key), choice in zip(relationships, choices):
+        if choice == EMBED_PARENT:
+            field = parent.lower()
+            props[child][field] = {"type": "object", "properties": copy.deepcopy(base[parent])}
+            for name, value in avg.get(parent, {}).items():
+                avg.setdefault(child, {})[f"{field}.{name}"] = value
+        elif choice == NEST_CHILDREN:
+            field = _array_field(child)
+            item = {f: copy.deepcopy(spec) for f, spec in base[child].items() if f != key}
+            props[parent][field] = {"type": "array", "items": {"properties": item}}
+            parent_avg = avg.setdefault(parent, {})
+            if field not in parent_avg and card.get(parent):
+                parent_avg[field] = card.get(child, 0) / card[parent]
+            for name, value in avg.get(child, {}).items():
+                parent_avg[f"{field}.{name}"] = value
+
+    schemas = [
+        {"collection": name, "properties": p}
+        for name, p in props.items()
+        if name not in removed
+    ]
+    return schemas, stats
+
+
+def model_name(relationships, choices) -> str:
+    parts = []
+    for (child, parent, _), choice in zip(relationships, choices):
+        if choice == EMBED_PARENT:
+            parts.append(f"{child}{{{parent}}}")
+        elif choice == NEST_CHILDREN:
+            parts.append(f"{parent}[{child}]")
+    return " + ".join(parts) if parts else "reference-only (DB1)"
+
+
+def locate(collection: str, relationships, choices) -> Tuple[str, List[str]]:
+    """
+    Where a base collection lives in a model → (root collection, collections reachable
+    inside one root document).
+    """
+    root = collection
+    for (child, parent, _), choice in zip(relationships, choices):
+        if choice == NEST_CHILDREN and child == collection:
+            root = parent
+            break
+    inside = {root}
+    for (child, parent, _), choice in zip(relationships, choices):
+        if choice == EMBED_PARENT and child == root:
+            inside.add(parent)
+        if choice == NEST_CHILDREN and parent == root:
+            inside.add(child)
+    return root, sorted(inside)
+
+
+def score_model(sim: NoSQLSimulator, base_sizes: Dict[str, float], relationships, choices,
+                query_mix: List[Dict[str, Any]], scans: bool = True, joins: bool = True) -> float:
+    """
+    Weighted query price of one model. Each query scans its driving collection's
+    root (sharded when the key is a top-level field of the root) and joins every
+    other collection it cannot reach inside that root. Scans are charged in
+    base-document equivalents: a root document N times larger costs N times more
+    work per document, its disk reads already follow its stored size (see
+    cost_engine.scale_documents).
+    scans / joins: price only that part (the scans alone are a lower bound of the price)
+    """
+    engine = sim.engine
+    total = 0.0
+    for query in query_mix:
+        driving = query["collections"][0]
+        root, inside = locate(driving, relationships, choices)
+        key = query.get("key")
+        shard_key = key if key and key in sim.get_collection_schema(root) else None
+        size_factor = sim.compute_doc_size(root) / max(1, base_sizes.get(driving, 1))
+
+        cost = 0.0
+        if scans:
+            scan = engine.evaluate_one(root, query["operator"], shard_key)
+            cost = scale_documents(query["operator"], scan["time_seconds"], scan["carbon_grams"], scan["price_usd"],
+                                   scan["disk_seconds"], size_factor)[2]
+        for other in query["collections"][1:]:
+            if not joins or other in inside:
+                continue
+            other_root, _ = locate(other, relationships, choices)
+            join_key = next((k for c, p, k in relationships if {c, p} == {driving, other}), key)
+            cost += engine.evaluate_one(root, "join", join_key, other=other_root)["price_usd"]
+        total += query.get("weight", 1) * cost
+    return total
+
+
+def _score_worker(args, scans: bool = True, joins: bool = True):
+    """Process-pool entry point (must be a top-level function to be picklable)"""
+    name, schemas, stats, indexes, base_sizes, relationships, choices, query_mix = args
+    sim = NoSQLSimulator.from_data(schemas, stats, indexes)
+    return name, choices, score_model(sim, base_sizes, relationships, choices, query_mix, scans, joins)
+
+
+def pareto_front(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Models not dominated on (storage_gb, query_cost), sorted by query cost then storage"""
+    ranked = sorted(results, key=lambda r: (r["query_cost"], r["storage_gb"]))
+    front, best_storage = [], float("inf")
+    for r in ranked:
+        if r["storage_gb"] < best_storage:
+            front.append(r)
+            best_storage = r["storage_gb"]
+    return front
+
+
+def search(base_schema: str = "schemas/db1.json", stats_file: str = "stats.json",
+           indexes_file: Optional[str] = "indexes.json",
+           query_mix: Optional[List[Dict[str, Any]]] = None,
+           max_storage_gb: Optional[float] = None,
+           max_doc_bytes: int = MAX_DOC_BYTES,
+           workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Enumerate, prune and score every denormalization of the base schema.
+    Returns {"relationships", "evaluated", "pruned", "dominated", "results", "front"};
+    dominated models (see the header) are neither scored nor in the results.
+    """
+    query_mix = query_mix or DEFAULT_QUERY_MIX
+    base_sim = NoSQLSimulator(base_schema, stats_file, indexes_file)
+    indexes = base_sim.indexes.sidecar
+    relationships = find_relationships(base_sim.schemas)
+    base_sizes = {name: base_sim.compute_doc_size(name) for name in base_sim.collections}
+
+    # 1) Enumerate + prune with size bounds (compiled size plans, no query costing yet)
+    survivors, pruned, storage = [], 0, {}
+    for choices in itertools.product(CHOICES, repeat=len(relationships)):
+        model = build_model(base_sim.schemas, base_sim.stats, relationships, choices)
+        if model is None:
+            pruned += 1
+            continue
+        schemas, stats = model
+        sim = NoSQLSimulator.from_data(schemas, stats)
+        largest_doc = max(sim.compute_doc_size(c["collection"]) for c in schemas)
+        size_gb = sim.database_size_gb()
+        if largest_doc > max_doc_bytes or (max_storage_gb is not None and size_gb > max_storage_gb):
+            pruned += 1
+            continue
+        name = model_name(relationships, choices)
+        storage[name] = (size_gb, largest_doc)
+        survivors.append((name, schemas, stats, indexes, base_sizes, relationships, choices, query_mix))
+
+    # 2) Score survivors on a process pool: scans first (a lower bound), then, in order of storage,
+    #    the joins of the models no scored model dominates; a wave is one pool's worth of models
+    pool = None if workers == 1 or len(survivors) < 2 else ProcessPoolExecutor(max_workers=workers)
+
+    def run(batch, **part):
+        if pool is None:
+            return [_score_worker(args, **part) for args in batch]
+        return list(pool.map(partial(_score_worker, **part), batch, chunksize=max(1, len(batch) // 32)))
+
+    try:
+        bounds = {name: cost for name, _, cost in run(survivors, joins=False)}
+        ranked = sorted(survivors, key=lambda args: (storage[args[0]][0], bounds[args[0]]))
+        wave = 1 if pool is None else workers or os.cpu_count() or 1
+        scored, best, dominated = [], math.inf, 0
+        for start in range(0, len(ranked), wave):
+            batch = [args for args in ranked[start:start + wave] if bounds[args[0]] < best]
+            dominated += min(wave, len(ranked) - start) - len(batch)
+            for name, choices, cost in run(batch, scans=False):
+                scored.append((name, choices, bounds[name] + cost))
+                best = min(best, bounds[name] + cost)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    results = [
+        {
+            "model": name,
+            "choices": dict(zip([f"{c}->{p}" for c, p, _ in relationships], choices)),
+            "storage_gb": storage[name][0],
+            "largest_doc_bytes": storage[name][1],
+            "query_cost": round(cost, 6),
+        }
+        for name, choices, cost in scored
+    ]
+    return {
+        "relationships": relationships,
+        "evaluated": len(results),
+        "pruned": pruned,
+        "dominated": dominated,
+        "results": sorted(results, key=lambda r: (r["query_cost"], r["storage_gb"])),
+        "front": pareto_front(results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search denormalizations of db1.json")
+    parser.add_argument("--schema", default="schemas/db1.json")
+    parser.add_argument("--stats", default="stats.json")
+    parser.add_argument("--indexes", default="indexes.json")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (1 = inline)")
+    parser.add_argument("--max-storage-gb", type=float, default=None)
+    parser.add_argument("--output", help="write the full result as JSON")
+    args = parser.parse_args()
+
+    result = search(args.schema, args.stats, args.indexes, max_storage_gb=args.max_storage_gb, workers=args.workers)
+
+    print(f"Relationships: {', '.join(f'{c}.{k} -> {p}' for c, p, k in result['relationships'])}")
+    print(f"Candidates scored: {result['evaluated']}, pruned: {result['pruned']}, "
+          f"dominated before scoring: {result['dominated']}\n")
+    print("PARETO FRONT (storage vs query cost)")
+    print(f"{'Rank':<6}{'Query cost ($)':<18}{'Storage (GB)':<16}Model")
+    print("-" * 80)
+    for rank, r in enumerate(result["front"], 1):
+        print(f"{rank:<6}{r['query_cost']:<18.6f}{r['storage_gb']:<16.2f}{r['model']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nFull results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
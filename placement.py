@@ -0,0 +1,217 @@
+# placement.py
+# Multi-region placement: replica sets across regions, read preference, cross-region latency and transfer price
+#
+# Every shard (sim.servers of them) is a replica set of `replication_factor`
+# members. The primary sits in the primary region, the other members go
+# round-robin over the other regions (and wrap around when there are more members
+# than regions). Queries come from the client regions in proportion to their
+# weights and read from one member, chosen by the read preference:
+#   primary    - the primary, wherever the client is
+#   secondary  - the closest secondary (the primary when there is none)
+#   nearest    - the closest member, primary or not
+# A read served from another region returns its result over that link: the
+# round trip is added to the query's time and the result bytes are charged at
+# the inter-region transfer price. Writes go to the primary and are replicated
+# to every member; the write waits for a majority of the members to acknowledge.
+# A query still runs once, on one member, at full cost: the members serving the
+# reads add read capacity (read_members), see workload.py and cluster_sim.py.
+# Replicas multiply the storage: database_size_gb × replication factor, and
+# sim.servers × replication factor servers.
+#
+# The default placement is one region with no replicas, which adds nothing to any cost.
+# A placement file (placement.json) looks like:
+#   {"regions": ["eu-west", "us-east", "ap-south"], "primary_region": "eu-west",
+#    "replication_factor": 3, "read_preference": "nearest",
+#    "clients": {"eu-west": 0.5, "us-east": 0.3, "ap-south": 0.2},
+#    "latency_ms": {"eu-west": {"us-east": 80, "ap-south": 120}, "us-east": {"ap-south": 200}},
+#    "transfer_usd_per_gb": 0.02}
+#
+# Usage: python placement.py [--placement placement.json] [--replication-factor 3]
+
+import json
+from typing import Any, Dict, List, Optional
+
+from cost_engine import WRITE_OPERATORS
+from topology import CARBON_GRAMS_PER_GB
+from tracing import traced
+
+DEFAULT_REGION = "local"
+READ_PREFERENCES = ("primary", "secondary", "nearest")
+DEFAULT_RTT_MS = 100.0               # round trip between two regions missing from latency_ms
+CROSS_REGION_USD_PER_GB = 0.02       # inter-region transfer (twice the inter-zone price of topology.py)
+NO_PLACEMENT = {"seconds": 0.0, "price_usd": 0.0, "carbon_grams": 0.0, "cross_region_bytes": 0}
+
+
+def load_placement(path: str) -> Dict[str, Any]:
+    """Read a placement file (regions, replication factor, read preference, clients, latencies)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class PlacementModel:
+    def __init__(self, nosql_simulator, config: Optional[Dict[str, Any]] = None):
+        """Connects to the main NoSQLSimulator (sizes, servers); config as in placement.json"""
+        self.sim = nosql_simulator
+        self.configure(config or {})
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Use a placement (missing entries: one region, no replicas, primary reads)"""
+        self.regions: List[str] = list(config.get("regions") or [DEFAULT_REGION])
+        self.primary_region = config.get("primary_region", self.regions[0])
+        self.replication_factor = int(config.get("replication_factor", 1))
+        self.read_preference = config.get("read_preference", "primary")
+        if self.primary_region not in self.regions:
+            raise ValueError(f"Primary region {self.primary_region!r} is not one of {self.regions}")
+        if self.replication_factor < 1:
+            raise ValueError("The replication factor is at least 1")
+        if self.read_preference not in READ_PREFERENCES:
+            raise ValueError(f"Unknown read preference {self.read_preference!r} ({', '.join(READ_PREFERENCES)})")
+        clients = config.get("clients") or {self.primary_region: 1.0}
+        unknown = set(clients) - set(self.regions)
+        if unknown:
+            raise ValueError(f"Client regions {sorted(unknown)} are not among the regions")
+        total = sum(clients.values())
+        self.clients = {region: weight / total for region, weight in clients.items() if weight > 0}
+        self.latency_ms: Dict[str, Dict[str, float]] = {}
+        for a, row in (config.get("latency_ms") or {}).items():
+            for b, ms in row.items():
+                self.latency_ms.setdefault(a, {})[b] = ms
+                self.latency_ms.setdefault(b, {})[a] = ms
+        self.transfer_usd_per_gb = config.get("transfer_usd_per_gb", CROSS_REGION_USD_PER_GB)
+        self.carbon_per_gb = config.get("carbon_grams_per_gb", CARBON_GRAMS_PER_GB)
+        self._routes()
+
+    def members(self) -> List[str]:
+        """Region of every member of a replica set, the primary first"""
+        others = [r for r in self.regions if r != self.primary_region] or [self.primary_region]
+        return [self.primary_region] + [others[i % len(others)] for i in range(self.replication_factor - 1)]
+
+    def rtt(self, a: str, b: str) -> float:
+        """Round trip in seconds between two regions (0 inside one region, see topology.py)"""
+        if a == b:
+            return 0.0
+        return self.latency_ms.get(a, {}).get(b, DEFAULT_RTT_MS) / 1000
+
+    def serving_region(self, client: str) -> str:
+        """Region of the member a client in `client` reads from"""
+        members = self.members()
+        if self.read_preference == "primary" or (self.read_preference == "secondary" and len(members) == 1):
+            return self.primary_region
+        eligible = members[1:] if self.read_preference == "secondary" else members
+        return min(eligible, key=lambda region: (self.rtt(client, region), region != client))
+
+    def serving_members(self) -> List[int]:
+        """Members of a replica set (0 = primary) taking reads, by the read preference"""
+        if self.read_preference == "primary" or self.replication_factor == 1:
+            return [0]
+        return list(range(self.read_preference == "secondary", self.replication_factor))
+
+    def read_members(self) -> int:
+        """Members of a replica set sharing the read load (each read runs on one of them)"""
+        return len(self.serving_members())
+
+    def _routes(self) -> None:
+        """Per-query coefficients averaged over the client regions (costs are linear in the bytes)"""
+        members = self.members()
+        self.read_seconds = self.read_cross_share = self.write_seconds = 0.0
+        for client, weight in self.clients.items():
+            serving = self.serving_region(client)
+            self.read_seconds += weight * self.rtt(client, serving)
+            self.read_cross_share += weight * (serving != client)
+            self.write_seconds += weight * self.rtt(client, self.primary_region)
+        # A write is acknowledged by a majority: the primary and the closest secondaries
+        majority = self.replication_factor // 2 + 1
+        secondaries = sorted(self.rtt(self.primary_region, r) for r in members[1:])
+        self.write_seconds += secondaries[majority - 2] if majority >= 2 else 0.0
+        self.remote_copies = sum(1 for r in members[1:] if r != self.primary_region)
+
+    def rates(self, operator: str):
+        """
+        (seconds, cross-region bytes per byte) of one query: a read moves its result
+        bytes (output_bytes), a write its written bytes (bytes_written)
+        """
+        if operator in WRITE_OPERATORS:
+            return self.write_seconds, self.remote_copies
+        return self.read_seconds, self.read_cross_share
+
+    @traced
+    def cost(self, operator: str, output_bytes: float, bytes_written: float = 0) -> Dict[str, Any]:
+        """
+        Cross-region part of one query: results read from another region come back
+        over that link, writes reach the primary and are copied to the remote members
+        """
+        seconds, copies = self.rates(operator)
+        moved = (bytes_written if operator in WRITE_OPERATORS else output_bytes) * copies
+        if not seconds and not moved:
+            return NO_PLACEMENT
+        gb = moved / 1024 ** 3
+        return {
+            "seconds": seconds,
+            "price_usd": gb * self.transfer_usd_per_gb,
+            "carbon_grams": gb * self.carbon_per_gb,
+            "cross_region_bytes": int(moved),
+        }
+
+    def storage(self) -> Dict[str, Any]:
+        """Replicated storage and servers of the model, in total and per region"""
+        sim = self.sim
+        logical = sim.database_size_gb()
+        stored = sim.storage.database_size_gb() + sim.indexes.total_index_size_gb()
+        per_region: Dict[str, int] = {}
+        for region in self.members():
+            per_region[region] = per_region.get(region, 0) + 1
+        return {
+            "replication_factor": self.replication_factor,
+            "logical_gb": round(logical * self.replication_factor, 2),
+            "stored_gb": round(stored * self.replication_factor, 2),
+            "servers": sim.servers * self.replication_factor,
+            "stored_gb_per_region": {r: round(stored * n, 2) for r, n in per_region.items()},
+            "servers_per_region": {r: sim.servers * n for r, n in per_region.items()},
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from cost_engine import CostEngine
+    from main import NoSQLSimulator
+
+    parser = argparse.ArgumentParser(description="Replicated storage and query costs of every model per read preference")
+    parser.add_argument("--placement", default="placement.json", help="placement file")
+    parser.add_argument("--replication-factor", type=int, help="override the file's replication factor")
+    args = parser.parse_args()
+
+    config = load_placement(args.placement)
+    if args.replication_factor:
+        config["replication_factor"] = args.replication_factor
+    queries = [("Filter", "Stock", "filter", "IDP", None), ("Join", "OrderLine", "join", "IDP", "Product"),
+               ("Aggregate", "OrderLine", "aggregate", "IDP", None)]
+    schemas_folder = "schemas"
+    db_files = sorted(f for f in os.listdir(schemas_folder) if f.startswith("db") and f.endswith(".json"))
+    sims = [NoSQLSimulator(os.path.join(schemas_folder, f), "stats.json", "indexes.json") for f in db_files]
+    engine = CostEngine(sims)
+
+    print(f"PLACEMENT: {', '.join(config.get('regions', [DEFAULT_REGION]))}, "
+          f"replication factor {config.get('replication_factor', 1)}, primary in "
+          f"{config.get('primary_region', config.get('regions', [DEFAULT_REGION])[0])}")
+    print(f"{'Model':<6}{'Reads from':<12}{'Stored GB':>16}{'Servers':>10}{'Read members':>14}"
+          + "".join(f"{label + ' $':>16}" for label, *_ in queries) + f"{'Cross-region MB':>18}{'+ RTT (ms)':>12}")
+    for preference in ("single", *READ_PREFERENCES):
+        for sim in sims:
+            sim.placement.configure({} if preference == "single" else {**config, "read_preference": preference})
+        costs = engine.evaluate(
+            collections=[q[1] for _ in sims for q in queries],
+            operators=[q[2] for _ in sims for q in queries],
+            shard_keys=[q[3] for _ in sims for q in queries],
+            models=[m for m in range(len(sims)) for _ in queries],
+            others=[q[4] for _ in sims for q in queries],
+        )
+        for m, (db_file, sim) in enumerate(zip(db_files, sims)):
+            store = sim.placement.storage()
+            rows = range(m * len(queries), (m + 1) * len(queries))
+            moved = sum(int(costs["cross_region_bytes"][i]) for i in rows)
+            print(f"{db_file[:-5].upper():<6}{'one region' if preference == 'single' else preference:<12}"
+                  f"{store['stored_gb']:>16,.1f}{store['servers']:>10,}{sim.placement.read_members():>14}"
+                  + "".join(f"{float(costs['price_usd'][i]):>16,.6f}" for i in rows)
+                  + f"{moved / 1024 ** 2:>18,.2f}{sim.placement.read_seconds * 1000:>12,.1f}")
@@ -0,0 +1,419 @@
+# profiler.py
+# Streaming statistics profiler: builds stats.json from JSON Lines (or BSON) exports
+#
+# One file per collection, named after it (Product.jsonl, OrderLine.jsonl.gz is not
+# supported: decompress first). Files are cut into CHUNK_BYTES ranges aligned on
+# line ends and profiled on a process pool; every chunk returns a mergeable
+# profile whose size does not depend on the data:
+#   - documents counted          -> "cardinality"
+#   - HyperLogLog sketch / field -> "distinct" (and "ndv", ~0.8% error)
+#   - array lengths              -> "avg" (e.g. avg.Product.categories)
+#   - reservoir sample / field   -> "mcv" lists and equi-depth "histogram" bounds
+#   - value byte lengths         -> "avg_bytes" per field and measured "field_sizes"
+#                                   per type, replacing the fixed 80 / 200 bytes
+# Fields are dotted paths ("price.amount"); values of arrays are profiled under
+# the array's path. Without a schema, types come from the JSON values (ISO dates
+# are "date"); with --schema, the declared type of every path is used (so
+# "longstring" fields are measured separately). Sections the profiler cannot
+# measure (correlation, access skew, shard-key distributions) are kept from --base.
+#
+# BSON dumps (mongodump *.bson) need the optional bson package (from pymongo).
+#
+# Usage: python profiler.py DUMP_DIR [--output stats.json] [--base stats.json]
+#        [--schema schemas/db1.json] [--workers N] [--mmap]
+
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from size_plan import item_properties
+
+try:
+    import bson
+except ImportError:  # BSON support is optional, JSON Lines needs nothing
+    bson = None
+
+CHUNK_BYTES = 64 * 1024 ** 2     # one process-pool task
+HLL_PRECISION = 14               # 2^14 one-byte registers per field (~0.8% standard error)
+RESERVOIR_SIZE = 10_000          # sampled values per field
+MAX_FIELDS = 512                 # fields profiled per collection (bounded memory on ragged data)
+MCV_SIZE = 10
+MCV_MIN_FRACTION = 0.01          # values kept in the MCV list cover at least 1% of the documents
+HISTOGRAM_BUCKETS = 10
+EXTENSIONS = (".jsonl", ".ndjson", ".json", ".bson")
+
+
+class HyperLogLog:
+    """Distinct-count sketch over 64-bit hashes; sketches of the same precision merge by max"""
+
+    __slots__ = ("p", "registers")
+
+    def __init__(self, p: int = HLL_PRECISION):
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+    def add(self, value: Any):
+        h = int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), "big")
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)      # linear counting for small cardinalities
+        return int(round(estimate))
+
+
+class FieldProfile:
+    """Everything measured about one field path, in bounded memory"""
+
+    __slots__ = ("docs", "values", "bytes", "hll", "sample", "kinds", "in_array")
+
+    def __init__(self):
+        self.docs = 0           # documents holding the field
+        self.values = 0         # values seen (more than docs inside arrays)
+        self.bytes = 0          # sum of the values' byte lengths
+        self.hll = HyperLogLog()
+        self.sample: List[Any] = []
+        self.kinds: Dict[str, int] = {}
+        self.in_array = False
+
+    def add(self, value: Any, kind: str, rng: random.Random):
+        self.values += 1
+        self.bytes += _value_bytes(value, kind)
+        self.kinds[kind] = self.kinds.get(kind, 0) + 1
+        self.hll.add(value)
+        if len(self.sample) < RESERVOIR_SIZE:
+            self.sample.append(value)
+        else:
+            j = rng.randrange(self.values)
+            if j < RESERVOIR_SIZE:
+                self.sample[j] = value
+
+    def merge(self, other: "FieldProfile", rng: random.Random):
+        total = self.values + other.values
+        if total > RESERVOIR_SIZE and self.sample and other.sample:
+            # Each side keeps its share of the merged reservoir
+            mine = round(RESERVOIR_SIZE * self.values / total)
+            self.sample = (rng.sample(self.sample, min(mine, len(self.sample)))
+                           + rng.sample(other.sample, min(RESERVOIR_SIZE - mine, len(other.sample))))
+        else:
+            self.sample = (self.sample + other.sample)[:RESERVOIR_SIZE]
+        self.docs += other.docs
+        self.values = total
+        self.bytes += other.bytes
+        self.hll.merge(other.hll)
+        for kind, n in other.kinds.items():
+            self.kinds[kind] = self.kinds.get(kind, 0) + n
+        self.in_array = self.in_array or other.in_array
+
+
+class CollectionProfile:
+    """Mergeable profile of one collection (or one chunk of it)"""
+
+    def __init__(self, name: str, types: Optional[Dict[str, str]] = None, seed: int = 0):
+        self.name = name
+        self.types = types or {}
+        self.rng = random.Random(seed)
+        self.docs = 0
+        self.fields: Dict[str, FieldProfile] = {}
+        self.arrays: Dict[str, List[int]] = {}     # path -> [arrays seen, total items]
+
+    def _field(self, path: str) -> Optional[FieldProfile]:
+        field = self.fields.get(path)
+        if field is None and len(self.fields) < MAX_FIELDS:
+            field = self.fields[path] = FieldProfile()
+        return field
+
+    def add(self, doc: Dict[str, Any]):
+        self.docs += 1
+        seen = set()
+        self._walk(doc, "", False, seen)
+        for path in seen:
+            self.fields[path].docs += 1
+
+    def _walk(self, value: Any, path: str, in_array: bool, seen: set):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                self._walk(item, f"{path}.{key}" if path else key, in_array, seen)
+        elif isinstance(value, list):
+            counts = self.arrays.setdefault(path, [0, 0])
+            counts[0] += 1
+            counts[1] += len(value)
+            for item in value:
+                self._walk(item, path, True, seen)
+        elif value is not None:
+            field = self._field(path)
+            if field is not None:
+                field.add(value, self.types.get(path) or _kind(value), self.rng)
+                field.in_array = field.in_array or in_array
+                seen.add(path)
+
+    def merge(self, other: "CollectionProfile") -> "CollectionProfile":
+        self.docs += other.docs
+        for path, field in other.fields.items():
+            if path in self.fields:
+                self.fields[path].merge(field, self.rng)
+            elif len(self.fields) < MAX_FIELDS:
+                self.fields[path] = field
+        for path, (arrays, items) in other.arrays.items():
+            counts = self.arrays.setdefault(path, [0, 0])
+            counts[0] += arrays
+            counts[1] += items
+        return self
+
+    def field_stats(self, path: str) -> Dict[str, Any]:
+        """selectivity.py statistics of one field: ndv, mcv, histogram / min / max, null_frac, avg_bytes"""
+        field = self.fields[path]
+        ndv = min(field.hll.count(), field.values) or 1
+        stats: Dict[str, Any] = {"ndv": ndv, "avg_bytes": round(field.bytes / field.values, 1)}
+        present = field.docs / self.docs if self.docs else 1.0
+        if not field.in_array and present < 1.0:
+            stats["null_frac"] = round(1.0 - present, 4)
+        sample = field.sample
+        counts: Dict[Any, int] = {}
+        for value in sample:
+            counts[value] = counts.get(value, 0) + 1
+        # Only values clearly above the average frequency are worth listing
+        mcv = [[value, round(n / len(sample) * present, 4)] for value, n in
+               sorted(counts.items(), key=lambda kv: -kv[1])[:MCV_SIZE]
+               if n / len(sample) >= max(MCV_MIN_FRACTION, 2.0 / ndv)]
+        if mcv:
+            stats["mcv"] = mcv
+        kinds = {_orderable(v) for v in sample}
+        ordered = sorted(sample) if len(kinds) == 1 and None not in kinds else []
+        if ordered and ndv > len(mcv):
+            bounds = [ordered[min(len(ordered) - 1, round(i * (len(ordered) - 1) / HISTOGRAM_BUCKETS))]
+                      for i in range(HISTOGRAM_BUCKETS + 1)]
+            if bounds[0] != bounds[-1]:
+                stats["histogram"] = bounds
+            else:
+                stats["min"], stats["max"] = bounds[0], bounds[-1]
+        return stats
+
+    def type_bytes(self) -> Dict[str, Tuple[int, int]]:
+        """{field type: (bytes, values)} over every field"""
+        totals: Dict[str, Tuple[int, int]] = {}
+        for field in self.fields.values():
+            kind = max(field.kinds, key=field.kinds.get)
+            b, n = totals.get(kind, (0, 0))
+            totals[kind] = (b + field.bytes, n + field.values)
+        return totals
+
+
+def _kind(value: Any) -> str:
+    """Schema type of a JSON value"""
+    if isinstance(value, bool):
+        return "integer"
+    if isinstance(value, int):
+        return "integer"
+    if isinstance(value, float):
+        return "number"
+    if isinstance(value, str) and len(value) >= 10 and value[4:5] == "-" and value[7:8] == "-":
+        try:
+            date.fromisoformat(value[:10])
+            return "date"
+        except ValueError:
+            pass
+    return "string"
+
+
+def _value_bytes(value: Any, kind: str) -> int:
+    """Stored bytes of a value: 8 for numbers, the UTF-8 length of strings and dates"""
+    if kind in ("integer", "number") and not isinstance(value, str):
+        return 8
+    return len(str(value).encode("utf-8"))
+
+
+def _number(value: float):
+    """Averages as stats.json writes them: whole numbers as ints, otherwise 2 decimals"""
+    value = round(value, 2)
+    return int(value) if value == int(value) else value
+
+
+def _orderable(value: Any) -> Optional[str]:
+    """What a histogram can order a value as: "number", "date", or None"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return "number"
+    return "date" if isinstance(value, str) and _kind(value) == "date" else None
+
+
+def schema_types(properties: Dict[str, Any], path: str = "") -> Dict[str, str]:
+    """{dotted path: declared type} of a schema's scalar fields (array items under the array's path)"""
+    types = {}
+    for field, spec in properties.items():
+        ftype = spec.get("type")
+        field_path = f"{path}.{field}" if path else field
+        if ftype == "object":
+            types.update(schema_types(spec.get("properties", {}), field_path))
+        elif ftype == "array":
+            items = spec.get("items", {})
+            if items.get("type") and items["type"] not in ("object", "array"):
+                types[field_path] = items["type"]
+            else:
+                types.update(schema_types(item_properties(items), field_path))
+        elif ftype:
+            types[field_path] = ftype
+    return types
+
+
+def chunks(path: str, chunk_bytes: int = CHUNK_BYTES) -> List[Tuple[int, int]]:
+    """Byte ranges of a JSON Lines file; a line belongs to the range it starts in"""
+    size = os.path.getsize(path)
+    return [(start, min(size, start + chunk_bytes)) for start in range(0, size, chunk_bytes)] or [(0, 0)]
+
+
+def _lines(path: str, start: int, end: int, use_mmap: bool) -> Iterator[bytes]:
+    """Lines starting in [start, end): skip the partial line at start, finish the one crossing end"""
+    with open(path, 'rb') as f:
+        if use_mmap and os.path.getsize(path):
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos = start
+                if start and mm[start - 1:start] != b"\n":
+                    stop = mm.find(b"\n", start)
+                    pos = len(mm) if stop < 0 else stop + 1
+                while pos < end:
+                    stop = mm.find(b"\n", pos)
+                    stop = len(mm) if stop < 0 else stop
+                    yield mm[pos:stop]
+                    pos = stop + 1
+            return
+        f.seek(start)
+        if start:
+            f.seek(start - 1)
+            f.readline()              # rest of the line that started in the previous range
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            yield line
+
+
+def profile_chunk(task) -> CollectionProfile:
+    """Process-pool task: profile one byte range of one collection file"""
+    name, path, start, end, types, use_mmap = task
+    profile = CollectionProfile(name, types, seed=start)
+    for line in _lines(path, start, end, use_mmap):
+        line = line.strip()
+        if line:
+            profile.add(json.loads(line))
+    return profile
+
+
+def profile_bson(name: str, path: str, types: Dict[str, str]) -> CollectionProfile:
+    """BSON dumps are read sequentially (documents carry no line boundaries to split on)"""
+    if bson is None:
+        raise ImportError(f"{path}: reading BSON dumps needs the bson package (pip install pymongo)")
+    profile = CollectionProfile(name, types)
+    with open(path, 'rb') as f:
+        for doc in bson.decode_file_iter(f):
+            doc.pop("_id", None)
+            profile.add(json.loads(json.dumps(doc, default=str)))
+    return profile
+
+
+def profile_files(files: Dict[str, str], schema: Optional[List[Dict[str, Any]]] = None,
+                  workers: Optional[int] = None, use_mmap: bool = False,
+                  chunk_bytes: int = CHUNK_BYTES) -> Dict[str, CollectionProfile]:
+    """{collection: merged profile} of {collection: dump file}"""
+    declared = {c["collection"]: schema_types(c.get("properties", {})) for c in schema or [] if c.get("collection")}
+    profiles = {name: CollectionProfile(name, declared.get(name)) for name in files}
+    tasks = []
+    for name, path in files.items():
+        if path.endswith(".bson"):
+            profiles[name].merge(profile_bson(name, path, declared.get(name, {})))
+        else:
+            tasks.extend((name, path, start, end, declared.get(name, {}), use_mmap)
+                         for start, end in chunks(path, chunk_bytes))
+    if workers == 1 or len(tasks) < 2:
+        parts = map(profile_chunk, tasks)
+        for part in parts:
+            profiles[part.name].merge(part)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part in pool.map(profile_chunk, tasks):
+                profiles[part.name].merge(part)
+    return profiles
+
+
+def build_stats(profiles: Dict[str, CollectionProfile], base: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """stats.json content: measured sections, plus the sections of `base` the profiler does not produce"""
+    stats: Dict[str, Any] = {"cardinality": {}, "distinct": {}, "avg": {}, "fields": {}}
+    type_totals: Dict[str, List[int]] = {}
+    for name, profile in profiles.items():
+        stats["cardinality"][name] = profile.docs
+        stats["distinct"][name] = {path: min(f.hll.count(), f.values) or 1
+                                   for path, f in profile.fields.items() if "." not in path and not f.in_array}
+        avg = {path: _number(items / arrays) for path, (arrays, items) in profile.arrays.items() if arrays and path}
+        if avg:
+            stats["avg"][name] = avg
+        stats["fields"][name] = {path: profile.field_stats(path) for path in sorted(profile.fields)}
+        for kind, (b, n) in profile.type_bytes().items():
+            totals = type_totals.setdefault(kind, [0, 0])
+            totals[0] += b
+            totals[1] += n
+    stats["field_sizes"] = {kind: max(1, math.ceil(b / n)) for kind, (b, n) in sorted(type_totals.items()) if n}
+    for section, value in (base or {}).items():
+        if section not in stats:
+            stats[section] = value
+        elif isinstance(value, dict) and section != "field_sizes":
+            # Collections the dump does not cover keep their hand-written numbers
+            for name, entry in value.items():
+                stats[section].setdefault(name, entry)
+    return stats
+
+
+def dump_files(folder: str) -> Dict[str, str]:
+    """{collection: path} of the dump files in a folder (collection = file name)"""
+    files = {}
+    for entry in sorted(os.listdir(folder)):
+        stem, ext = os.path.splitext(entry)
+        if ext in EXTENSIONS:
+            files[stem] = os.path.join(folder, entry)
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build stats.json from JSON Lines / BSON collection dumps")
+    parser.add_argument("dumps", help="folder with one <Collection>.jsonl (or .bson) file per collection")
+    parser.add_argument("--output", default="stats.profiled.json", help="stats file to write")
+    parser.add_argument("--base", help="stats file whose unmeasured sections (correlation, access...) are kept")
+    parser.add_argument("--schema", help="schema file whose declared field types are used")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (1 = inline)")
+    parser.add_argument("--mmap", action="store_true", help="memory-map the dump files")
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES // 1024 ** 2, help="bytes per pool task")
+    args = parser.parse_args()
+
+    schema = None
+    if args.schema:
+        with open(args.schema, 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+    base = None
+    if args.base:
+        with open(args.base, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+    files = dump_files(args.dumps)
+    profiles = profile_files(files, schema, args.workers, args.mmap, args.chunk_mb * 1024 ** 2)
+    stats = build_stats(profiles, base)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+    for name, profile in profiles.items():
+        print(f"{name:<12}{profile.docs:>14,} documents  {len(profile.fields):>4} fields  "
+              f"distinct: {stats['distinct'][name]}")
+    print(f"field sizes: {stats['field_sizes']}  ->  {args.output}")
@@ -0,0 +1,584 @@
+# query_plan.py
+# Query plans as operator trees: Scan / Filter / Project / Join / Group / Sort
+#
+# A query is built from node classes over the collections of one model:
+#   plan = Project(Join(Filter(Scan("OrderLine"), "IDC"),
+#                       Filter(Scan("Product"), "brand")),
+#                  ["quantity", "price"])
+#   report = QueryPlanner(sim, shard_keys={"OrderLine": "IDC"}).explain(plan)
+#
+# QueryPlanner propagates every node's estimated rows, row width (bytes of the
+# fields still carried, sized like compute_doc_size) and rows on the busiest server
+# bottom-up, and costs each operator on the busiest server in the units of
+# cost_engine.py. Before costing, optimize() pushes filters down to the scans
+# (where the index-or-scan planner of indexes.py applies), reorders chains of
+# joins greedily, cheapest join first, and prunes the fields carried into joins
+# and groups to the ones used above them.
+#
+# Operators that move data between servers (joins placed by shuffle / gather /
+# broadcast, groups shuffling their partial groups, limited sorts gathered on one
+# node) also pay the network cost of topology.py for the rows × width they move.
+# Groups run as the partial / shuffle / merge phases of aggregation.py.
+
+import math
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from aggregation import AGGREGATE_BYTES, FUNCTIONS, two_phase
+from cost_engine import OPERATOR_COSTS
+from indexes import INDEX_KEY_COST
+from join_algorithms import IO_SECONDS_PER_GB, JoinSide, cheapest_join
+from selectivity import DEFAULT_EQUALITY
+
+
+class PlanNode(ABC):
+    """Base class of the operator nodes"""
+
+    children: Tuple["PlanNode", ...] = ()
+
+    @abstractmethod
+    def describe(self) -> str:
+        """One-line text form of this node (without its children)"""
+
+    def tree(self, depth: int = 0) -> str:
+        """Indented text form of the plan"""
+        lines = ["  " * depth + self.describe()]
+        lines.extend(child.tree(depth + 1) for child in self.children)
+        return "\n".join(lines)
+
+
+class Scan(PlanNode):
+    def __init__(self, collection: str):
+        self.collection = collection
+
+    def describe(self) -> str:
+        return f"Scan {self.collection}"
+
+
+class Filter(PlanNode):
+    def __init__(self, child: PlanNode, field: str, value: Any = None, op: str = "eq",
+                 selectivity: Optional[float] = None):
+        """
+        Predicate on `field`: op "eq" (value, None = unknown constant), "in" (list of
+        values) or "range" ((low, high), None = open bound). The selectivity comes
+        from the field statistics (selectivity.py) unless given.
+        """
+        self.child = child
+        self.field = field
+        self.value = value
+        self.op = op
+        self.selectivity = selectivity
+        self.children = (child,)
+
+    def predicate(self) -> tuple:
+        """Predicate tuple understood by SelectivityEstimator.estimate"""
+        if self.op == "range":
+            low, high = self.value if self.value is not None else (None, None)
+            return ("range", self.field, low, high)
+        return (self.op, self.field, self.value)
+
+    def copy(self, child: PlanNode) -> "Filter":
+        return Filter(child, self.field, self.value, self.op, self.selectivity)
+
+    def describe(self) -> str:
+        sel = "" if self.selectivity is None else f" (selectivity {self.selectivity:g})"
+        if self.op == "in":
+            return f"Filter {self.field} IN ({len(self.value)} values){sel}"
+        if self.op == "range":
+            low, high = self.value if self.value is not None else (None, None)
+            return f"Filter {'' if low is None else f'{low!r} <= '}{self.field}{'' if high is None else f' < {high!r}'}{sel}"
+        return f"Filter {self.field} = {'?' if self.value is None else repr(self.value)}{sel}"
+
+
+class Project(PlanNode):
+    def __init__(self, child: PlanNode, fields: Sequence[str]):
+        self.child = child
+        self.fields = list(fields)
+        self.children = (child,)
+
+    def describe(self) -> str:
+        return f"Project {', '.join(self.fields)}"
+
+
+class Join(PlanNode):
+    def __init__(self, left: PlanNode, right: PlanNode, key: Optional[str] = None):
+        """Equi-join on `key`; None = the shared ID* field of both sides"""
+        self.left = left
+        self.right = right
+        self.key = key
+        self.children = (left, right)
+
+    def describe(self) -> str:
+        return f"Join on {self.key or '(inferred)'}"
+
+
+class Group(PlanNode):
+    def __init__(self, child: PlanNode, keys: Sequence[str],
+                 functions: Sequence[Tuple[str, Optional[str]]] = (("count", None),)):
+        """GROUP BY keys with aggregates [(function, field)] per group, e.g. [("sum", "quantity")]"""
+        self.child = child
+        self.keys = list(keys)
+        self.functions = [(name, field) for name, field in functions] or [("count", None)]
+        for name, _ in self.functions:
+            if name not in FUNCTIONS:
+                raise ValueError(f"Unknown aggregate function {name!r} ({', '.join(FUNCTIONS)})")
+        self.children = (child,)
+
+    def copy(self, child: PlanNode) -> "Group":
+        return Group(child, self.keys, self.functions)
+
+    def outputs(self) -> List[str]:
+        """Names of the computed fields: count, sum_quantity..."""
+        return [name if field is None else f"{name}_{field}" for name, field in self.functions]
+
+    def describe(self) -> str:
+        functions = ", ".join(f"{name}({field or '*'})" for name, field in self.functions)
+        return f"Group by {', '.join(self.keys)}: {functions}"
+
+
+class Sort(PlanNode):
+    def __init__(self, child: PlanNode, fields: Sequence[str], limit: Optional[int] = None):
+        self.child = child
+        self.fields = list(fields)
+        self.limit = limit
+        self.children = (child,)
+
+    def describe(self) -> str:
+        limit = f" limit {self.limit:,}" if self.limit else ""
+        return f"Sort by {', '.join(self.fields)}{limit}"
+
+
+def _has_field(fields: Dict[str, Any], field: str) -> bool:
+    """Top-level or dotted (price.amount) field present in a field map"""
+    return field.split(".")[0] in fields
+
+
+def _shared_key(left: Dict[str, Any], right: Dict[str, Any], preferred: Sequence[str] = ()) -> Optional[str]:
+    """Join key of two field maps: a preferred shared field, else the first shared ID* field"""
+    shared = [f for f in left if f in right]
+    for field in preferred:
+        if field in shared:
+            return field
+    return next((f for f in shared if f.startswith("ID")), None)
+
+
+class QueryPlanner:
+    def __init__(self, nosql_simulator, shard_keys: Optional[Dict[str, str]] = None,
+                 servers: Optional[int] = None):
+        """
+        Connects to the main NoSQLSimulator. shard_keys maps a collection to the
+        key it is sharded on; collections without one sit on a single server.
+        """
+        self.sim = nosql_simulator
+        self.shard_keys = shard_keys or {}
+        self.servers = servers or nosql_simulator.servers
+
+    # ---------- fields ----------
+
+    def fields(self, node: PlanNode) -> Dict[str, Optional[str]]:
+        """Fields produced by a node → collection they come from (None = computed)"""
+        if isinstance(node, Scan):
+            schema = self.sim.get_collection_schema(node.collection)
+            if not schema:
+                raise ValueError(f"Collection {node.collection} is not in this model")
+            return {field: node.collection for field in schema}
+        if isinstance(node, Join):
+            merged = dict(self.fields(node.right))
+            merged.update(self.fields(node.left))
+            return merged
+        child = self.fields(node.child)
+        if isinstance(node, Project):
+            return {field: child[field] for field in node.fields if field in child}
+        if isinstance(node, Group):
+            groups = {field: child.get(field) for field in node.keys}
+            groups.update((name, None) for name in node.outputs())
+            return groups
+        return child
+
+    def _distinct(self, collection: Optional[str], field: str, rows: int) -> int:
+        """Distinct values of a field among `rows` rows (unknown: all different)"""
+        d = self.sim.selectivity.ndv(collection, field) if collection else None
+        return max(1, min(d or rows, rows))
+
+    def _width(self, fields: Dict[str, Optional[str]]) -> int:
+        """Bytes per row of a field map, each field sized within its own collection"""
+        by_collection: Dict[str, List[str]] = {}
+        computed = 0
+        for field, collection in fields.items():
+            if collection is None:
+                computed += AGGREGATE_BYTES
+            else:
+                by_collection.setdefault(collection, []).append(field)
+        return computed + sum(self.sim.compute_fields_size(c, fs) for c, fs in by_collection.items())
+
+    # ---------- optimization ----------
+
+    def optimize(self, node: PlanNode) -> PlanNode:
+        """Predicate pushdown, join reordering, then field pruning; the input plan is left unchanged"""
+        return self._prune(self._reorder(self._push(node)), None)
+
+    def _push(self, node: PlanNode) -> PlanNode:
+        if isinstance(node, Filter):
+            return self._place(self._push(node.child), node)
+        return self._rebuild(node, [self._push(child) for child in node.children])
+
+    def _place(self, node: PlanNode, f: Filter) -> PlanNode:
+        """Put filter f as close to the scans as its field allows"""
+        if isinstance(node, Join):
+            left, right = node.left, node.right
+            in_left, in_right = _has_field(self.fields(left), f.field), _has_field(self.fields(right), f.field)
+            if not (in_left or in_right):
+                return f.copy(node)
+            key = node.key or _shared_key(self.fields(left), self.fields(right))
+            if f.op == "eq" and f.field == key and in_left and in_right:
+                # An equality on the join key holds on both sides
+                left, right = self._place(left, f), self._place(right, f)
+            elif in_left:
+                # Any other field belongs to the side it is read from (the left one, as in fields())
+                left = self._place(left, f)
+            else:
+                right = self._place(right, f)
+            return Join(left, right, node.key)
+        if isinstance(node, (Project, Sort, Filter)) and _has_field(self.fields(node.child), f.field):
+            return self._rebuild(node, [self._place(node.child, f)])
+        if isinstance(node, Group) and f.field in node.keys:
+            return node.copy(self._place(node.child, f))
+        return f.copy(node)
+
+    def _rebuild(self, node: PlanNode, children: List[PlanNode]) -> PlanNode:
+        if isinstance(node, Filter):
+            return node.copy(children[0])
+        if isinstance(node, Project):
+            return Project(children[0], node.fields)
+        if isinstance(node, Join):
+            return Join(children[0], children[1], node.key)
+        if isinstance(node, Group):
+            return node.copy(children[0])
+        if isinstance(node, Sort):
+            return Sort(children[0], node.fields, node.limit)
+        return node
+
+    def _reorder(self, node: PlanNode) -> PlanNode:
+        """Greedy join ordering: start with the cheapest join, then add the cheapest connected input"""
+        if isinstance(node, Filter):
+            return self._order_filters(node)
+        if not isinstance(node, Join):
+            return self._rebuild(node, [self._reorder(child) for child in node.children])
+        inputs, keys = [], []
+
+        def flatten(n):
+            if isinstance(n, Join):
+                if n.key:
+                    keys.append(n.key)
+                flatten(n.left)
+                flatten(n.right)
+            else:
+                inputs.append(self._reorder(n))
+
+        flatten(node)
+        if len(inputs) == 2:
+            return Join(inputs[0], inputs[1], node.key)
+
+        def candidate(left, right):
+            key = _shared_key(self.fields(left), self.fields(right), keys)
+            join = Join(left, right, key)
+            row = self.explain(join, optimize=False)["operators"][0]
+            return (key is None, row["time_seconds"], row["rows"]), join
+
+        pairs = [candidate(inputs[i], inputs[j]) for i in range(len(inputs)) for j in range(i + 1, len(inputs))]
+        _, current = min(pairs, key=lambda p: p[0])
+        remaining = [n for n in inputs if n is not current.left and n is not current.right]
+        while remaining:
+            _, current = min((candidate(current, n) for n in remaining), key=lambda p: p[0])
+            remaining = [n for n in remaining if n is not current.right]
+        return current
+
+    def _order_filters(self, node: Filter) -> PlanNode:
+        """
+        A stack of filters over one scan: the filter with the cheapest access path
+        (usually an index seek) goes directly on the scan, the others keep their order
+        """
+        stack = []
+        while isinstance(node, Filter):
+            stack.append(node)
+            node = node.child
+        if not isinstance(node, Scan):
+            node = self._reorder(node)
+        elif len(stack) > 1:
+            key = self.shard_keys.get(node.collection)
+
+            def access_cost(f):
+                sel = self._selectivity(f, self._scan(node)[0])
+                return self.sim.indexes.plan_filter(node.collection, f.field, key, self.servers, sel)["cost_docs"]
+
+            best = min(reversed(stack), key=access_cost)
+            stack.remove(best)
+            stack.append(best)
+        for f in reversed(stack):
+            node = f.copy(node)
+        return node
+
+    def _prune(self, node: PlanNode, needed: Optional[set]) -> PlanNode:
+        """
+        Carry only the `needed` top-level fields (None = all) out of a node: join
+        inputs and group inputs get a Project of the fields used above them, so
+        moving them between servers costs only those bytes
+        """
+        if isinstance(node, Project):
+            return Project(self._prune(node.child, {f.split(".")[0] for f in node.fields}), node.fields)
+        if isinstance(node, Filter):
+            return node.copy(self._prune(node.child, None if needed is None else needed | {node.field.split(".")[0]}))
+        if isinstance(node, Sort):
+            keep = None if needed is None else needed | {f.split(".")[0] for f in node.fields}
+            return Sort(self._prune(node.child, keep), node.fields, node.limit)
+        if isinstance(node, Group):
+            used = node.keys + [field for _, field in node.functions if field]
+            return node.copy(self._narrow(node.child, {f.split(".")[0] for f in used}))
+        if isinstance(node, Join):
+            key = node.key or _shared_key(self.fields(node.left), self.fields(node.right))
+            sides = []
+            for side in node.children:
+                own = set(self.fields(side))
+                sides.append(self._narrow(side, None if needed is None else (needed & own) | {key} - {None}))
+            return Join(sides[0], sides[1], node.key)
+        return node
+
+    def _narrow(self, node: PlanNode, needed: Optional[set]) -> PlanNode:
+        """node pruned to `needed`, under a Project when it would still carry more"""
+        node = self._prune(node, needed)
+        fields = self.fields(node)
+        if needed is None or not set(fields) - needed:
+            return node
+        return Project(node, [f for f in fields if f in needed])
+
+    # ---------- estimation and costing ----------
+
+    def explain(self, plan: PlanNode, optimize: bool = True) -> Dict[str, Any]:
+        """
+        Optimize (unless disabled) and cost a plan. Returns the final plan, its output
+        rows / width / size and the per-operator breakdown (pre-order, with depth),
+        plus totals over every operator.
+        """
+        if optimize:
+            plan = self.optimize(plan)
+        operators: List[Dict[str, Any]] = []
+        est = self._analyze(plan, 0, operators)
+        totals = {field: sum(op[field] for op in operators)
+                  for field in ("docs_scanned", "time_seconds", "carbon_grams", "price_usd")}
+        return {
+            "plan": plan,
+            "rows": est["rows"],
+            "width": est["width"],
+            "output_size_gb": round(est["rows"] * est["width"] / 1024 ** 3, 4),
+            "docs_scanned": totals["docs_scanned"],
+            "time_seconds": round(totals["time_seconds"], 2),
+            "carbon_grams": round(totals["carbon_grams"], 2),
+            "price_usd": round(totals["price_usd"], 6),
+            "operators": operators,
+        }
+
+    def _analyze(self, node: PlanNode, depth: int, out: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Estimate of a node {rows, width, fields, shard_key, fraction}; appends its cost rows to `out`"""
+        position = len(out)
+        out.append({})
+        child_rows, children = [], []
+        for child in node.children:
+            child_rows.append(len(out))
+            children.append(self._analyze(child, depth + 1, out))
+
+        operator = type(node).__name__.lower()
+        est, cost_docs, docs, unit, extra = self._estimate(node, children)
+        detail = f"Join on {extra['join_key']}" if operator == "join" else node.describe()
+        row = {"depth": depth, "operator": operator, "detail": detail,
+               "rows": est["rows"], "width": est["width"], "docs_scanned": docs}
+        if "time_seconds" in extra:      # joins are costed by join_algorithms.py, movement included
+            row.update({k: extra.pop(k) for k in ("time_seconds", "carbon_grams", "price_usd")})
+        else:
+            seconds, carbon, price = OPERATOR_COSTS[unit]
+            row.update(time_seconds=cost_docs * seconds, carbon_grams=cost_docs * carbon,
+                       price_usd=cost_docs * price)
+        movement = extra.pop("movement", None)
+        if movement is not None and movement["bytes_moved"]:
+            row.update(time_seconds=row["time_seconds"] + movement["seconds"],
+                       carbon_grams=row["carbon_grams"] + movement["carbon_grams"],
+                       price_usd=row["price_usd"] + movement["price_usd"],
+                       data_movement=movement["pattern"], network_bytes=movement["bytes_moved"])
+        # A scan read through an index (filter access path, index nested-loop inner side) costs nothing itself
+        absorbed = {}
+        if operator == "filter" and isinstance(node.child, Scan):
+            absorbed[child_rows[0]] = "(read by the filter)"
+        index_side = extra.pop("index_side", None)
+        if index_side is not None:      # only scans (under a pruning Project) are marked indexed (see _join_side)
+            scan = child_rows[index_side] + isinstance(node.children[index_side], Project)
+            absorbed[scan] = "(index lookups by the join)"
+        for i, path in absorbed.items():
+            out[i].update(docs_scanned=0, time_seconds=0.0, carbon_grams=0.0, price_usd=0.0, access_path=path)
+        row.update(extra)
+        out[position] = row
+        return est
+
+    def _estimate(self, node: PlanNode, children: List[Dict[str, Any]]):
+        """(estimate, cost in scanned-document equivalents, docs touched, cost unit, extra report fields)"""
+        if isinstance(node, Scan):
+            return self._scan(node)
+        if isinstance(node, Filter):
+            return self._filter(node, children[0])
+        if isinstance(node, Project):
+            child = children[0]
+            fields = {f: child["fields"][f] for f in node.fields if f in child["fields"]}
+            return dict(child, fields=fields, width=self._width(fields)), 0, 0, "filter", {}
+        if isinstance(node, Join):
+            return self._join(node, children[0], children[1])
+        if isinstance(node, Group):
+            return self._group(node, children[0])
+        return self._sort(node, children[0])
+
+    def _scan(self, node: Scan):
+        fields = self.fields(node)
+        rows = self.sim.stats.get("cardinality", {}).get(node.collection, 0)
+        key = self.shard_keys.get(node.collection)
+        fraction = 1.0
+        if key and rows:
+            fraction = self.sim.sharding.hot_docs(node.collection, key, self.servers) / rows
+        est = {"rows": rows, "width": self.sim.compute_doc_size(node.collection), "fields": fields,
+               "shard_key": key, "fraction": fraction, "predicates": []}
+        docs = math.ceil(rows * fraction)
+        return est, docs, docs, "filter", {"access_path": "scan"}
+
+    def _selectivity(self, node: Filter, child: Dict[str, Any]) -> float:
+        """
+        Selectivity of the filter given the filters already applied below it on the
+        same collection, so correlation hints between them are honoured
+        """
+        if not _has_field(child["fields"], node.field):
+            raise ValueError(f"Filter field {node.field} is not produced by its input")
+        if node.selectivity is not None:
+            return node.selectivity
+        source = child["fields"][node.field.split(".")[0]]
+        if source is None:
+            return DEFAULT_EQUALITY
+        earlier = [p for c, p in child["predicates"] if c == source]
+        if not earlier:
+            return self.sim.selectivity.estimate(source, node.predicate())
+        before = self.sim.selectivity.estimate(source, ("and", earlier))
+        after = self.sim.selectivity.estimate(source, ("and", earlier + [node.predicate()]))
+        return after / before if before else 0.0
+
+    def _filter(self, node: Filter, child: Dict[str, Any]):
+        sel = self._selectivity(node, child)
+        rows = math.ceil(round(child["rows"] * sel, 6))
+        source = child["fields"][node.field.split(".")[0]]
+        est = dict(child, rows=rows, predicates=child["predicates"] + [(source, node.predicate())])
+        if isinstance(node.child, Scan):
+            # Filter directly on a collection: index seek or scan (indexes.py)
+            collection = node.child.collection
+            access = self.sim.indexes.plan_filter(collection, node.field, child["shard_key"], self.servers, sel)
+            if node.field == child["shard_key"] and node.op == "eq":
+                est["fraction"] = 1.0     # every match lives on the shard owning the value
+            return est, access["cost_docs"], access["docs_examined"], "filter", {"access_path": access["access_path"]}
+        docs = math.ceil(child["rows"] * child["fraction"])
+        return est, docs, docs, "filter", {}
+
+    def _join_side(self, side: PlanNode, est: Dict[str, Any], key: Optional[str]) -> JoinSide:
+        """A join input where it lies: partitioned on the join key, on another key or on one node"""
+        source = est["fields"].get(key) if key else None
+        rows, hot = est["rows"], math.ceil(est["rows"] * est["fraction"])
+        if not est["shard_key"]:
+            placement = "single"
+        else:
+            placement = "aligned" if est["shard_key"] == key else "sharded"
+        base = side.child if isinstance(side, Project) else side
+        indexed = (bool(key) and isinstance(base, Scan)
+                   and self.sim.indexes.find_index(base.collection, key) is not None)
+        return JoinSide(source or "(intermediate)", rows, est["width"], indexed,
+                        self._distinct(source, key, rows) if key else 1, placement,
+                        docs_by_key=hot if placement == "aligned" else math.ceil(rows / self.servers),
+                        docs_local=hot if est["shard_key"] else rows)
+
+    def _join(self, node: Join, left: Dict[str, Any], right: Dict[str, Any]):
+        key = node.key or _shared_key(left["fields"], right["fields"])
+        sides = [self._join_side(side, est, key) for side, est in ((node.left, left), (node.right, right))]
+        plan = cheapest_join(sides[0], sides[1], bool(key), self.servers, OPERATOR_COSTS["join"],
+                             self.sim.topology)
+
+        # Filters are independent of the key: matches spread over the key's whole domain,
+        # unless an equality pins both sides to the same key value (every pair matches)
+        rows = left["rows"] * right["rows"]
+        pinned = [{p[2] for _, p in side["predicates"] if p[0] == "eq" and p[1] == key} for side in (left, right)]
+        if key and not pinned[0] & pinned[1]:
+            domain = [self.sim.selectivity.ndv(side["fields"].get(key), key) or side["rows"] for side in (left, right)]
+            rows = math.ceil(round(rows / max(1, *domain), 6))
+        fields = dict(right["fields"])
+        fields.update(left["fields"])
+        # Where the output lies: partitioned on the key, on one node, or with the broadcast's large side
+        placement = plan["data_movement"]
+        shard_key, fraction = None, 1.0
+        if placement in ("co-located", "shuffle"):
+            shard_key = key
+            fraction = max(side.docs_by_key / max(1, side.docs) for side in sides)
+        elif placement == "broadcast":
+            large = max((left, right), key=lambda e: e["rows"] * e["width"])
+            shard_key, fraction = large["shard_key"], large["fraction"]
+        est = {"rows": rows, "width": left["width"] + right["width"], "fields": fields,
+               "shard_key": shard_key, "fraction": fraction,
+               "predicates": left["predicates"] + right["predicates"]}
+        extra = {"join_algorithm": plan["join_algorithm"], "data_movement": placement, "join_key": key,
+                 "index_side": plan["index_side"], "network_bytes": plan["network_bytes"],
+                 "time_seconds": plan["time_seconds"], "carbon_grams": plan["carbon_grams"],
+                 "price_usd": plan["price_usd"]}
+        return est, None, plan["docs_scanned"], "join", extra
+
+    def _group(self, node: Group, child: Dict[str, Any]):
+        docs = math.ceil(child["rows"] * child["fraction"])
+        keys = [(child["fields"].get(key), key) for key in node.keys]
+        fields = {k: child["fields"].get(k) for k in node.keys}
+        key_bytes = self._width(fields)
+        fields.update((name, None) for name in node.outputs())
+        state_bytes = AGGREGATE_BYTES * sum(FUNCTIONS[name] for name, _ in node.functions)
+        # Partial groups per shard, shuffled on the group keys and merged (aggregation.py);
+        # grouping on the shard key keeps every group on its shard
+        local = child["shard_key"] in node.keys
+        phases = two_phase(child["rows"], docs, lambda n: self.sim.selectivity.group_count_of(keys, n),
+                           key_bytes, state_bytes, self._width(fields), self.servers, bool(child["shard_key"]),
+                           local, self.sim.topology, gather=False)
+        groups = phases["groups"]
+        if phases["strategy"] == "two-phase":
+            shard_key, fraction = node.keys[0], phases["final_groups"] / groups
+        else:
+            shard_key, fraction = child["shard_key"], child["fraction"] if local else 1.0
+        est = {"rows": groups, "width": self._width(fields), "fields": fields,
+               "shard_key": shard_key, "fraction": fraction, "predicates": []}
+        usage = phases["usage"]
+        extra = {"movement": phases["movement"], "aggregate_strategy": phases["strategy"]}
+        spill_docs = usage["io_bytes"] / 1024 ** 3 * IO_SECONDS_PER_GB / OPERATOR_COSTS["aggregate"][0]
+        cost_docs = docs + usage["cpu_docs"] + spill_docs
+        return est, cost_docs, docs, "aggregate", extra
+
+    def _sort(self, node: Sort, child: Dict[str, Any]):
+        docs = math.ceil(child["rows"] * child["fraction"])
+        kept = min(node.limit, docs) if node.limit else docs
+        comparisons = docs * max(1.0, math.log2(max(kept, 2)))     # heap of `limit` rows when limited
+        est = dict(child)
+        extra = {}
+        if node.limit:
+            est.update(rows=min(node.limit, child["rows"]), shard_key=None, fraction=1.0)
+            if child["shard_key"]:
+                # Every shard sends its own top `limit` rows to the node merging them
+                sent = min(child["rows"], kept * self.servers)
+                extra["movement"] = self.sim.topology.movement("gather", sent * child["width"], self.servers)
+        return est, docs + comparisons * INDEX_KEY_COST, docs, "filter", extra
+
+
+def format_explain(report: Dict[str, Any]) -> str:
+    """Text table of an explain() report, one line per operator"""
+    lines = [f"{'Operator':<40}{'Rows':>20}{'Width':>8}{'Docs':>20}{'Time (s)':>18}{'Price ($)':>16}  Path"]
+    for op in report["operators"]:
+        path = op.get("access_path") or op.get("data_movement") or op.get("aggregate_strategy") or ""
+        if op.get("join_algorithm"):
+            path = f"{op['data_movement']}/{op['join_algorithm']}"
+        label = "  " * op["depth"] + op["detail"]
+        lines.append(f"{label:<40}{op['rows']:>20,}{op['width']:>8,}{op['docs_scanned']:>20,}"
+                     f"{op['time_seconds']:>18,.2f}{op['price_usd']:>16,.6f}  {path}")
+    lines.append(f"{'Total':<40}{report['rows']:>20,}{report['width']:>8,}{report['docs_scanned']:>20,}"
+                 f"{report['time_seconds']:>18,.2f}{report['price_usd']:>16,.6f}")
+    return "\n".join(lines)
@@ -1,6 +1,11 @@
 # query_sim.py
 # Filter and Join Queries + Cost Estimation
 # This file adds the 4 required operators 
+# (each one is a thin wrapper over the batch CostEngine in cost_engine.py)
+
+from cost_engine import CostEngine
+from tracing import traced
+
 
 class QuerySimulator:
     def __init__(self, nosql_simulator):
@@ -9,99 +14,104 @@ class QuerySimulator:
         to reuse stats, servers, etc.
         """
         self.sim = nosql_simulator
+        self.engine = CostEngine(nosql_simulator)
 
-    def filter_with_sharding(self, collection, shard_key):
+    @traced
+    def filter_with_sharding(self, collection, shard_key, field=None, value=None):
         """
         Filter query using sharding key → only 1 server is scanned (fast)
         Example: Find all stock for a specific product ID
+        field: equality predicate field; an index on it is used when cheaper than a scan
+        value: the constant compared to (output documents use its MCV share when known)
         """
-        total_docs = self.sim.stats.get("cardinality", {}).get(collection, 0)
-        
-        # With sharding: only 1 server
-        docs_scanned = total_docs // self.sim.servers
-        
-        # Cost estimation (simple approximations)
-        time_seconds = docs_scanned * 0.01      # 10 ms per document scanned
-        carbon_grams = docs_scanned * 0.0001    # rough grams CO₂
-        price_usd = docs_scanned * 0.000001     # rough $ per doc
+        cost = self.engine.evaluate_one(collection, "filter", shard_key, field=field, value=value)
         
         return {
             "query_type": "filter_with_sharding",
+            "access_path": cost["access_path"],
             "collection": collection,
             "shard_key": shard_key,
-            "docs_scanned": docs_scanned,
-            "time_seconds": round(time_seconds, 2),
-            "carbon_grams": round(carbon_grams, 2),
-            "price_usd": round(price_usd, 4)
+            "docs_scanned": cost["docs_scanned"],
+            "output_docs": cost["output_docs"],
+            "output_size_gb": round(cost["output_bytes"] / 1024 ** 3, 4),
+            "time_seconds": round(cost["time_seconds"], 2),
+            "carbon_grams": round(cost["carbon_grams"], 2),
+            "price_usd": round(cost["price_usd"], 4)
         }
 
-    def filter_without_sharding(self, collection):
+    @traced
+    def filter_without_sharding(self, collection, field=None, value=None):
         """
-        Filter query without sharding → full scan of ALL documents (slow)
+        Filter query without sharding → full scan of ALL documents (slow),
+        unless an index on `field` makes seek + fetch cheaper
         """
-        total_docs = self.sim.stats.get("cardinality", {}).get(collection, 0)
-        
-        # Without sharding: scan everything
-        docs_scanned = total_docs
-        
-        time_seconds = docs_scanned * 0.01
-        carbon_grams = docs_scanned * 0.0001
-        price_usd = docs_scanned * 0.000001
+        cost = self.engine.evaluate_one(collection, "filter", field=field, value=value)
         
         return {
             "query_type": "filter_without_sharding",
+            "access_path": cost["access_path"],
             "collection": collection,
-            "docs_scanned": docs_scanned,
-            "time_seconds": round(time_seconds, 2),
-            "carbon_grams": round(carbon_grams, 2),
-            "price_usd": round(price_usd, 4)
+            "docs_scanned": cost["docs_scanned"],
+            "output_docs": cost["output_docs"],
+            "output_size_gb": round(cost["output_bytes"] / 1024 ** 3, 4),
+            "time_seconds": round(cost["time_seconds"], 2),
+            "carbon_grams": round(cost["carbon_grams"], 2),
+            "price_usd": round(cost["price_usd"], 4)
         }
 
-    def join_with_sharding(self, coll1, coll2, shard_key):
+    @traced
+    def join_with_sharding(self, coll1, coll2, shard_key, other_shard_key=None):
         """
-        Nested loop join with sharding → only scans 1 server (fast)
+        Join with sharding → both sides co-partitioned on the key, the hottest
+        shard joins locally with the cheapest algorithm (fast)
         Example: Join OrderLine with Product on IDP
+        other_shard_key shards coll2 differently; misaligned sides are shuffled,
+        gathered or broadcast first (see join_algorithms.py / topology.py)
+        Example: OrderLine on IDC with Product on IDP → shuffle OrderLine on IDP
         """
-        docs1 = self.sim.stats.get("cardinality", {}).get(coll1, 0)
-        docs2 = self.sim.stats.get("cardinality", {}).get(coll2, 0)
-        
-        # With sharding: scan only the larger collection on 1 server
-        docs_scanned = max(docs1, docs2) // self.sim.servers
-        
-        time_seconds = docs_scanned * 0.05      # Joins are slower (~50 ms/doc)
-        carbon_grams = docs_scanned * 0.0005
-        price_usd = docs_scanned * 0.000005
+        cost = self.engine.evaluate_one(coll1, "join", shard_key, other=coll2, other_shard_key=other_shard_key)
         
         return {
             "query_type": "join_with_sharding",
+            "join_algorithm": cost["join_algorithm"],
+            "data_movement": cost["data_movement"],
             "collections": f"{coll1} + {coll2}",
             "shard_key": shard_key,
-            "docs_scanned": docs_scanned,
-            "time_seconds": round(time_seconds, 2),
-            "carbon_grams": round(carbon_grams, 2),
-            "price_usd": round(price_usd, 6)
+            "other_shard_key": shard_key if other_shard_key is None else other_shard_key,
+            "docs_scanned": cost["docs_scanned"],
+            "output_docs": cost["output_docs"],
+            "output_size_gb": round(cost["output_bytes"] / 1024 ** 3, 4),
+            "time_seconds": round(cost["time_seconds"], 2),
+            "carbon_grams": round(cost["carbon_grams"], 2),
+            "price_usd": round(cost["price_usd"], 6)
         }
 
+    @traced
     def join_without_sharding(self, coll1, coll2):
         """
-        Nested loop join without sharding → full cross-product (very slow & expensive)
+        Join without sharding → both collections on the primary node, joined there
+        or scattered over the servers first; the cheapest of hash / index
+        nested-loop / sort-merge / nested loop
         """
-        docs1 = self.sim.stats.get("cardinality", {}).get(coll1, 0)
-        docs2 = self.sim.stats.get("cardinality", {}).get(coll2, 0)
-        
-        # Without sharding: full nested loop (docs1 × docs2)
-        docs_scanned = docs1 * docs2
-        
-        time_seconds = docs_scanned * 0.05
-        carbon_grams = docs_scanned * 0.0005
-        price_usd = docs_scanned * 0.000005
+        cost = self.engine.evaluate_one(coll1, "join", other=coll2)
         
         return {
             "query_type": "join_without_sharding",
+            "join_algorithm": cost["join_algorithm"],
+            "data_movement": cost["data_movement"],
             "collections": f"{coll1} + {coll2}",
-            "docs_scanned": docs_scanned,
-            "time_seconds": round(time_seconds, 2),
-            "carbon_grams": round(carbon_grams, 2),
-            "price_usd": round(price_usd, 6)
+            "docs_scanned": cost["docs_scanned"],
+            "output_docs": cost["output_docs"],
+            "output_size_gb": round(cost["output_bytes"] / 1024 ** 3, 4),
+            "time_seconds": round(cost["time_seconds"], 2),
+            "carbon_grams": round(cost["carbon_grams"], 2),
+            "price_usd": round(cost["price_usd"], 6)
         }
-    
+
+    @traced
+    def explain_join(self, coll1, coll2, shard_key=None):
+        """
+        Every placement / join algorithm's estimated time plus the chosen one's
+        CPU / memory / I/O / network usage (see join_algorithms.py)
+        """
+        return self.engine.explain_join(coll1, coll2, shard_key)
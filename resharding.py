@@ -0,0 +1,244 @@
+# resharding.py
+# Migrations between shard layouts: growing / shrinking the cluster, changing the shard key or scheme
+#
+# A layout is {"servers", "shard_key", "scheme"} (sharding.py places the documents).
+# From the current and the target layout of a collection, migrate() derives the
+# documents every server sends and receives:
+#   resize  (same key and scheme) - only the share that changes owner moves
+#   reshard (new key or scheme)   - every document is placed again; one stays where
+#                                   it is only when old and new owner coincide, so
+#                                   the collection is copied almost whole (and held
+#                                   twice until the cut-over)
+# and moves them with one of two strategies:
+#   consistent   - consistent hashing with VIRTUAL_NODES token ranges per server: a
+#                  new server takes its ranges from every donor at once, every
+#                  server streams in parallel, one cheap ring update per range
+#   range_split  - a chunk balancer (MongoDB): ranges are split into CHUNK_BYTES
+#                  chunks and each server takes part in one chunk migration at a
+#                  time, CHUNK_COMMIT_SECONDS of metadata commit after every chunk;
+#                  a resize moves only the servers' excess over the target layout
+# Transfers run at most at the bandwidth cap of a server (default
+# MIGRATION_BANDWIDTH_SHARE of its NIC, topology.py). Queries keep using the
+# current layout until the cut-over, on servers whose network and disk the
+# migration occupies: they slow down by 1 / (1 - cap / NIC), and since a scatter
+# query waits for its slowest shard the whole query does. Sizes come from
+# collection_size_gb / compute_doc_size, query costs from the cost engine (filter
+# on the shard key, before and after the move, each on its layout's scheme).
+#
+# Usage: python resharding.py --collection OrderLine --from IDP:1000:hash --to IDP:1500:hash [--bandwidth-mbps 2000]
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from sharding import HASH, RANGE
+from tracing import note, traced
+
+CHUNK_BYTES = 128 * 1024 ** 2       # balancer chunk (MongoDB's default range size)
+CHUNK_COMMIT_SECONDS = 0.5          # per chunk: critical section, config metadata commit, routing refresh
+VIRTUAL_NODES = 256                 # token ranges per server on the consistent-hashing ring
+RANGE_HANDOFF_SECONDS = 0.01        # per token range: ring state update (gossiped)
+MIGRATION_BANDWIDTH_SHARE = 0.5     # default cap: share of a server's NIC given to the migration
+STRATEGIES = ("consistent", "range_split")
+
+
+def parse_layout(text: str, default: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """'IDP:1500:range' → {"shard_key": "IDP", "servers": 1500, "scheme": "range"}; missing parts from default"""
+    default = default or {}
+    parts = text.split(":")
+    return {
+        "shard_key": parts[0] or default.get("shard_key"),
+        "servers": int(parts[1]) if len(parts) > 1 and parts[1] else default.get("servers"),
+        "scheme": parts[2] if len(parts) > 2 and parts[2] else default.get("scheme", HASH),
+    }
+
+
+def describe(layout: Dict[str, Any]) -> str:
+    return f"{layout['shard_key']} / {layout['servers']:,} servers / {layout['scheme']}"
+
+
+def transfers(current: List[float], target: List[float], reshard: bool,
+              strategy: str) -> Tuple[List[float], List[float]]:
+    """
+    Documents sent and received by every server (the longer of the two server lists)
+    when going from the current to the target per-server loads
+    """
+    n = max(len(current), len(target))
+    cur = current + [0.0] * (n - len(current))
+    tgt = target + [0.0] * (n - len(target))
+    total = sum(cur)
+    if not total:
+        return [0.0] * n, [0.0] * n
+    if reshard:
+        # New owners are independent of the old ones: a document stays with probability tgt_i / total
+        sent = [c * (1 - t / total) for c, t in zip(cur, tgt)]
+        received = [t * (1 - c / total) for c, t in zip(cur, tgt)]
+        return sent, received
+    if strategy == "range_split":
+        # The balancer moves every server's excess over its target load to the servers below it
+        sent = [max(0.0, c - t) for c, t in zip(cur, tgt)]
+        received = [max(0.0, t - c) for c, t in zip(cur, tgt)]
+        scale = sum(sent) / sum(received) if sum(received) else 0.0
+        return sent, [r * scale for r in received]
+    # Consistent hashing: the servers that join (or leave) own all the ranges that change hands
+    old, new = len(current), len(target)
+    share = abs(new - old) / max(old, new)
+    if new >= old:
+        sent = [c * share for c in cur[:old]] + [0.0] * (n - old)
+        joining = sum(tgt[old:])
+        received = [0.0] * old + [t * total * share / joining if joining else 0.0 for t in tgt[old:]]
+    else:
+        sent = [0.0] * new + cur[new:]
+        moved = sum(cur[new:])
+        staying = sum(tgt[:new])
+        received = [t * moved / staying if staying else 0.0 for t in tgt[:new]] + [0.0] * (n - new)
+    return sent, received
+
+
+class ReshardingModel:
+    def __init__(self, nosql_simulator):
+        """Connects to the main NoSQLSimulator (sharding layouts, document sizes, topology)"""
+        self.sim = nosql_simulator
+
+    def bandwidth(self, bandwidth_mbps: Optional[float] = None) -> float:
+        """Bytes per second a server gives to the migration"""
+        nic = self.sim.topology.nic_gbps * 1e9 / 8
+        if bandwidth_mbps is None:
+            return nic * MIGRATION_BANDWIDTH_SHARE
+        return min(nic, bandwidth_mbps * 1e6 / 8)
+
+    @traced
+    def migrate(self, collection: str, current: Dict[str, Any], target: Dict[str, Any],
+                strategy: Optional[str] = None, bandwidth_mbps: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Cost of moving a collection from the current to the target layout
+        ({"servers", "shard_key", "scheme"}; missing target entries keep the current ones).
+        strategy: "consistent" or "range_split" (default: range_split for a range target)
+        """
+        sim = self.sim
+        current = {"servers": sim.servers, "scheme": HASH, **current}
+        target = {**current, **{k: v for k, v in target.items() if v is not None}}
+        strategy = strategy or ("range_split" if target["scheme"] == RANGE else "consistent")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown migration strategy {strategy!r} ({', '.join(STRATEGIES)})")
+        if not current["shard_key"] or not target["shard_key"]:
+            raise ValueError("Both layouts need a shard key")
+        reshard = (current["shard_key"], current["scheme"]) != (target["shard_key"], target["scheme"])
+
+        doc_size = sim.compute_doc_size(collection)
+        before = sim.sharding.layout(collection, current["shard_key"], current["servers"], current["scheme"])
+        after = sim.sharding.layout(collection, target["shard_key"], target["servers"], target["scheme"])
+        sent, received = transfers(before, after, reshard, strategy)
+        moved_docs = sum(received)
+        moved_bytes = moved_docs * doc_size
+        cap = self.bandwidth(bandwidth_mbps)
+
+        # Duration: the busiest server, or (chunk balancer) the migrations the cluster runs at once
+        busiest = max((max(s, r) * doc_size for s, r in zip(sent, received)), default=0.0)
+        if strategy == "consistent":
+            ranges = VIRTUAL_NODES * (target["servers"] if reshard
+                                      else abs(target["servers"] - current["servers"]))
+            per_server_ranges = VIRTUAL_NODES if moved_bytes else 0
+            seconds = busiest / cap + per_server_ranges * RANGE_HANDOFF_SECONDS
+            chunks = ranges if moved_bytes else 0
+            in_flight = moved_bytes          # donors drop their ranges once the ring has switched
+        else:
+            # Chunks carry the bytes actually moved (ceil on the total, not per receiving server)
+            chunks = math.ceil(round(moved_bytes / CHUNK_BYTES, 6))
+            per_server = busiest / cap + math.ceil(round(busiest / CHUNK_BYTES, 6)) * CHUNK_COMMIT_SECONDS
+            parallel = max(1, max(current["servers"], target["servers"]) // 2)
+            cluster = moved_bytes / (parallel * cap) + math.ceil(chunks / parallel) * CHUNK_COMMIT_SECONDS
+            seconds = max(per_server, cluster) if chunks else 0.0
+            in_flight = min(moved_bytes, parallel * CHUNK_BYTES)     # a chunk is deleted after its commit
+        if reshard:
+            in_flight = moved_bytes          # the new copy is complete before the cut-over
+        involved = sum(1 for s, r in zip(sent, received) if s or r)
+        note(reshard=reshard, moved_docs=moved_docs, busiest_bytes=busiest, cap=cap, involved=involved)
+
+        # Queries during the move: the current layout on servers busy migrating; after: the target layout
+        nic = sim.topology.nic_gbps * 1e9 / 8
+        slowdown = 1 / (1 - min(cap / nic, 0.99)) if moved_bytes else 1.0
+        engine = sim.engine
+        query_before = engine.evaluate_one(collection, "filter", current["shard_key"], current["servers"],
+                                           scheme=current["scheme"])
+        query_after = engine.evaluate_one(collection, "filter", target["shard_key"], target["servers"],
+                                          scheme=target["scheme"])
+        gb = moved_bytes / 1024 ** 3
+        collection_gb = sim.collection_size_gb(collection)
+        return {
+            "collection": collection,
+            "strategy": strategy,
+            "current": describe(current),
+            "target": describe(target),
+            "reshard": reshard,
+            "collection_gb": collection_gb,
+            "docs_moved": int(round(moved_docs)),
+            "gb_moved": round(gb, 3),
+            "moved_share": round(moved_docs / sum(before), 4) if sum(before) else 0.0,
+            "chunks_moved": chunks,
+            "servers_involved": involved,
+            "max_gb_sent_per_server": round(max(sent, default=0.0) * doc_size / 1024 ** 3, 3),
+            "max_gb_received_per_server": round(max(received, default=0.0) * doc_size / 1024 ** 3, 3),
+            "peak_extra_gb": round(in_flight / 1024 ** 3, 3),
+            "bandwidth_mbps": round(cap * 8 / 1e6, 1),
+            "duration_seconds": round(seconds, 2),
+            "price_usd": gb * sim.topology.price_per_gb,
+            "carbon_grams": gb * sim.topology.carbon_per_gb,
+            "query_slowdown": round(slowdown, 3),
+            "query_seconds_before": query_before["time_seconds"],
+            "query_seconds_during": query_before["time_seconds"] * slowdown,
+            "query_seconds_after": query_after["time_seconds"],
+            "query_price_before": query_before["price_usd"],
+            "query_price_during": query_before["price_usd"] * slowdown,
+            "query_price_after": query_after["price_usd"],
+            "target_hot_shard_factor": sim.sharding.stats(collection, target["shard_key"], target["servers"],
+                                                          target["scheme"])["hot_shard_factor"],
+        }
+
+    def compare(self, collection: str, current: Dict[str, Any], target: Dict[str, Any],
+                bandwidth_mbps: Optional[float] = None) -> List[Dict[str, Any]]:
+        """The same migration with every strategy"""
+        return [self.migrate(collection, current, target, s, bandwidth_mbps) for s in STRATEGIES]
+
+    def plan(self, migrations: Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]], strategy: Optional[str] = None,
+             bandwidth_mbps: Optional[float] = None) -> Dict[str, Any]:
+        """Several collections ({collection: (current, target)}), migrated one after the other"""
+        steps = [self.migrate(c, cur, tgt, strategy, bandwidth_mbps) for c, (cur, tgt) in migrations.items()]
+        return {
+            "steps": steps,
+            "gb_moved": round(sum(s["gb_moved"] for s in steps), 3),
+            "chunks_moved": sum(s["chunks_moved"] for s in steps),
+            "duration_seconds": round(sum(s["duration_seconds"] for s in steps), 2),
+            "price_usd": sum(s["price_usd"] for s in steps),
+            "carbon_grams": sum(s["carbon_grams"] for s in steps),
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from main import NoSQLSimulator
+
+    parser = argparse.ArgumentParser(description="Compare migration strategies of a collection on every model")
+    parser.add_argument("--collection", default="OrderLine")
+    parser.add_argument("--from", dest="current", default="IDP:1000:hash", help="KEY[:SERVERS[:SCHEME]]")
+    parser.add_argument("--to", dest="target", default="IDP:1500:hash", help="KEY[:SERVERS[:SCHEME]]")
+    parser.add_argument("--bandwidth-mbps", type=float, help="migration cap per server (default: half the NIC)")
+    args = parser.parse_args()
+
+    current = parse_layout(args.current, {"servers": 1000})
+    target = parse_layout(args.target, current)
+    schemas_folder = "schemas"
+    db_files = sorted(f for f in os.listdir(schemas_folder) if f.startswith("db") and f.endswith(".json"))
+    print(f"MIGRATION: {args.collection} {describe(current)} → {describe(target)}")
+    print(f"{'Model':<6}{'Strategy':<13}{'GB moved':>14}{'Share':>8}{'Chunks':>10}{'Max GB in':>12}"
+          f"{'Duration (s)':>16}{'Price ($)':>12}{'Slowdown':>10}{'Query s before':>18}{'After':>16}")
+    for db_file in db_files:
+        sim = NoSQLSimulator(os.path.join(schemas_folder, db_file), "stats.json", "indexes.json")
+        if not sim.get_collection_schema(args.collection):
+            continue
+        for m in sim.resharding.compare(args.collection, current, target, args.bandwidth_mbps):
+            print(f"{db_file[:-5].upper():<6}{m['strategy']:<13}{m['gb_moved']:>14,.2f}{m['moved_share']:>8.1%}"
+                  f"{m['chunks_moved']:>10,}{m['max_gb_received_per_server']:>12,.2f}"
+                  f"{m['duration_seconds']:>16,.1f}{m['price_usd']:>12,.2f}{m['query_slowdown']:>10.2f}"
+                  f"{m['query_seconds_before']:>18,.2f}{m['query_seconds_after']:>16,.2f}")
@@ -1,44 +1,72 @@
 # run_final.py
 # The Data Model Selection’s Challenge 
-# Runs ALL queries on ALL 5 models and chooses the best one
+# Runs ALL queries on ALL 5 models and chooses the best one,
+# then evaluates the weighted workload (workload.py) per hour on every model
+#
+# Usage: python run_final.py [--workload workload.json] [--csv results.csv] [--json results.jsonl] [--trace trace.json]
+#                           [--placement placement.json]
+#   --trace      record every cost computation (tracing.py): Chrome trace JSON + a CSV next to it
+#   --placement  replicate every model across regions (placement.py): costs and storage of the replicas
 
 from main import NoSQLSimulator
-from query_sim import QuerySimulator
-from aggregate_sim import AggregateSimulator
+from cost_engine import CostEngine
+from placement import load_placement
+from workload import WorkloadEvaluator, load_workload, stream_rows
+import argparse
 import os
+import tracing
+
+parser = argparse.ArgumentParser(description="Score every model on the challenge queries and a weighted workload")
+parser.add_argument("--workload", default="workload.json", help="weighted workload file")
+parser.add_argument("--csv", help="stream the workload rows to this CSV file")
+parser.add_argument("--json", help="stream the workload rows to this JSON Lines file")
+parser.add_argument("--trace", help="export a Chrome trace (and CSV) of every cost computation to this file")
+parser.add_argument("--placement", help="multi-region placement file (default: one region, no replicas)")
+args = parser.parse_args()
+if args.trace:
+    tracing.enable()
 
 print("Running complete use case simulation on all 5 models...\n")
 
 schemas_folder = "schemas"
-db_files = [f for f in os.listdir(schemas_folder) if f.startswith("db") and f.endswith(".json")]
+db_files = sorted(f for f in os.listdir(schemas_folder) if f.startswith("db") and f.endswith(".json"))
+
+db_names = [db_file.replace('.json', '').upper() for db_file in db_files]
+sims = [NoSQLSimulator(os.path.join(schemas_folder, db_file), "stats.json", "indexes.json") for db_file in db_files]
+if args.placement:
+    placement = load_placement(args.placement)
+    for sim in sims:
+        sim.placement.configure(placement)
+engine = CostEngine(sims)
+
+# The use case: (label, collection, operator, shard key, other collection, price rounding)
+queries = [
+    ("Filter", "Stock", "filter", "IDP", None, 4),
+    ("Join", "OrderLine", "join", "IDP", "Product", 6),
+    ("Aggregate", "OrderLine", "aggregate", "IDP", None, 6),
+]
+
+# One batch over every (model, query) pair instead of one Python call per scenario
+scenarios = [(m, q) for m in range(len(sims)) for q in queries]
+costs = engine.evaluate(
+    collections=[q[1] for _, q in scenarios],
+    operators=[q[2] for _, q in scenarios],
+    shard_keys=[q[3] for _, q in scenarios],
+    models=[m for m, _ in scenarios],
+    others=[q[4] for _, q in scenarios],
+)
 
 total_costs = {}
 
-for db_file in sorted(db_files):
-    full_path = os.path.join(schemas_folder, db_file)
-    db_name = db_file.replace('.json', '').upper()
-    
+for m, db_name in enumerate(db_names):
     print(f"Model: {db_name}")
-    sim = NoSQLSimulator(full_path, "stats.json")
-    qs = QuerySimulator(sim)
-    aggs = AggregateSimulator(sim)
     
     model_total_cost = 0.0
     
-    # Filter example
-    filter_cost = qs.filter_with_sharding("Stock", "IDP")["price_usd"]
-    model_total_cost += filter_cost
-    print(f"  Filter cost: ${filter_cost:.6f}")
-    
-    # Join example
-    join_cost = qs.join_with_sharding("OrderLine", "Product", "IDP")["price_usd"]
-    model_total_cost += join_cost
-    print(f"  Join cost: ${join_cost:.6f}")
-    
-    # Aggregate example
-    agg_cost = aggs.simulate_aggregate("OrderLine", "IDP")["price_usd"]
-    model_total_cost += agg_cost
-    print(f"  Aggregate cost: ${agg_cost:.6f}")
+    for i, (label, _, _, _, _, digits) in enumerate(queries):
+        cost = round(float(costs["price_usd"][m * len(queries) + i]), digits)
+        model_total_cost += cost
+        print(f"  {label} cost: ${cost:.6f}")
     
     print(f"  TOTAL ESTIMATED COST for {db_name}: ${model_total_cost:.6f}\n")
     total_costs[db_name] = model_total_cost
@@ -51,3 +79,34 @@ print(f"Total estimated cost: ${total_costs[best_model]:.6f}")
 print("Reason: Lowest overall cost, balanced sharding, minimal duplication, realistic scalability")
 print("="*70)
 print("All other models have higher costs due to excessive denormalization (especially DB4 & DB5)")
+
+# Weighted workload: every query at its own frequency, per hour
+workload = load_workload(args.workload)
+print(f"\nWEIGHTED WORKLOAD: {workload.get('name', args.workload)} ({len(workload['queries'])} queries)")
+print(f"{'Model':<6}{'Query':<28}{'Per hour':>12}{'Latency (s)':>20}{'SLO':>6}{'$ / hour':>22}{'CPU-s / hour':>26}")
+hourly = {}
+evaluator = WorkloadEvaluator(sims, db_names)
+for row in stream_rows(evaluator.rows(workload), args.csv, args.json):
+    if row["query"] == "TOTAL":
+        hourly[row["model"]] = row
+        print(f"{row['model']:<6}{'TOTAL':<28}{row['per_hour']:>12,.0f}{'':>20}{row['slo_violations']:>6}"
+              f"{row['hourly_price_usd']:>22,.2f}{row['cpu_seconds_per_hour']:>26,.0f}"
+              f"   servers needed: {row['required_servers']:,}\n")
+    else:
+        print(f"{row['model']:<6}{row['query']:<28}{row['per_hour']:>12,.0f}{row['latency_seconds']:>20,.2f}"
+              f"{'ok' if row['slo_met'] else 'MISS':>6}{row['hourly_price_usd']:>22,.2f}"
+              f"{row['cpu_seconds_per_hour']:>26,.0f}")
+
+# Best model under the workload: meets every SLO (or misses the fewest), then cheapest per hour
+best_weighted = min(hourly, key=lambda name: (hourly[name]["slo_violations"], hourly[name]["hourly_price_usd"]))
+print("="*70)
+print(f"BEST MODEL FOR THE WORKLOAD: {best_weighted}")
+print(f"Hourly cost: ${hourly[best_weighted]['hourly_price_usd']:,.2f}, "
+      f"servers needed: {hourly[best_weighted]['required_servers']:,}, "
+      f"SLO misses: {hourly[best_weighted]['slo_violations']}")
+print("="*70)
+
+if args.trace:
+    tracer = tracing.disable()
+    tracer.export(args.trace)
+    print(f"Trace: {len(tracer.spans):,} spans → {args.trace} (+ CSV)")
@@ -0,0 +1,202 @@
+# selectivity.py
+# Selectivity estimation from per-field statistics: NDV, most common values, histograms
+#
+# Field statistics live in the optional "fields" section of stats.json:
+#   "fields": {
+#     "Product": {
+#       "brand": { "ndv": 5000, "mcv": [["Apple", 0.02], ["Samsung", 0.015]] },
+#       "price.amount": { "histogram": [1, 9, 19, 49, 99, 199, 499, 2999] }
+#     }
+#   }
+# ndv overrides stats["distinct"]; mcv lists [value, fraction of the documents];
+# histogram is the bounds of an equi-depth histogram (every bucket holds the same
+# share of the documents); "min" / "max" alone act as a one-bucket histogram;
+# null_frac is the share of documents without the field.
+#
+# Conjunctions multiply selectivities (independence) unless a hint says otherwise.
+# Fields known to move together can be declared once:
+#   "correlation": { "Product": [["brand", "categories"]] }
+# Fields of one group are treated as fully correlated (the most selective one wins).
+#
+# Predicates are tuples:
+#   ("eq", field, value)  ("in", field, [values])  ("range", field, low, high)
+#   ("and", [predicates])  ("and", [predicates], "independent" | "correlated" | "backoff")
+# value / low / high may be None (unknown constant, open bound).
+
+import bisect
+import math
+from datetime import date
+from typing import Any, Dict, Optional, Sequence
+
+from tracing import traced
+
+DEFAULT_EQUALITY = 0.05    # no statistics at all: the 5% guess used since the first challenge
+DEFAULT_RANGE = 1 / 3      # open range without a histogram (System R's classic guess)
+
+
+def _ordinal(value: Any) -> Optional[float]:
+    """Numeric position of a histogram value: numbers as is, ISO dates as day numbers"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(date.fromisoformat(value[:10]).toordinal())
+        except ValueError:
+            return None
+    return None
+
+
+def histogram_fraction(bounds: Sequence[Any], value: Any) -> float:
+    """Share of the documents below `value` in an equi-depth histogram"""
+    buckets = len(bounds) - 1
+    if buckets < 1:
+        return 0.5
+    if value <= bounds[0]:
+        return 0.0
+    if value >= bounds[-1]:
+        return 1.0
+    i = bisect.bisect_right(bounds, value) - 1
+    lo, hi, x = _ordinal(bounds[i]), _ordinal(bounds[i + 1]), _ordinal(value)
+    within = 0.5        # non-numeric values: middle of the bucket
+    if lo is not None and hi is not None and x is not None and hi > lo:
+        within = (x - lo) / (hi - lo)
+    return (i + within) / buckets
+
+
+def distinct_values(ndv: float, rows: float) -> float:
+    """Expected distinct values among `rows` documents drawn from `ndv` values (Cardenas)"""
+    if ndv <= 0 or rows <= 0:
+        return 0.0
+    if ndv == 1:
+        return 1.0
+    return ndv * -math.expm1(rows * math.log1p(-1.0 / ndv))
+
+
+class SelectivityEstimator:
+    def __init__(self, nosql_simulator):
+        """Connects to the main NoSQLSimulator (stats)"""
+        self.sim = nosql_simulator
+
+    def field_stats(self, collection: str, field: str) -> Dict[str, Any]:
+        return self.sim.stats.get("fields", {}).get(collection, {}).get(field, {})
+
+    def ndv(self, collection: str, field: str) -> Optional[int]:
+        """Distinct values of a field: "fields" ndv, then "distinct", else unknown"""
+        known = self.field_stats(collection, field).get("ndv")
+        if known:
+            return known
+        return self.sim.stats.get("distinct", {}).get(collection, {}).get(field)
+
+    def equality(self, collection: str, field: str, value: Any = None) -> float:
+        """field = value. MCVs give their own share, other values split the rest evenly"""
+        stats = self.field_stats(collection, field)
+        mcv = stats.get("mcv", [])
+        for v, share in mcv:
+            if value is not None and v == value:
+                return share
+        ndv = self.ndv(collection, field)
+        if not ndv:
+            return DEFAULT_EQUALITY
+        present = 1.0 - stats.get("null_frac", 0.0)
+        if value is None:
+            return present / ndv     # a typical value
+        rest = max(0.0, present - sum(share for _, share in mcv))
+        return rest / max(1, ndv - len(mcv))
+
+    def in_list(self, collection: str, field: str, values: Sequence[Any]) -> float:
+        """field IN (values): sum of the distinct values' equalities"""
+        present = 1.0 - self.field_stats(collection, field).get("null_frac", 0.0)
+        return min(present, sum(self.equality(collection, field, v) for v in set(values)))
+
+    def range(self, collection: str, field: str, low: Any = None, high: Any = None) -> float:
+        """low <= field < high (None = open bound) from the equi-depth histogram"""
+        stats = self.field_stats(collection, field)
+        bounds = stats.get("histogram")
+        if not bounds and "min" in stats and "max" in stats:
+            bounds = [stats["min"], stats["max"]]
+        if not bounds:
+            return DEFAULT_RANGE if low is None or high is None else DEFAULT_RANGE / 2
+        below_high = 1.0 if high is None else histogram_fraction(bounds, high)
+        below_low = 0.0 if low is None else histogram_fraction(bounds, low)
+        return max(0.0, below_high - below_low) * (1.0 - stats.get("null_frac", 0.0))
+
+    def conjunction(self, collection: str, parts: Sequence[tuple], hint: Optional[str] = None) -> float:
+        """
+        AND of (field, selectivity) parts. Default: fields of a declared correlation
+        group keep only their most selective part, groups multiply. Hints:
+        "independent" (product), "correlated" (minimum), "backoff" (s1 * s2^1/2 * s3^1/4...).
+        """
+        sels = [s for _, s in parts]
+        if not sels:
+            return 1.0
+        if hint == "independent":
+            return math.prod(sels)
+        if hint == "correlated":
+            return min(sels)
+        if hint == "backoff":
+            return math.prod(s ** (0.5 ** i) for i, s in enumerate(sorted(sels)))
+        groups = self.sim.stats.get("correlation", {}).get(collection, [])
+        best: Dict[Any, float] = {}
+        for field, s in parts:
+            group = next((i for i, g in enumerate(groups) if field in g), ("field", field, len(best)))
+            best[group] = min(best.get(group, 1.0), s)
+        return math.prod(best.values())
+
+    @traced
+    def estimate(self, collection: str, predicate: tuple) -> float:
+        """Selectivity of a predicate tuple (see the module header)"""
+        kind = predicate[0]
+        if kind == "eq":
+            return self.equality(collection, predicate[1], predicate[2] if len(predicate) > 2 else None)
+        if kind == "in":
+            return self.in_list(collection, predicate[1], predicate[2])
+        if kind == "range":
+            return self.range(collection, predicate[1], *predicate[2:4])
+        if kind == "and":
+            hint = predicate[2] if len(predicate) > 2 else None
+            parts = [(self._field(p), self.estimate(collection, p)) for p in predicate[1]]
+            return self.conjunction(collection, parts, hint)
+        raise ValueError(f"Unknown predicate {kind!r}")
+
+    def _field(self, predicate: tuple) -> Optional[str]:
+        return predicate[1] if predicate[0] != "and" else None
+
+    def output_docs(self, collection: str, predicate: Optional[tuple], rows: Optional[int] = None) -> int:
+        """Documents matching a predicate among `rows` (default: the whole collection)"""
+        if rows is None:
+            rows = self.sim.stats.get("cardinality", {}).get(collection, 0)
+        sel = self.estimate(collection, predicate) if predicate else 1.0
+        return math.ceil(round(rows * sel, 6))
+
+    @traced
+    def join_output(self, coll1: str, coll2: str, key: Optional[str],
+                    rows1: Optional[int] = None, rows2: Optional[int] = None) -> int:
+        """Equi-join output: |L| x |R| / max(NDV of the key on either side), rows default to the cardinalities"""
+        card = self.sim.stats.get("cardinality", {})
+        rows1 = card.get(coll1, 0) if rows1 is None else rows1
+        rows2 = card.get(coll2, 0) if rows2 is None else rows2
+        if not key:
+            return rows1 * rows2
+        ndv = max(self.ndv(coll1, key) or rows1, self.ndv(coll2, key) or rows2, 1)
+        return math.ceil(round(rows1 * rows2 / ndv, 6))
+
+    def group_count(self, collection: str, keys: Sequence[str], rows: int) -> int:
+        """Groups produced by GROUP BY keys over `rows` documents of the collection"""
+        return self.group_count_of([(collection, key) for key in keys], rows)
+
+    @traced
+    def group_count_of(self, keys: Sequence[tuple], rows: int) -> int:
+        """
+        Groups of (collection, field) keys over `rows` documents: NDVs multiply, the
+        groups actually present follow Cardenas; a unique key gives one group per row
+        """
+        card = self.sim.stats.get("cardinality", {})
+        ndv = 1
+        for collection, key in keys:
+            known = self.ndv(collection, key) if collection else None
+            if known and known >= card.get(collection, math.inf):
+                return max(1, rows)
+            ndv *= known or max(1, rows // 100)     # unknown key: 1% of the rows
+        return max(1, min(rows, round(distinct_values(ndv, rows))))
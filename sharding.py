@@ -0,0 +1,286 @@
+# sharding.py
+# Skew-aware sharding: hash / range partitioning with key frequency distributions
+#
+# A shard key's documents are described as "key groups": (number of keys, docs per key).
+# Uniform keys are one group; Zipf and histogram distributions are a handful of groups
+# (hot keys one by one, the long tail bucketed). Under hash partitioning the hottest
+# keys left over after the even split are hashed one by one and the others are
+# counted as balls in bins (Poisson keys per server), so a layout costs about a
+# millisecond whatever the key and server counts: 10M keys over 100k servers too.
+#
+# Distributions come from the optional "distribution" section of stats.json:
+#   "distribution": {
+#     "OrderLine": { "IDC": { "type": "zipf", "s": 1.1 } },
+#     "Product":   { "brand": { "type": "histogram", "buckets": [[1, 0.2], [99, 0.3], [4900, 0.5]] } }
+#   }
+# Histogram buckets are [number of keys, share of the documents]. Default: uniform.
+
+import json
+import math
+import random
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from tracing import traced
+
+HASH = "hash"
+RANGE = "range"
+EXPLICIT_HOT_KEYS = 1000   # Zipf ranks / leftover hash keys placed one by one, the tail is bucketed
+
+
+def _zipf_groups(n_docs: int, n_keys: int, s: float) -> List[Tuple[int, float]]:
+    """Zipf(s) over n_keys ranks as (keys, docs per key) groups"""
+    def bucket_weight(a: int, b: int) -> float:
+        # sum of r^-s for r in [a, b) ≈ integral of x^-s over [a - 0.5, b - 0.5]
+        lo, hi = a - 0.5, b - 0.5
+        if abs(s - 1.0) < 1e-9:
+            return math.log(hi / lo)
+        return (hi ** (1 - s) - lo ** (1 - s)) / (1 - s)
+
+    explicit = min(n_keys, EXPLICIT_HOT_KEYS)
+    weights = [(1, r ** -s) for r in range(1, explicit + 1)]
+    start = explicit + 1
+    while start <= n_keys:
+        end = min(n_keys + 1, start * 2)
+        weights.append((end - start, bucket_weight(start, end)))
+        start = end
+    total = sum(w for _, w in weights)
+    return [(count, n_docs * w / total / count) for count, w in weights]
+
+
+def key_groups(n_docs: int, n_keys: int, distribution: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+    """(keys, docs per key) groups for a shard key, hottest keys first"""
+    n_keys = max(1, n_keys)
+    kind = (distribution or {}).get("type", "uniform")
+    if kind == "zipf":
+        return _zipf_groups(n_docs, n_keys, float(distribution.get("s", 1.0)))
+    if kind == "histogram":
+        buckets = [(int(k), float(share)) for k, share in distribution.get("buckets", []) if k > 0]
+        total = sum(share for _, share in buckets) or 1.0
+        groups = [(k, n_docs * share / total / k) for k, share in buckets]
+        return sorted(groups, key=lambda g: -g[1])
+    return [(n_keys, n_docs / n_keys)]
+
+
+def _balls_in_bins(layers: List[Tuple[float, float]], servers: int) -> Dict[float, int]:
+    """
+    {extra load: number of servers} when every server gets Poisson(keys) keys of
+    each (keys per server, docs per key) layer, hottest layer first. A server is
+    described by its hottest layer: k keys of it (with the probability that no
+    hotter key landed there) plus the mean of the lighter layers. Expected server
+    counts are rounded on the tail, so they add up to `servers`.
+    """
+    probability: Dict[float, float] = {}
+    hotter, lighter = 0.0, sum(keys * per_key for keys, per_key in layers)
+    for keys, per_key in layers:
+        lighter -= keys * per_key
+        none_hotter = math.exp(-hotter)
+        k, pmf, tail = 0, math.exp(-keys), 1.0 - math.exp(-keys)
+        while servers * none_hotter * tail >= 0.01:
+            k += 1
+            pmf *= keys / k
+            tail -= pmf
+            load = per_key * k + lighter
+            probability[load] = probability.get(load, 0.0) + none_hotter * pmf
+        hotter += keys
+    histogram: Dict[float, int] = {}
+    seen, above = 0.0, 0
+    for load in sorted(probability, reverse=True):
+        seen += probability[load]
+        count = min(servers, int(round(servers * seen))) - above
+        if count > 0:
+            histogram[load] = count
+            above += count
+    if servers > above:
+        histogram[0.0] = servers - above
+    return histogram
+
+
+def _hash_extras(groups: List[Tuple[int, float]],
+                 servers: int, seed: str) -> Tuple[float, Dict[int, float], Dict[float, int]]:
+    """
+    Hash partitioning: every key lands on one server. A group of c keys gives
+    c // servers keys to every server and the remaining keys to hashed servers,
+    so hot keys (and too few keys) create hot and empty shards.
+    The hottest remaining keys (up to EXPLICIT_HOT_KEYS) are hashed one by one;
+    the rest are balls in bins, a Poisson(keys / servers) share of every group
+    per server (see _balls_in_bins), so the cost does not grow with the keys.
+    Returns (load of every server, {server: extra load} of the hashed keys,
+    {extra load: servers} of the balls in bins over all the servers).
+    """
+    rng = random.Random(seed)
+    base = 0.0
+    extras: Dict[int, float] = {}
+    placed, layers = 0, []
+    for count, per_key in groups:
+        full, rest = divmod(count, servers)
+        base += full * per_key
+        if layers or placed + rest > EXPLICIT_HOT_KEYS:
+            if rest:
+                layers.append((rest / servers, per_key))
+            continue
+        placed += rest
+        for _ in range(rest):
+            server = rng.randrange(servers)
+            extras[server] = extras.get(server, 0.0) + per_key
+    bulk = _balls_in_bins(layers, servers)
+    return base, extras, bulk
+
+
+def _hash_servers(groups: List[Tuple[int, float]], servers: int, seed: str) -> Tuple[Dict[int, float], Dict[float, int]]:
+    """
+    ({server: load} of the servers holding hashed hot keys, {load: servers} of the
+    others). A server with hot keys carries the balls-in-bins mean besides them;
+    it is taken from the most common balls-in-bins loads.
+    """
+    base, extras, bulk = _hash_extras(groups, servers, seed)
+    mean = sum(load * n for load, n in bulk.items()) / servers
+    taken = len(extras)
+    for load in sorted(bulk, key=lambda l: -bulk[l]):
+        if not taken:
+            break
+        removed = min(taken, bulk[load])
+        bulk[load] -= removed
+        taken -= removed
+    hot = {server: base + mean + extra for server, extra in extras.items()}
+    return hot, {base + load: n for load, n in bulk.items() if n > 0}
+
+
+def hash_layout(groups: List[Tuple[int, float]], servers: int, seed: str) -> List[float]:
+    """Documents held by every server under hash partitioning"""
+    hot, others = _hash_servers(groups, servers, seed)
+    levels = iter(load for load, n in sorted(others.items(), reverse=True) for _ in range(n))
+    return [hot[server] if server in hot else next(levels) for server in range(servers)]
+
+
+def _range_histogram(groups: List[Tuple[int, float]], servers: int) -> Dict[float, int]:
+    """
+    Range partitioning with a balancer: chunks are split until servers hold
+    ~n_docs / servers, but one key can never be split (jumbo chunk) and there
+    can be no more non-empty servers than distinct keys.
+    Returns {docs on a server: number of such servers}, hottest servers first.
+    """
+    n_docs = sum(count * per_key for count, per_key in groups)
+    target = n_docs / servers
+    histogram: Dict[float, int] = {}
+    placed = 0
+    rest_docs, rest_keys = 0.0, 0
+    for count, per_key in groups:
+        if per_key > target and placed + count <= servers:
+            histogram[per_key] = histogram.get(per_key, 0) + count   # jumbo keys, one per server
+            placed += count
+        else:
+            rest_docs += count * per_key
+            rest_keys += count
+    free = servers - placed
+    if rest_keys and free > 0:
+        used = min(free, rest_keys)
+        histogram[rest_docs / used] = histogram.get(rest_docs / used, 0) + used
+        placed += used
+    elif rest_keys and histogram:
+        # Every server already holds a jumbo key: the rest piles onto the last one
+        smallest = min(histogram)
+        histogram[smallest] -= 1
+        histogram[smallest + rest_docs] = histogram.get(smallest + rest_docs, 0) + 1
+    if servers > placed:
+        histogram[0.0] = histogram.get(0.0, 0) + servers - placed
+    return {load: n for load, n in histogram.items() if n > 0}
+
+
+def range_layout(groups: List[Tuple[int, float]], servers: int) -> List[float]:
+    """Documents held by every server under range partitioning"""
+    loads: List[float] = []
+    for load, n in sorted(_range_histogram(groups, servers).items(), reverse=True):
+        loads.extend([load] * n)
+    return loads
+
+
+def load_histogram(groups: List[Tuple[int, float]], servers: int, scheme: str, seed: str) -> Dict[float, int]:
+    """{docs on a server: number of such servers} without materialising one entry per server"""
+    if scheme == RANGE:
+        return _range_histogram(groups, servers)
+    hot, histogram = _hash_servers(groups, servers, seed)
+    for load in hot.values():
+        histogram[load] = histogram.get(load, 0) + 1
+    return histogram
+
+
+def summarize(histogram: Dict[float, int], doc_size: int) -> Dict[str, Any]:
+    """Per-server load statistics of one layout"""
+    ordered = sorted(histogram.items())
+    n = sum(count for _, count in ordered)
+    total = sum(load * count for load, count in ordered)
+    mean = total / n if n else 0.0
+    max_docs = ordered[-1][0] if n else 0.0
+    # p99: smallest load with at least 99% of the servers at or below it
+    rank, seen, p99 = max(1, math.ceil(0.99 * n)), 0, 0.0
+    for load, count in ordered:
+        seen += count
+        if seen >= rank:
+            p99 = load
+            break
+    return {
+        "max_docs_per_server": int(round(max_docs)),
+        "p99_docs_per_server": int(round(p99)),
+        "min_docs_per_server": int(round(ordered[0][0])) if n else 0,
+        "empty_servers": sum(count for load, count in ordered if load < 0.5),
+        "hot_shard_factor": round(max_docs / mean, 3) if mean else 0.0,
+        "max_bytes_per_server": int(round(max_docs * doc_size)),
+    }
+
+
+def server_loads(groups: List[Tuple[int, float]], servers: int, scheme: str, seed: str) -> List[float]:
+    if scheme == RANGE:
+        return range_layout(groups, servers)
+    return hash_layout(groups, servers, seed)
+
+
+class ShardingModel:
+    def __init__(self, nosql_simulator):
+        """Connects to the main NoSQLSimulator (stats, servers, document sizes)"""
+        self.sim = nosql_simulator
+
+    def distribution(self, collection: str, shard_key: str) -> Optional[Dict[str, Any]]:
+        return self.sim.stats.get("distribution", {}).get(collection, {}).get(shard_key)
+
+    def _inputs(self, collection: str, shard_key: str, distribution):
+        n_docs = self.sim.stats.get("cardinality", {}).get(collection, 0)
+        n_keys = self.sim.stats.get("distinct", {}).get(collection, {}).get(shard_key, n_docs)
+        return n_docs, n_keys, distribution or self.distribution(collection, shard_key)
+
+    def layout(self, collection: str, shard_key: str, servers: Optional[int] = None,
+               scheme: str = HASH, distribution: Optional[Dict[str, Any]] = None) -> List[float]:
+        """Documents held by every server"""
+        n_docs, n_keys, distribution = self._inputs(collection, shard_key, distribution)
+        groups = key_groups(n_docs, n_keys, distribution)
+        return server_loads(groups, servers or self.sim.servers, scheme, f"{collection}.{shard_key}")
+
+    @traced
+    def stats(self, collection: str, shard_key: str, servers: Optional[int] = None,
+              scheme: str = HASH, distribution: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Load report of one (collection, shard key, servers, scheme) layout"""
+        n_docs, n_keys, distribution = self._inputs(collection, shard_key, distribution)
+        return dict(_cached_report(n_docs, n_keys, servers or self.sim.servers, scheme,
+                                   json.dumps(distribution, sort_keys=True),
+                                   f"{collection}.{shard_key}", self.sim.compute_doc_size(collection)))
+
+    @traced
+    def hot_docs(self, collection: str, shard_key: str, servers: Optional[int] = None,
+                 scheme: str = HASH) -> int:
+        """Documents on the hottest shard (what a sharded query has to scan)"""
+        if not shard_key:
+            return 0
+        return self.stats(collection, shard_key, servers, scheme)["max_docs_per_server"]
+
+
+@lru_cache(maxsize=4096)
+def _cached_report(n_docs, n_keys, servers, scheme, distribution_json, seed, doc_size):
+    """Layouts are deterministic, so reports are cached on their inputs"""
+    groups = key_groups(n_docs, n_keys, json.loads(distribution_json))
+    report = {
+        "docs_per_server": n_docs // servers,
+        "distinct_keys_per_server": n_keys // servers,
+        "scheme": scheme,
+    }
+    report.update(summarize(load_histogram(groups, servers, scheme, seed), doc_size))
+    return tuple(report.items())
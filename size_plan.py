@@ -0,0 +1,147 @@
+# size_plan.py
+# Schema compiler: turns a db*.json schema into a reusable document-size plan
+#
+# A plan is a small fixed tree built once per schema file. Evaluating it only
+# needs the field sizes and the "avg" section of stats.json, so a model can be
+# re-sized after a stats change without walking the raw JSON again.
+
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+KEY_OVERHEAD = 12          # every field / array element carries 12B of key overhead
+ARRAY_OVERHEAD = 12        # arrays pay an extra 12B header on top of their key
+DEFAULT_FIELD_SIZE = 80    # same fallback as NoSQLSimulator.compute_field_size
+
+
+class SizePlan:
+    """
+    Compiled size of one document (or one embedded object / array item).
+
+    fixed   -> bytes that never depend on stats (key overheads)
+    types   -> ((field_type, count), ...) of the primitive values
+    arrays  -> ((avg_keys, item_plan), ...) for every nested array;
+               avg_keys are looked up in stats["avg"][collection]
+    """
+
+    __slots__ = ("fixed", "types", "arrays")
+
+    def __init__(self, fixed: int, types: Tuple, arrays: Tuple):
+        self.fixed = fixed
+        self.types = types
+        self.arrays = arrays
+
+    def evaluate(self, field_sizes: Dict[str, int], coll_avg: Dict[str, Any]) -> float:
+        """Size in bytes of one document for the given field sizes and averages"""
+        size = self.fixed
+        for ftype, count in self.types:
+            size += count * field_sizes.get(ftype, DEFAULT_FIELD_SIZE)
+        for avg_keys, item_plan in self.arrays:
+            size += array_length(coll_avg, avg_keys) * item_plan.evaluate(field_sizes, coll_avg)
+        return size
+
+    def depth(self) -> int:
+        """Number of nested array levels below this plan"""
+        return max((1 + p.depth() for _, p in self.arrays), default=0)
+
+
+def array_length(coll_avg: Dict[str, Any], avg_keys: Tuple[str, ...]):
+    """Average number of items of an array: first matching key wins, default 1"""
+    for key in avg_keys:
+        if key in coll_avg:
+            return coll_avg[key]
+    return 1
+
+
+def item_properties(items: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalise the two `items` shapes found in the schemas:
+      db1 style  -> {"properties": {"title": {...}}}
+      db5 style  -> {"title": {...}}   (bare mapping of fields)
+    """
+    if "properties" in items:
+        return items.get("properties") or {}
+    return {name: spec for name, spec in items.items() if isinstance(spec, dict)}
+
+
+class _Builder:
+    """Accumulates the parts of one SizePlan while walking a properties dict"""
+
+    def __init__(self):
+        self.fixed = 0
+        self.types: Dict[str, int] = {}
+        self.arrays: List[Tuple[Tuple[str, ...], SizePlan]] = []
+
+    def add_value(self, ftype: str):
+        self.types[ftype] = self.types.get(ftype, 0) + 1
+
+    def build(self) -> SizePlan:
+        return SizePlan(self.fixed, tuple(sorted(self.types.items())), tuple(self.arrays))
+
+
+def _compile_properties(props: Dict[str, Any], builder: _Builder, path: str):
+    for field, spec in props.items():
+        ftype = spec.get("type")
+        if not ftype:
+            continue
+        builder.fixed += KEY_OVERHEAD
+        field_path = f"{path}.{field}" if path else field
+
+        if ftype == "object":
+            # Embedded object: its fields are stored inline, at any depth
+            _compile_properties(spec.get("properties", {}), builder, field_path)
+
+        elif ftype == "array":
+            builder.fixed += ARRAY_OVERHEAD
+            builder.arrays.append(((field_path, field), _compile_items(spec.get("items", {}), field_path)))
+
+        else:
+            builder.add_value(ftype)
+
+
+def _compile_items(items: Dict[str, Any], path: str) -> SizePlan:
+    """Plan of one array item (a primitive, an object or another array)"""
+    item = _Builder()
+    itype = items.get("type")
+    if itype and itype not in ("object", "array"):
+        item.fixed += KEY_OVERHEAD
+        item.add_value(itype)
+    elif itype == "array":
+        item.fixed += KEY_OVERHEAD + ARRAY_OVERHEAD
+        item.arrays.append(((path + "[]",), _compile_items(items.get("items", {}), path + "[]")))
+    else:
+        _compile_properties(item_properties(items), item, path)
+    return item.build()
+
+
+def compile_collection(properties: Dict[str, Any]) -> SizePlan:
+    """Compile the properties of one collection into a SizePlan"""
+    builder = _Builder()
+    _compile_properties(properties, builder, "")
+    return builder.build()
+
+
+def compile_schema(schemas: List[Dict[str, Any]]) -> Dict[str, SizePlan]:
+    """Compile every collection of a db*.json schema list"""
+    return {
+        coll["collection"]: compile_collection(coll.get("properties", {}))
+        for coll in schemas
+        if coll.get("collection")
+    }
+
+
+# Cache keyed on (path, mtime) so every simulator built on the same file shares one plan
+_SCHEMA_CACHE: Dict[Tuple[str, int], Tuple[List[Dict[str, Any]], Dict[str, SizePlan]]] = {}
+
+
+def load_compiled_schema(schema_file: str):
+    """Return (schemas, plans) for a schema file, parsing and compiling it only once"""
+    path = os.path.realpath(schema_file)
+    key = (path, os.stat(path).st_mtime_ns)
+    cached = _SCHEMA_CACHE.get(key)
+    if cached is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            schemas = json.load(f)
+        cached = (schemas, compile_schema(schemas))
+        _SCHEMA_CACHE[key] = cached
+    return cached
@@ -0,0 +1,418 @@
+# storage.py
+# Storage formats and block compression: on-disk document sizes per encoding
+#
+# The size plans (size_plan.py) give the project's logical size: 12 bytes of key
+# overhead per field and field_sizes per value. Real engines store more or less:
+#   logical   - the size plan, as used by every query cost
+#   bson      - BSON: type byte + key name + NUL per element, int64 / double / date
+#               in 8 bytes, strings with a 4-byte length and a NUL, arrays keyed
+#               "0", "1", ... and 5 bytes of header per (sub)document
+#   compact   - BSON with a key dictionary: 2-byte key ids, arrays without index keys
+#   columnar  - one column per field path, each value dictionary-, run-length- or
+#               plain-encoded, whichever is smallest for its distinct count, plus a
+#               4-byte offset per array
+# Value sizes come from the profiled "avg_bytes" of a field (profiler.py) when
+# stats.json has them, otherwise from field_sizes.
+#
+# Blocks are then compressed. Ratios are calibrated, not assumed: synthetic
+# documents (values drawn from the stats' distinct counts, text from a word list)
+# are encoded in the format, cut into BLOCK_BYTES blocks and compressed locally.
+# snappy and zstd use python-snappy / zstandard when installed; otherwise zlib
+# level 1 and level 6 stand in (same speed / ratio classes).
+#
+# Query CPU costs stay on logical sizes; storage and disk I/O (memory.py,
+# write_path.py, workload.py, cluster_sim.py) use the stored bytes of the
+# simulator's default format, BSON + snappy like MongoDB's WiredTiger.
+
+import itertools
+import json
+import math
+import random
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from size_plan import array_length, item_properties
+from tracing import traced
+
+try:
+    import snappy
+except ImportError:  # optional: zlib level 1 stands in
+    snappy = None
+try:
+    import zstandard
+except ImportError:  # optional: zlib level 6 stands in
+    zstandard = None
+
+FORMATS = ("logical", "bson", "compact", "columnar")
+CODECS = ("none", "snappy", "zstd")
+DEFAULT_FORMAT = "bson"
+DEFAULT_CODEC = "snappy"
+
+KEY_ID_BYTES = 2             # compact format: key dictionary id
+OFFSET_BYTES = 4             # columnar format: array offset per document
+RUN_BYTES = 4                # columnar format: run length of an RLE run
+BLOCK_BYTES = 32 * 1024      # compression block (WiredTiger's default leaf page)
+SAMPLE_BYTES = 256 * 1024    # synthetic data compressed per calibration
+SAMPLE_ITEMS = 50            # array items generated per synthetic array
+NUMERIC = ("integer", "number", "date")
+
+# Node of a compiled field tree: (name, path, kind, payload)
+#   kind "value"  -> payload = field type
+#   kind "object" -> payload = [child nodes]
+#   kind "array"  -> payload = (average length, item node)
+
+
+def field_tree(properties: Dict[str, Any], coll_avg: Dict[str, Any], path: str = "") -> List[Tuple]:
+    """Field tree of a collection's properties, with the stats' average array lengths"""
+    nodes = []
+    for field, spec in properties.items():
+        ftype = spec.get("type")
+        if not ftype:
+            continue
+        field_path = f"{path}.{field}" if path else field
+        if ftype == "object":
+            nodes.append((field, field_path, "object", field_tree(spec.get("properties", {}), coll_avg, field_path)))
+        elif ftype == "array":
+            nodes.append((field, field_path, "array",
+                          (array_length(coll_avg, (field_path, field)), _item(spec.get("items", {}), coll_avg,
+                                                                             field_path))))
+        else:
+            nodes.append((field, field_path, "value", ftype))
+    return nodes
+
+
+def _item(items: Dict[str, Any], coll_avg: Dict[str, Any], path: str) -> Tuple:
+    itype = items.get("type")
+    if itype == "array":
+        return ("", path, "array", (array_length(coll_avg, (path + "[]",)), _item(items.get("items", {}), coll_avg,
+                                                                                  path)))
+    if itype and itype != "object":
+        return ("", path, "value", itype)
+    return ("", path, "object", field_tree(item_properties(items), coll_avg, path))
+
+
+def _index_digits(n: float) -> float:
+    """Bytes of the BSON array keys "0" .. str(n - 1) (fractional n: the partial item at its width)"""
+    whole = int(n)
+    digits, width, start = 0, 1, 0
+    while start < whole:
+        end = min(whole, start * 10 or 10)
+        digits += (end - start) * width
+        start, width = end, width + 1
+    return digits + (n - whole) * len(str(whole))
+
+
+def _compress(codec: str, data: bytes) -> int:
+    """Compressed size of one block"""
+    if codec == "none":
+        return len(data)
+    if codec == "snappy":
+        return len(snappy.compress(data)) if snappy is not None else len(zlib.compress(data, 1))
+    if zstandard is not None:
+        return len(zstandard.ZstdCompressor(level=3).compress(data))
+    return len(zlib.compress(data, 6))
+
+
+class _Synthetic:
+    """Deterministic synthetic values for one collection, from its distinct counts and value sizes"""
+
+    WORDS = 5000
+
+    def __init__(self, storage: "StorageModel", collection: str, seed: int = 7):
+        self.storage = storage
+        self.collection = collection
+        self.rng = random.Random(seed)
+        letters = "etaoinshrdlucmfwypvbgkjqxz"
+        weights = [26 - i for i in range(len(letters))]
+        self.words = ["".join(self.rng.choices(letters, weights, k=self.rng.randint(2, 9)))
+                      for _ in range(self.WORDS)]
+        # Zipf word frequencies, like natural text
+        self.cumulative = list(itertools.accumulate(1 / rank for rank in range(1, self.WORDS + 1)))
+        self.texts: Dict[str, List[str]] = {}
+
+    def _text(self, size: int) -> str:
+        words, length = [], 0
+        while length < size:
+            word = self.rng.choices(self.words, cum_weights=self.cumulative)[0]
+            words.append(word)
+            length += len(word) + 1
+        return " ".join(words)[:max(1, size)]
+
+    def value(self, path: str, ftype: str) -> Any:
+        ndv = self.storage.ndv(self.collection, path)
+        if ftype == "integer":
+            return self.rng.randrange(ndv or 1_000_000)
+        if ftype == "number":
+            return round(self.rng.randrange(ndv or 100_000) / 100, 2)
+        if ftype == "date":
+            return 1_546_300_800_000 + self.rng.randrange(ndv or 2000) * 86_400_000
+        size = round(self.storage.value_bytes(self.collection, path, ftype))
+        if not ndv:
+            return self._text(size)          # free text: every value is new
+        pool = self.texts.setdefault(path, [])
+        k = self.rng.randrange(min(ndv, 1000))
+        while len(pool) <= k:
+            pool.append(self._text(size))
+        return pool[k]
+
+    def document(self, nodes: List[Tuple]) -> Dict[str, Any]:
+        return {node[0]: self.node(node) for node in nodes}
+
+    def node(self, node: Tuple) -> Any:
+        _, path, kind, payload = node
+        if kind == "value":
+            return self.value(path, payload)
+        if kind == "object":
+            return self.document(payload)
+        avg, item = payload
+        return [self.node(item) for _ in range(min(SAMPLE_ITEMS, max(1, round(avg))) if avg else 0)]
+
+
+def encode_bson(doc: Dict[str, Any], keys: Optional[Dict[str, int]] = None) -> bytes:
+    """BSON bytes of a document; with `keys`, the compact format (key ids, unkeyed arrays)"""
+    body = bytearray()
+    items = doc.items() if isinstance(doc, dict) else ((None, v) for v in doc)
+    for i, (name, value) in enumerate(items):
+        if isinstance(value, bool) or isinstance(value, int):
+            kind, data = 0x12, struct.pack("<q", value)
+        elif isinstance(value, float):
+            kind, data = 0x01, struct.pack("<d", value)
+        elif isinstance(value, str):
+            raw = value.encode()
+            kind, data = 0x02, struct.pack("<i", len(raw) + 1) + raw + b"\0"
+        elif isinstance(value, dict):
+            kind, data = 0x03, encode_bson(value, keys)
+        else:
+            kind, data = 0x04, encode_bson(value, keys)
+        if keys is None:
+            key = (name if name is not None else str(i)).encode() + b"\0"
+        elif name is None:
+            key = b""
+        else:
+            key = struct.pack("<H", keys.setdefault(name, len(keys)) & 0xFFFF)
+        body += bytes((kind,)) + key + data
+    return struct.pack("<i", len(body) + 5) + bytes(body) + b"\0"
+
+
+def _columns(doc: Any, path: str, out: Dict[str, List[Any]]):
+    """Flatten a document into {path: values}, array values under the array's path"""
+    if isinstance(doc, dict):
+        for name, value in doc.items():
+            _columns(value, f"{path}.{name}" if path else name, out)
+    elif isinstance(doc, list):
+        out.setdefault(path + "#offsets", []).append(len(doc))
+        for value in doc:
+            _columns(value, path, out)
+    else:
+        out.setdefault(path, []).append(doc)
+
+
+def encode_column(values: List[Any]) -> bytes:
+    """Dictionary-encoded column when it has repeats, plain otherwise"""
+    distinct = list(dict.fromkeys(values))
+    plain = b"".join(_plain(v) for v in values)
+    if len(distinct) == len(values):
+        return plain
+    width = max(1, math.ceil(math.log2(len(distinct)) / 8)) if len(distinct) > 1 else 1
+    ids = {v: i for i, v in enumerate(distinct)}
+    encoded = b"".join(_plain(v) for v in distinct) + b"".join(ids[v].to_bytes(width, "little") for v in values)
+    return min(plain, encoded, key=len)
+
+
+def _plain(value: Any) -> bytes:
+    if isinstance(value, float):
+        return struct.pack("<d", value)
+    if isinstance(value, int):
+        return struct.pack("<q", value)
+    raw = str(value).encode()
+    return struct.pack("<i", len(raw)) + raw
+
+
+class StorageModel:
+    def __init__(self, nosql_simulator, fmt: str = DEFAULT_FORMAT, codec: str = DEFAULT_CODEC):
+        """Connects to the main NoSQLSimulator (schemas, stats, field sizes); fmt / codec are the defaults"""
+        self.sim = nosql_simulator
+        self.fmt = fmt
+        self.codec = codec
+
+    def _check(self, fmt: Optional[str], codec: Optional[str]) -> Tuple[str, str]:
+        fmt, codec = fmt or self.fmt, codec or self.codec
+        if fmt not in FORMATS or codec not in CODECS:
+            raise ValueError(f"Unknown storage format {fmt!r} / codec {codec!r} "
+                             f"({', '.join(FORMATS)} / {', '.join(CODECS)})")
+        return fmt, codec
+
+    def _tree(self, collection: str) -> List[Tuple]:
+        return field_tree(self.sim.get_collection_schema(collection),
+                          self.sim.stats.get("avg", {}).get(collection, {}))
+
+    def value_bytes(self, collection: str, path: str, ftype: str) -> float:
+        """Measured average bytes of a field's values, or the type's field size"""
+        measured = self.sim.stats.get("fields", {}).get(collection, {}).get(path, {}).get("avg_bytes")
+        return measured if measured is not None else self.sim.compute_field_size(ftype, path)
+
+    def ndv(self, collection: str, path: str) -> Optional[int]:
+        """Distinct values of a field path, None when unknown"""
+        ndv = self.sim.stats.get("fields", {}).get(collection, {}).get(path, {}).get("ndv")
+        return ndv or self.sim.stats.get("distinct", {}).get(collection, {}).get(path)
+
+    # ---- uncompressed sizes ----
+
+    @traced
+    def doc_size(self, collection: str, fmt: Optional[str] = None) -> float:
+        """Bytes of one document in a format, before compression"""
+        fmt, _ = self._check(fmt, None)
+        if fmt == "logical":
+            return self.sim.compute_doc_size(collection)
+        tree = self._tree(collection)
+        if fmt == "columnar":
+            return self._columnar(collection, tree, 1.0)
+        return 5 + sum(self._element(collection, node, fmt) for node in tree)
+
+    def _element(self, collection: str, node: Tuple, fmt: str) -> float:
+        name = node[0]
+        header = 1 + (len(name.encode()) + 1 if fmt == "bson" else KEY_ID_BYTES)
+        return header + self._value(collection, node, fmt)
+
+    def _value(self, collection: str, node: Tuple, fmt: str) -> float:
+        _, path, kind, payload = node
+        if kind == "value":
+            if payload in NUMERIC:
+                return 8
+            return 4 + self.value_bytes(collection, path, payload) + 1
+        if kind == "object":
+            return 5 + sum(self._element(collection, child, fmt) for child in payload)
+        avg, item = payload
+        keys = 2 * avg + _index_digits(avg) if fmt == "bson" else avg      # type + "i" + NUL, or type only
+        return 5 + keys + avg * self._value(collection, item, fmt)
+
+    def _columnar(self, collection: str, nodes: List[Tuple], occurrences: float) -> float:
+        """Encoded bytes per document of every column under `nodes`, `occurrences` values a document"""
+        size = 0.0
+        for _, path, kind, payload in nodes:
+            if kind == "value":
+                size += occurrences * self._column_value(collection, path, payload, occurrences)
+            elif kind == "object":
+                size += self._columnar(collection, payload, occurrences)
+            else:
+                avg, item = payload
+                size += occurrences * OFFSET_BYTES + self._columnar(collection, [item], occurrences * avg)
+        return size
+
+    def _column_value(self, collection: str, path: str, ftype: str, occurrences: float) -> float:
+        """Bytes of one value: plain, dictionary or run-length encoded, whichever is smallest"""
+        plain = 8 if ftype in NUMERIC else 4 + self.value_bytes(collection, path, ftype)
+        ndv = self.ndv(collection, path)
+        total = self.sim.stats.get("cardinality", {}).get(collection, 0) * occurrences
+        if not ndv or not total or ndv >= total:
+            return plain
+        bits = max(1, math.ceil(math.log2(ndv))) if ndv > 1 else 1
+        dictionary = ndv * plain / total
+        run_length = ndv / (ndv - 1) if ndv > 1 else total     # runs of equal values in random order
+        return min(plain, bits / 8 + dictionary, (bits / 8 + RUN_BYTES) / run_length + dictionary)
+
+    # ---- compression ----
+
+    @traced
+    def compression_ratio(self, collection: str, fmt: Optional[str] = None, codec: Optional[str] = None) -> float:
+        """Uncompressed / compressed bytes, measured on synthetic documents of the collection"""
+        fmt, codec = self._check(fmt, codec)
+        if codec == "none" or not self.sim.get_collection_schema(collection):
+            return 1.0
+        tree = self._tree(collection)
+        signature = (fmt, codec, collection, json.dumps(tree), json.dumps(self._value_inputs(collection)))
+        if signature not in _RATIOS:
+            _RATIOS[signature] = self._calibrate(collection, tree, "bson" if fmt == "logical" else fmt, codec)
+        return _RATIOS[signature]
+
+    def _value_inputs(self, collection: str) -> Dict[str, Any]:
+        """Everything the synthetic values depend on: distinct counts and value sizes"""
+        return {"fields": self.sim.stats.get("fields", {}).get(collection, {}),
+                "distinct": self.sim.stats.get("distinct", {}).get(collection, {}),
+                "sizes": self.sim.field_sizes}
+
+    def _calibrate(self, collection: str, tree: List[Tuple], fmt: str, codec: str) -> float:
+        synthetic = _Synthetic(self, collection)
+        raw, compressed = 0, 0
+        if fmt == "columnar":
+            columns: Dict[str, List[Any]] = {}
+            size = 0
+            while size < SAMPLE_BYTES:
+                doc = synthetic.document(tree)
+                size += len(encode_bson(doc))
+                _columns(doc, "", columns)
+            blocks = [encode_column(values) for values in columns.values()]
+        else:
+            keys = {} if fmt == "compact" else None
+            blocks, block = [], bytearray()
+            while sum(map(len, blocks)) + len(block) < SAMPLE_BYTES:
+                block += encode_bson(synthetic.document(tree), keys)
+                if len(block) >= BLOCK_BYTES:
+                    blocks.append(bytes(block))
+                    block = bytearray()
+            blocks.append(bytes(block))
+        for data in blocks:
+            for start in range(0, len(data), BLOCK_BYTES):
+                chunk = data[start:start + BLOCK_BYTES]
+                raw += len(chunk)
+                compressed += _compress(codec, chunk)
+        return raw / compressed if compressed else 1.0
+
+    # ---- stored sizes ----
+
+    def stored_doc_size(self, collection: str, fmt: Optional[str] = None, codec: Optional[str] = None) -> float:
+        """Bytes one document takes on disk: format size / compression ratio"""
+        fmt, codec = self._check(fmt, codec)
+        return self.doc_size(collection, fmt) / self.compression_ratio(collection, fmt, codec)
+
+    def collection_size_gb(self, collection: str, fmt: Optional[str] = None, codec: Optional[str] = None) -> float:
+        n_docs = self.sim.stats.get("cardinality", {}).get(collection, 0)
+        return round(n_docs * self.stored_doc_size(collection, fmt, codec) / 1024 ** 3, 3)
+
+    def database_size_gb(self, fmt: Optional[str] = None, codec: Optional[str] = None) -> float:
+        return round(sum(self.collection_size_gb(c, fmt, codec) for c in self.sim.collections), 2)
+
+    def report(self, codec: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """{collection: {format: {doc_bytes, ratio, stored_bytes, size_gb}}} for every format"""
+        return {
+            collection: {
+                fmt: {
+                    "doc_bytes": round(self.doc_size(collection, fmt), 1),
+                    "ratio": round(self.compression_ratio(collection, fmt, codec), 2),
+                    "stored_bytes": round(self.stored_doc_size(collection, fmt, codec), 1),
+                    "size_gb": self.collection_size_gb(collection, fmt, codec),
+                }
+                for fmt in FORMATS
+            }
+            for collection in self.sim.collections
+        }
+
+
+# Calibrated ratios, shared by every simulator (models repeat the same collections)
+_RATIOS: Dict[Tuple, float] = {}
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+
+    from main import NoSQLSimulator
+
+    parser = argparse.ArgumentParser(description="Document and database sizes per storage format")
+    parser.add_argument("--codec", default=DEFAULT_CODEC, choices=CODECS)
+    args = parser.parse_args()
+
+    schemas_folder = "schemas"
+    db_files = sorted(f for f in os.listdir(schemas_folder) if f.startswith("db") and f.endswith(".json"))
+    print(f"STORAGE FORMATS ({args.codec}; snappy: {'python-snappy' if snappy else 'zlib-1 stand-in'}, "
+          f"zstd: {'zstandard' if zstandard else 'zlib-6 stand-in'})")
+    print(f"{'Model':<6}{'Collection':<12}" + "".join(f"{fmt + ' B / ratio':>26}" for fmt in FORMATS))
+    for db_file in db_files:
+        sim = NoSQLSimulator(os.path.join(schemas_folder, db_file), "stats.json", "indexes.json")
+        name = db_file[:-5].upper()
+        for collection, formats in sim.storage.report(args.codec).items():
+            print(f"{name:<6}{collection:<12}" + "".join(
+                f"{f['doc_bytes']:>16,.0f} / {f['ratio']:>5.2f}x" for f in formats.values()))
+        print(f"{name:<6}{'TOTAL GB':<12}" + "".join(
+            f"{sim.database_size_gb(fmt, args.codec):>26,.2f}" for fmt in FORMATS))
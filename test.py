@@ -33,7 +33,7 @@ for db_file in sorted(db_files):
     
     try:
         # Create simulator for this schema + shared stats
-        sim = NoSQLSimulator(full_path, "stats.json")
+        sim = NoSQLSimulator(full_path, "stats.json", "indexes.json")
         
         # Run full Chapter 2 analysis
         total_gb = sim.analyze_db(full_path)
@@ -63,7 +63,7 @@ for db, size in sorted(results.items()):
     elif db == "DB3":
         notes = "Stock nests Product (duplication, moderate increase)"
     elif db == "DB4":
-        notes = "OrderLine nests Product (HUGE - 4.4 TB, dangerous)"
+        notes = "OrderLine nests Product (HUGE - 5.9 TB, dangerous)"
     elif db == "DB5":
         notes = "Product nests OrderLines (insane - 167 PB, impossible)"
     
@@ -80,6 +80,8 @@ print("\n" + "="*80)
 print("FILTER & JOIN QUERIES + COSTS (using DB1)")
 print("="*80)
 
+# The loop above leaves `sim` on the last model, so load DB1 explicitly
+sim = NoSQLSimulator(os.path.join(schemas_folder, "db1.json"), "stats.json", "indexes.json")
 qs = QuerySimulator(sim)
 
 print("1. Filter Stock (with sharding on IDP):")
@@ -101,11 +103,11 @@ print("="*80)
 
 aggs = AggregateSimulator(sim)
 
-print("Aggregate on OrderLine (with sharding on IDP):")
-print(aggs.simulate_aggregate("OrderLine", "IDP"))
+print("Aggregate on OrderLine, group by IDP (with sharding on IDP):")
+print(aggs.simulate_aggregate("OrderLine", "IDP", group_by="IDP"))
 
-print("\nAggregate on OrderLine (without sharding - full scan):")
-print(aggs.simulate_aggregate("OrderLine"))
+print("\nAggregate on OrderLine, group by IDP (without sharding - full scan):")
+print(aggs.simulate_aggregate("OrderLine", group_by="IDP"))
 
 print("\n" + "="*80)
 print("="*80)
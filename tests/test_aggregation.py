@@ -0,0 +1,35 @@
+# tests/test_aggregation.py
+# Aggregate specs are checked against the collection: unknown function fields are rejected
+#
+# Usage: python -m pytest tests   or   python -m unittest discover -s tests
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from aggregation import AggregateSpec  # noqa: E402
+from main import NoSQLSimulator  # noqa: E402
+
+
+class FunctionFieldTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.sim = NoSQLSimulator(os.path.join(ROOT, "schemas", "db5.json"), os.path.join(ROOT, "stats.json"),
+                                 os.path.join(ROOT, "indexes.json"))
+
+    def test_unknown_field_is_rejected(self):
+        spec = AggregateSpec(["IDP"], [("sum", "quantity")])
+        with self.assertRaises(ValueError):
+            self.sim.aggregation.cost("Product", shard_key="IDP", spec=spec)
+
+    def test_fields_inside_objects_and_arrays(self):
+        spec = AggregateSpec(["IDP"], [("sum", "orderlines.quantity"), ("count", None)])
+        cost = self.sim.aggregation.cost("Product", shard_key="IDP", spec=spec)
+        self.assertEqual(cost["strategy"], "co-located")
+
+
+if __name__ == "__main__":
+    unittest.main()
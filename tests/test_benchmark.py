@@ -0,0 +1,66 @@
+# tests/test_benchmark.py
+# The benchmark harness itself: generated models, stable checksums, comparison of two runs
+#
+# Usage: python -m pytest tests   or   python -m unittest discover -s tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark  # noqa: E402
+from main import NoSQLSimulator  # noqa: E402
+
+
+class BenchmarkTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = NoSQLSimulator.from_data(*benchmark.generate_model(collections=12, depth=2))
+
+    def test_generated_model(self):
+        schemas, stats = benchmark.generate_model(collections=12, depth=3)
+        self.assertEqual(len(schemas), 12)
+        self.assertEqual(set(stats["cardinality"]), {s["collection"] for s in schemas})
+        # Arrays nest down to the requested depth, each with its average length
+        self.assertIn("lines.lines", stats["avg"]["C0"])
+        self.assertIn("detail.lines", stats["avg"]["C0"])
+        self.assertNotIn("lines.lines.lines", stats["avg"]["C0"])
+        self.assertEqual(schemas, benchmark.generate_model(collections=12, depth=3)[0])
+
+    def test_every_operator_has_scenarios(self):
+        for operator in benchmark.OPERATORS:
+            with self.subTest(operator=operator):
+                self.assertTrue(benchmark.scenarios([self.sim], operator)["collections"])
+
+    def test_runs_are_comparable(self):
+        first = {"results": benchmark.run([self.sim], "small", repeat=1)}
+        second = {"results": benchmark.run([self.sim], "small", repeat=1)}
+        self.assertEqual(len(first["results"]), len(benchmark.BENCHMARKS))
+        for row in benchmark.compare(first, second, tolerance=1.0):
+            with self.subTest(benchmark=row["benchmark"]):
+                self.assertTrue(row["same_results"])
+                self.assertFalse(row["slower"])
+
+    def test_changed_results_are_flagged(self):
+        base = {"results": benchmark.run([self.sim], "small", repeat=1, only=["doc_size"])}
+        sums = base["results"][0]["checksum"]
+        changed = {"results": [dict(base["results"][0], checksum={k: v + 1 for k, v in sums.items()})]}
+        self.assertFalse(benchmark.compare(base, changed, tolerance=1.0)[0]["same_results"])
+
+    def test_every_column_is_checked(self):
+        base = {"results": benchmark.run([self.sim], "small", repeat=1, only=["join"])}
+        sums = base["results"][0]["checksum"]
+        self.assertIn("network_bytes", sums)
+        self.assertIn("join_algorithm", sums)
+        # A change in a column other than the price is flagged too
+        changed = {"results": [dict(base["results"][0], checksum=dict(sums, join_algorithm=0))]}
+        self.assertFalse(benchmark.compare(base, changed, tolerance=1.0)[0]["same_results"])
+
+    def test_servers_sweep(self):
+        swept = benchmark.run([self.sim], "small", repeat=1, only=["servers_sweep"])[0]
+        single = sum(r["scenarios"] for r in benchmark.run([self.sim], "small", repeat=1, only=benchmark.OPERATORS))
+        self.assertEqual(swept["scenarios"], single * len(benchmark.SWEEP_SERVERS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+# tests/test_placement.py
+# Replica sets add read capacity, not speed: a read costs the same whichever member serves it
+#
+# Usage: python -m pytest tests   or   python -m unittest discover -s tests
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from cost_engine import CostEngine  # noqa: E402
+from main import NoSQLSimulator  # noqa: E402
+from placement import load_placement  # noqa: E402
+from workload import WorkloadEvaluator, load_workload  # noqa: E402
+
+
+class ReadPreferenceTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = NoSQLSimulator(os.path.join(ROOT, "schemas", "db1.json"), os.path.join(ROOT, "stats.json"),
+                                  os.path.join(ROOT, "indexes.json"))
+        self.config = dict(load_placement(os.path.join(ROOT, "placement.json")), replication_factor=3)
+
+    def costs(self, preference):
+        self.sim.placement.configure(dict(self.config, read_preference=preference))
+        return CostEngine(self.sim).evaluate(collections=["Stock", "OrderLine", "OrderLine"],
+                                             operators=["filter", "join", "aggregate"],
+                                             shard_keys=["IDP", "IDP", "IDP"], others=[None, "Product", None],
+                                             fields=[None, None, "IDP"])
+
+    def total(self, preference, replication_factor=3):
+        self.sim.placement.configure(dict(self.config, read_preference=preference,
+                                          replication_factor=replication_factor))
+        rows = WorkloadEvaluator([self.sim], ["DB1"]).rows(load_workload(os.path.join(ROOT, "workload.json")))
+        return [row for row in rows if row["query"] == "TOTAL"][0]
+
+    def test_nearest_costs_the_same_work_as_primary(self):
+        self.assertEqual(self.sim.placement.read_members(), 1)
+        primary, nearest = self.costs("primary"), self.costs("nearest")
+        self.assertEqual(self.sim.placement.read_members(), 3)
+        for i, operator in enumerate(("filter", "join", "aggregate")):
+            with self.subTest(operator=operator):
+                # Nearest reads only save the cross-region round trip and transfer, not the query's work
+                self.assertAlmostEqual(float(nearest["price_usd"][i]), float(primary["price_usd"][i]), places=3)
+                self.assertLessEqual(float(nearest["price_usd"][i]), float(primary["price_usd"][i]))
+                self.assertLessEqual(float(nearest["time_seconds"][i]), float(primary["time_seconds"][i]))
+                self.assertEqual(int(nearest["docs_scanned"][i]), int(primary["docs_scanned"][i]))
+
+    def test_reads_spread_over_the_servers_of_every_member(self):
+        single, primary, nearest = self.total("primary", 1), self.total("primary"), self.total("nearest")
+        # Every member needs the servers of the load it serves: primary reads buy idle secondaries
+        self.assertGreaterEqual(primary["required_servers"], 3 * single["required_servers"])
+        self.assertLess(nearest["required_servers"], primary["required_servers"])
+        self.assertGreaterEqual(nearest["required_servers"], single["required_servers"])
+
+    def test_writes_are_not_spread(self):
+        costs = {}
+        for preference in ("primary", "nearest"):
+            self.sim.placement.configure(dict(self.config, read_preference=preference))
+            costs[preference] = CostEngine(self.sim).evaluate_one("Product", "update", "IDP", field="IDP")
+        self.assertEqual(costs["primary"]["price_usd"], costs["nearest"]["price_usd"])
+
+
+if __name__ == "__main__":
+    unittest.main()
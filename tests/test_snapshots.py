@@ -0,0 +1,156 @@
+# tests/test_snapshots.py
+# Snapshot tests: sizes, shard layouts and costs of DB1–DB5 must not change unnoticed
+#
+# snapshots/db_models.json holds, for every model: document / collection / database
+# sizes (logical and per storage format), the sharding report of every ID field
+# (hash and range), the engine's full output for the filter / join / aggregate /
+# write scenarios of benchmark.py, and the weighted workload rows (workload.py).
+# A refactor is accepted when every number matches to 1e-9 (relative). When a
+# change is meant to move the numbers, regenerate the snapshot and commit it with
+# the change:
+#   python tests/test_snapshots.py --update
+# Compressed sizes depend on the installed codecs (storage.py): the snapshot
+# records them, and where they differ the values derived from compressed sizes
+# (CODEC_FIELDS) are left out; everything else is still compared.
+#
+# Usage: python -m pytest tests   or   python -m unittest discover -s tests
+
+import json
+import math
+import os
+import sys
+import unittest
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import benchmark  # noqa: E402
+import storage  # noqa: E402
+from cost_engine import CostEngine  # noqa: E402
+from main import NoSQLSimulator  # noqa: E402
+from sharding import HASH, RANGE  # noqa: E402
+from workload import WorkloadEvaluator, load_workload  # noqa: E402
+
+SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots", "db_models.json")
+REL_TOL = 1e-9
+# Values that follow the compressed sizes: per model, and in the workload's TOTAL rows (stored bytes → servers)
+CODEC_FIELDS = {"models": ("compressed_gb",), "workload": ("storage_gb", "required_servers")}
+
+
+def codecs() -> Dict[str, bool]:
+    return {"python-snappy": storage.snappy is not None, "zstandard": storage.zstandard is not None}
+
+
+def plain(value: Any) -> Any:
+    """JSON form of an engine output value (NumPy scalars → Python numbers)"""
+    if hasattr(value, "item"):
+        return value.item()
+    if isinstance(value, dict):
+        return {k: plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(v) for v in value]
+    return value
+
+
+def model_outputs(sim) -> Dict[str, Any]:
+    """Everything the snapshot keeps for one model"""
+    outputs: Dict[str, Any] = {
+        "doc_bytes": {c: sim.compute_doc_size(c) for c in sim.collections},
+        "collection_gb": {c: sim.collection_size_gb(c) for c in sim.collections},
+        "database_gb": sim.database_size_gb(),
+        "stored_gb": {fmt: sim.database_size_gb(fmt, "none") for fmt in storage.FORMATS},
+        "compressed_gb": sim.storage.database_size_gb(),
+        "sharding": {f"{c}.{key}.{scheme}": sim.sharding_stats(c, key, scheme)
+                     for c in sim.collections for key in benchmark.id_fields(sim, c) for scheme in (HASH, RANGE)},
+        "costs": {},
+    }
+    engine = CostEngine(sim)
+    for operator in benchmark.OPERATORS:
+        batch = benchmark.scenarios([sim], operator)
+        costs = engine.evaluate(**batch)
+        for i in range(len(batch["collections"])):
+            label = " ".join(f"{column}={batch[column][i]}" for column in
+                             ("operators", "collections", "shard_keys", "others", "fields", "changes"))
+            outputs["costs"][label] = {key: plain(values[i]) for key, values in costs.items()}
+    return outputs
+
+
+def snapshot() -> Dict[str, Any]:
+    folder = os.path.join(ROOT, "schemas")
+    files = sorted(f for f in os.listdir(folder) if f.startswith("db") and f.endswith(".json"))
+    names = [f.replace('.json', '').upper() for f in files]
+    sims = [NoSQLSimulator(os.path.join(folder, f), os.path.join(ROOT, "stats.json"),
+                           os.path.join(ROOT, "indexes.json")) for f in files]
+    workload = load_workload(os.path.join(ROOT, "workload.json"))
+    return {
+        "codecs": codecs(),
+        "models": {name: model_outputs(sim) for name, sim in zip(names, sims)},
+        "workload": [plain(row) for row in WorkloadEvaluator(sims, names).rows(workload)],
+    }
+
+
+def without_codecs(snap: Dict[str, Any]) -> Dict[str, Any]:
+    """The snapshot without the values that depend on the installed codecs"""
+    models = {name: {k: v for k, v in outputs.items() if k not in CODEC_FIELDS["models"]}
+              for name, outputs in snap["models"].items()}
+    workload = [{k: v for k, v in row.items() if row.get("query") != "TOTAL" or k not in CODEC_FIELDS["workload"]}
+                for row in snap["workload"]]
+    return {**snap, "models": models, "workload": workload}
+
+
+def differences(expected: Any, actual: Any, path: str = "") -> List[str]:
+    """Paths where two snapshots differ (numbers compared to REL_TOL)"""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        found = [f"{path}.{k}: missing" for k in expected if k not in actual]
+        found += [f"{path}.{k}: unexpected" for k in actual if k not in expected]
+        for k in expected:
+            if k in actual:
+                found += differences(expected[k], actual[k], f"{path}.{k}")
+        return found
+    if isinstance(expected, list) and isinstance(actual, list):
+        if len(expected) != len(actual):
+            return [f"{path}: {len(expected)} items → {len(actual)}"]
+        return [d for i, (e, a) in enumerate(zip(expected, actual)) for d in differences(e, a, f"{path}[{i}]")]
+    numbers = (int, float)
+    if isinstance(expected, numbers) and isinstance(actual, numbers) and not isinstance(expected, bool):
+        if math.isclose(expected, actual, rel_tol=REL_TOL, abs_tol=1e-12):
+            return []
+    elif expected == actual:
+        return []
+    return [f"{path}: {expected!r} → {actual!r}"]
+
+
+class SnapshotTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(SNAPSHOT, 'r', encoding='utf-8') as f:
+            cls.expected = json.load(f)
+        cls.actual = json.loads(json.dumps(snapshot()))
+        if cls.expected["codecs"] != codecs():
+            # Snapshot taken with other codecs: compare everything but the compressed sizes
+            cls.expected, cls.actual = without_codecs(cls.expected), without_codecs(cls.actual)
+
+    def assertSame(self, expected, actual, path):
+        found = differences(expected, actual, path)
+        self.assertFalse(found, f"{len(found)} values changed:\n  " + "\n  ".join(found[:20]))
+
+    def test_models(self):
+        for name, expected in self.expected["models"].items():
+            with self.subTest(model=name):
+                self.assertIn(name, self.actual["models"])
+                for part in expected:
+                    self.assertSame(expected[part], self.actual["models"][name][part], f"{name}.{part}")
+
+    def test_workload(self):
+        self.assertSame(self.expected["workload"], self.actual["workload"], "workload")
+
+
+if __name__ == "__main__":
+    if "--update" in sys.argv:
+        os.makedirs(os.path.dirname(SNAPSHOT), exist_ok=True)
+        with open(SNAPSHOT, 'w', encoding='utf-8') as f:
+            json.dump(snapshot(), f, indent=1, sort_keys=True)
+        print(f"Snapshot written to {SNAPSHOT}")
+    else:
+        unittest.main()
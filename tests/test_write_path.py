@@ -0,0 +1,54 @@
+# tests/test_write_path.py
+# Writes of an entity kept in several places: every place is written, the costs add up
+#
+# Usage: python -m pytest tests   or   python -m unittest discover -s tests
+
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from indexes import load_index_file  # noqa: E402
+from main import NoSQLSimulator  # noqa: E402
+from write_path import embedding  # noqa: E402
+
+
+def schemas(name):
+    with open(os.path.join(ROOT, "schemas", name), 'r', encoding='utf-8') as f:
+        return {s["collection"]: s for s in json.load(f)}
+
+
+class EmbeddedWriteTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with open(os.path.join(ROOT, "stats.json"), 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+        indexes = load_index_file(os.path.join(ROOT, "indexes.json"))
+        db3, db4 = schemas("db3.json"), schemas("db4.json")
+        # Product copied into Stock (DB3) only, into OrderLine (DB4) only, and into both
+        cls.stock = NoSQLSimulator.from_data(list(db3.values()), stats, indexes)
+        cls.orderline = NoSQLSimulator.from_data([db4["OrderLine"], db3["Warehouse"], db3["Client"]], stats, indexes)
+        cls.both = NoSQLSimulator.from_data([db3["Stock"], db4["OrderLine"], db3["Warehouse"], db3["Client"]],
+                                            stats, indexes)
+
+    def test_every_root(self):
+        self.assertEqual([p["root"] for p in embedding(self.both, "Product")], ["Stock", "OrderLine"])
+        self.assertEqual([p["root"] for p in embedding(self.stock, "Product")], ["Stock"])
+
+    def test_fan_out_is_summed(self):
+        for operator in ("update", "delete"):
+            with self.subTest(operator=operator):
+                both = self.both.writes.cost(operator, "Product", "IDP", changes=["price"])
+                parts = [sim.writes.cost(operator, "Product", "IDP", changes=["price"])
+                         for sim in (self.stock, self.orderline)]
+                self.assertEqual(both["roots"], ["Stock", "OrderLine"])
+                for key in ("docs_written", "bytes_written", "index_writes"):
+                    self.assertEqual(both[key], sum(p[key] for p in parts), key)
+                self.assertAlmostEqual(both["price_usd"], sum(p["price_usd"] for p in parts))
+
+
+if __name__ == "__main__":
+    unittest.main()
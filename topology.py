@@ -0,0 +1,103 @@
+# topology.py
+# Cluster topology and data-movement cost: racks, NIC / uplink bandwidth, per-GB price and carbon
+#
+# Servers sit in racks of SERVERS_PER_RACK behind an oversubscribed rack uplink.
+# Distributed operators move data in a few patterns:
+#   shuffle   - every server re-partitions its slice on a new key (all-to-all)
+#   broadcast - one input is copied to every server (relayed once per rack)
+#   gather    - every server sends its slice to one node (router / primary shard)
+#   scatter   - one node spreads its data over every server (reverse of gather)
+#   transfer  - one server sends to one other server
+# movement() turns a pattern and its volume (bytes of the rows moved, i.e.
+# compute_doc_size of the carried fields × estimated rows) into seconds on the
+# busiest link, plus price and carbon for every byte that crosses the network;
+# per_byte() gives the same per byte of volume.
+
+import math
+from typing import Any, Dict
+
+NIC_GBPS = 10.0              # per server
+SERVERS_PER_RACK = 40
+RACK_UPLINK_GBPS = 100.0     # 4:1 oversubscribed (40 × 10 Gbit/s behind 100 Gbit/s)
+PRICE_USD_PER_GB = 0.01      # inter-zone transfer price
+CARBON_GRAMS_PER_GB = 5.0    # network energy (~0.01 kWh/GB) at ~500 g CO2/kWh
+
+PATTERNS = ("shuffle", "broadcast", "gather", "scatter", "transfer")
+
+
+class Topology:
+    def __init__(self, nic_gbps: float = NIC_GBPS, servers_per_rack: int = SERVERS_PER_RACK,
+                 rack_uplink_gbps: float = RACK_UPLINK_GBPS, price_per_gb: float = PRICE_USD_PER_GB,
+                 carbon_per_gb: float = CARBON_GRAMS_PER_GB):
+        """Cluster network settings; the server count comes from the simulator (sim.servers)"""
+        self.nic_gbps = nic_gbps
+        self.servers_per_rack = servers_per_rack
+        self.rack_uplink_gbps = rack_uplink_gbps
+        self.price_per_gb = price_per_gb
+        self.carbon_per_gb = carbon_per_gb
+
+    def _rates(self, servers: int):
+        """(NIC bytes/s, cross-rack bytes/s per server, share of all-to-all traffic leaving a rack)"""
+        nic = self.nic_gbps * 1e9 / 8
+        rack = min(servers, self.servers_per_rack)
+        uplink = self.rack_uplink_gbps * 1e9 / 8
+        cross_rack = min(nic, uplink / rack)
+        cross_share = (servers - rack) / servers if servers > 1 else 0.0
+        return nic, cross_rack, cross_share, uplink
+
+    def per_byte(self, pattern: str, servers: int):
+        """
+        (bytes moved, seconds) per byte of volume: every pattern is linear in its volume,
+        so a batch of movements is one multiplication (see cost_engine.py)
+        """
+        if pattern not in PATTERNS:
+            raise ValueError(f"Unknown data movement pattern {pattern!r}")
+        if servers <= 1 and pattern != "transfer":
+            return 0.0, 0.0
+        nic, cross_rack, cross_share, uplink = self._rates(servers)
+        if pattern == "shuffle":
+            moved = (servers - 1) / servers
+            per_server = moved / servers
+            seconds = per_server * ((1 - cross_share) / nic + cross_share / cross_rack)
+        elif pattern == "broadcast":
+            moved = servers - 1
+            racks = math.ceil(servers / self.servers_per_rack)
+            # Pipelined: every receiver NIC takes the input once, every rack uplink too
+            seconds = 1 / nic + (1 / uplink if racks > 1 else 0.0)
+        elif pattern in ("gather", "scatter"):
+            moved = (servers - 1) / servers
+            # One node's NIC carries everything; the part from other racks also crosses its uplink
+            seconds = max(moved / nic, moved * cross_share / uplink)
+        else:
+            moved = 1.0
+            seconds = 1 / nic
+        return moved, seconds
+
+    def movement(self, pattern: str, total_bytes: float, servers: int) -> Dict[str, Any]:
+        """
+        Seconds / price / carbon of moving `total_bytes` with a pattern over `servers` servers.
+        total_bytes is the whole input (shuffle / gather / scatter), the copied input
+        (broadcast) or the message (transfer).
+        """
+        moved, seconds = self.per_byte(pattern, servers)
+        if total_bytes <= 0 or not moved:
+            return {"pattern": pattern, "bytes_moved": 0, "seconds": 0.0, "price_usd": 0.0, "carbon_grams": 0.0}
+        moved *= total_bytes
+        gb = moved / 1024 ** 3
+        return {
+            "pattern": pattern,
+            "bytes_moved": int(moved),
+            "seconds": seconds * total_bytes,
+            "price_usd": gb * self.price_per_gb,
+            "carbon_grams": gb * self.carbon_per_gb,
+        }
+
+
+def combine(movements) -> Dict[str, Any]:
+    """Sum of several movements (done one after the other)"""
+    total = {"pattern": "+".join(m["pattern"] for m in movements if m["bytes_moved"]) or "none",
+             "bytes_moved": 0, "seconds": 0.0, "price_usd": 0.0, "carbon_grams": 0.0}
+    for m in movements:
+        for field in ("bytes_moved", "seconds", "price_usd", "carbon_grams"):
+            total[field] += m[field]
+    return total
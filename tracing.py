@@ -0,0 +1,285 @@
+# tracing.py
+# Opt-in instrumentation: every cost computation as a span, exported as a Chrome trace and a flat CSV
+#
+# Methods decorated with @traced (NoSQLSimulator sizes and filters / joins, the
+# QuerySimulator / AggregateSimulator operators, the cost engine and the models it
+# calls: sharding, index planner, joins, writes, aggregation, memory) record one
+# span per call while tracing is on: its inputs, the intermediate quantities it
+# reports with note(), its output and the wall-clock time of the call. Calls nest
+# (simulate_aggregate → evaluate → aggregation cost → plan_filter), so a
+# surprising number can be followed down to the operator, collection and field
+# that produced it, and self times show where a long model search spends its time.
+#
+# Tracing is off by default and a disabled @traced costs one global lookup per
+# call. Turn it on around a piece of code:
+#   tracer = tracing.enable()
+#   ...
+#   tracing.disable().export("trace.json")    # trace.json (chrome://tracing, Perfetto) + trace.csv
+# or for a whole script: NOSQL_TRACE=trace.json python test.py (run_final.py also takes --trace).
+# Only the calling process is traced (not the workers of model_search.py --workers).
+#
+# Usage: python tracing.py trace.json [--top 20]   (calls, total and self time per span name)
+
+import atexit
+import csv
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+MAX_SPANS = 1_000_000        # spans kept per tracer; later ones are counted as dropped
+MAX_ITEMS = 8                # sequences / mappings longer than this are summarised
+MAX_TEXT = 120               # characters kept of a string input or output
+
+_tracer: Optional["Tracer"] = None
+
+
+def summarize(value: Any, depth: int = 0) -> Any:
+    """JSON-friendly, bounded form of an input / output (long lists become their length)"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return value if len(value) <= MAX_TEXT else value[:MAX_TEXT] + "..."
+    if hasattr(value, "item") and getattr(value, "ndim", 1) == 0:
+        return value.item()                                   # NumPy scalar
+    if hasattr(value, "tolist"):                              # NumPy array
+        if depth >= 2 or len(value) > MAX_ITEMS:
+            return f"[{len(value)} items]"
+        value = value.tolist()
+    if isinstance(value, dict):
+        if depth >= 2 or len(value) > 4 * MAX_ITEMS:
+            return f"{{{len(value)} keys}}"
+        return {str(k): summarize(v, depth + 1) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        if depth >= 2 or len(value) > MAX_ITEMS:
+            return f"[{len(value)} items]"
+        return [summarize(v, depth + 1) for v in value]
+    if hasattr(value, "describe"):
+        return value.describe()                               # AggregateSpec, plan nodes
+    return type(value).__name__
+
+
+class Span:
+    """One traced call: where it sits in the call tree, what went in and out, how long it took"""
+
+    __slots__ = ("span_id", "parent_id", "depth", "name", "category", "thread", "inputs", "notes", "output",
+                 "start", "duration")
+
+    def __init__(self, span_id: int, parent_id: Optional[int], depth: int, name: str, category: str,
+                 thread: int, inputs: Dict[str, Any]):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.depth = depth
+        self.name = name
+        self.category = category
+        self.thread = thread
+        self.inputs = inputs
+        self.notes: Dict[str, Any] = {}
+        self.output: Any = None
+        self.start = 0.0
+        self.duration = 0.0
+
+
+class Tracer:
+    def __init__(self, max_spans: int = MAX_SPANS):
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current(self) -> Optional[Span]:
+        """Innermost open span of the calling thread"""
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def call(self, function: Callable, name: str, category: str, signature: Optional[inspect.Signature],
+             args: tuple, kwargs: Dict[str, Any]) -> Any:
+        """Run function(*args, **kwargs) inside a new span"""
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        with self._lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                span = None
+            else:
+                span = Span(len(self.spans), parent.span_id if parent else None, len(stack), name, category,
+                            threading.get_ident(), self._inputs(signature, args, kwargs))
+                self.spans.append(span)
+        if span is None:
+            return function(*args, **kwargs)
+        stack.append(span)
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            span.duration = time.perf_counter() - start
+            span.start = start - self.origin
+            stack.pop()
+        span.output = summarize(result)
+        return result
+
+    @staticmethod
+    def _inputs(signature: Optional[inspect.Signature], args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        if signature is None:
+            return {"args": summarize(list(args)), **{k: summarize(v) for k, v in kwargs.items()}}
+        try:
+            bound = signature.bind_partial(*args, **kwargs).arguments
+        except TypeError:
+            bound = {"args": args, **kwargs}
+        return {k: summarize(v) for k, v in bound.items() if k != "self"}
+
+    def self_seconds(self) -> List[float]:
+        """Duration of every span minus the time spent in its child spans"""
+        own = [span.duration for span in self.spans]
+        for span in self.spans:
+            if span.parent_id is not None:
+                own[span.parent_id] -= span.duration
+        return own
+
+    def chrome(self) -> Dict[str, Any]:
+        """Chrome trace event format: one complete ("X") event per span, times in microseconds"""
+        pid = os.getpid()
+        events = [{
+            "name": span.name,
+            "cat": span.category,
+            "ph": "X",
+            "ts": round(span.start * 1e6, 3),
+            "dur": round(span.duration * 1e6, 3),
+            "pid": pid,
+            "tid": span.thread,
+            "args": {"inputs": span.inputs, "notes": span.notes, "output": span.output},
+        } for span in self.spans]
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"spans": len(self.spans), "dropped": self.dropped}}
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Flat rows, one per span, inputs / notes / output as JSON text"""
+        own = self.self_seconds()
+        return [{
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "depth": span.depth,
+            "name": span.name,
+            "category": span.category,
+            "start_us": round(span.start * 1e6, 3),
+            "duration_us": round(span.duration * 1e6, 3),
+            "self_us": round(own[span.span_id] * 1e6, 3),
+            "inputs": json.dumps(span.inputs, default=str),
+            "notes": json.dumps(span.notes, default=str),
+            "output": json.dumps(span.output, default=str),
+        } for span in self.spans]
+
+    def export(self, path: str, csv_path: Optional[str] = None) -> None:
+        """Write the Chrome trace to `path` and the flat rows to csv_path (default: path with .csv)"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome(), f, default=str)
+        csv_path = csv_path or os.path.splitext(path)[0] + ".csv"
+        rows = self.rows()
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["span_id"])
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+def enable(max_spans: int = MAX_SPANS) -> Tracer:
+    """Start recording spans in a new tracer (replacing the current one)"""
+    global _tracer
+    _tracer = Tracer(max_spans)
+    return _tracer
+
+
+def disable() -> Optional[Tracer]:
+    """Stop recording; returns the tracer with the spans recorded so far"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def active() -> Optional[Tracer]:
+    return _tracer
+
+
+def note(**values: Any) -> None:
+    """Attach intermediate quantities to the innermost open span (nothing when tracing is off)"""
+    tracer = _tracer
+    if tracer is None:
+        return
+    span = tracer.current()
+    if span is not None:
+        span.notes.update((k, summarize(v)) for k, v in values.items())
+
+
+def traced(function: Callable) -> Callable:
+    """Record every call of `function` as a span while tracing is enabled"""
+    name = function.__qualname__
+    category = function.__module__
+    try:
+        signature: Optional[inspect.Signature] = inspect.signature(function)
+    except (TypeError, ValueError):
+        signature = None
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        tracer = _tracer
+        if tracer is None:
+            return function(*args, **kwargs)
+        return tracer.call(function, name, category, signature, args, kwargs)
+
+    return wrapper
+
+
+def summary(trace: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Calls, total and self milliseconds per span name of a Chrome trace, by self time"""
+    events = trace["traceEvents"]
+    children: Dict[tuple, float] = {}
+    # Parents contain their children in time on the same thread: an interval stack per thread
+    stacks: Dict[Any, List[tuple]] = {}
+    for i, event in sorted(enumerate(events), key=lambda e: (e[1]["tid"], e[1]["ts"], -e[1]["dur"])):
+        stack = stacks.setdefault(event["tid"], [])
+        while stack and stack[-1][1] <= event["ts"]:
+            stack.pop()
+        if stack:
+            children[stack[-1][0]] = children.get(stack[-1][0], 0.0) + event["dur"]
+        stack.append((i, event["ts"] + event["dur"]))
+    totals: Dict[str, Dict[str, Any]] = {}
+    for i, event in enumerate(events):
+        t = totals.setdefault(event["name"], {"name": event["name"], "calls": 0, "total_ms": 0.0, "self_ms": 0.0})
+        t["calls"] += 1
+        t["total_ms"] += event["dur"] / 1000
+        t["self_ms"] += (event["dur"] - children.get(i, 0.0)) / 1000
+    return sorted(totals.values(), key=lambda t: -t["self_ms"])
+
+
+# NOSQL_TRACE=trace.json traces a whole run and exports it when the interpreter exits
+if os.environ.get("NOSQL_TRACE"):
+    _path = os.environ["NOSQL_TRACE"]
+    enable()
+    atexit.register(lambda: _tracer is not None and _tracer.export(_path))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Per-name totals of an exported Chrome trace")
+    parser.add_argument("trace", help="trace JSON written by Tracer.export()")
+    parser.add_argument("--top", type=int, default=20, help="span names to show")
+    args = parser.parse_args()
+
+    with open(args.trace, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    print(f"TRACE: {len(data['traceEvents']):,} spans"
+          + (f" ({data['otherData']['dropped']:,} dropped)" if data.get("otherData", {}).get("dropped") else ""))
+    print(f"{'Span':<44}{'Calls':>12}{'Total ms':>14}{'Self ms':>14}")
+    for t in summary(data)[:args.top]:
+        print(f"{t['name']:<44}{t['calls']:>12,}{t['total_ms']:>14,.2f}{t['self_ms']:>14,.2f}")
@@ -0,0 +1,240 @@
+# workload.py
+# Weighted workloads: queries with frequencies and latency SLOs, evaluated per hour
+#
+# A workload file (e.g. workload.json) lists the queries of the application:
+#   { "name": "shop",
+#     "queries": [
+#       { "name": "stock_of_product", "operator": "filter", "collection": "Stock",
+#         "shard_key": "IDP", "field": "IDP", "per_second": 500, "slo_seconds": 10 },
+#       { "name": "sales_per_product", "operator": "aggregate", "collection": "OrderLine",
+#         "shard_key": "IDP", "group_by": "IDP", "per_hour": 1 } ] }
+# Aggregates may group by several fields and name their functions and a pre-filter
+# (see aggregation.py): "group_by": ["IDC"], "functions": [["sum", "quantity"]],
+# "where": ["eq", "IDP", null].
+# Frequencies: per_second, per_minute or per_hour. Joins name the other side in "other".
+# Writes (insert / update / delete, see write_path.py) name the written entity, the
+# field locating its documents and, for updates, the changed fields:
+#       { "name": "price_change", "operator": "update", "collection": "Product",
+#         "shard_key": "IDP", "field": "IDP", "changes": ["price"], "per_minute": 10 }
+#
+# A collection a model does not have is read from the collection embedding it
+# (DB2 keeps Stock inside Product): its per-document work is charged by document
+# size relative to the first model that has it, its disk reads by the stored size
+# of the root (cost_engine.scale_documents, the convention of model_search.py); a join
+# of two collections stored together costs a scan of their shared root.
+#
+# WorkloadEvaluator streams one row per (model, query) and one TOTAL row per model
+# with hourly price, carbon, CPU-seconds and the servers needed to run the mix.
+
+import csv
+import json
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from aggregation import AggregateSpec
+from cost_engine import WRITE_OPERATORS, CostEngine, scale_documents
+from write_path import embedding
+
+TARGET_UTILIZATION = 0.7     # servers are sized to run at most 70% busy
+SERVER_DISK_GB = 2048        # data (collections + indexes) held by one server
+FREQUENCY_UNITS = {"per_second": 3600, "per_minute": 60, "per_hour": 1}
+FIELDS = [
+    "model", "query", "operator", "collection", "root", "per_hour", "docs_scanned", "plan",
+    "latency_seconds", "slo_seconds", "slo_met", "price_usd_per_query", "hourly_price_usd",
+    "hourly_carbon_grams", "servers_touched", "cpu_seconds_per_hour", "docs_written", "bytes_written",
+    "storage_gb", "required_servers", "slo_violations",
+]
+
+
+def load_workload(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def per_hour(query: Dict[str, Any]) -> float:
+    """Executions per hour of a workload query"""
+    for unit, factor in FREQUENCY_UNITS.items():
+        if unit in query:
+            return float(query[unit]) * factor
+    raise ValueError(f"Query {query.get('name')} has no frequency ({', '.join(FREQUENCY_UNITS)})")
+
+
+def resolve_collection(sim, collection: str) -> str:
+    """Collection holding `collection`'s documents in this model (itself, or the first one embedding it)"""
+    return embedding(sim, collection)[0]["root"]
+
+
+class WorkloadEvaluator:
+    def __init__(self, simulators: List[Any], names: List[str]):
+        """One NoSQLSimulator per model, with its display name (DB1...)"""
+        self.sims = simulators
+        self.names = names
+        self.engine = CostEngine(simulators)
+
+    def _base_size(self, collection: str) -> float:
+        """Document size in the first model that stores the collection on its own"""
+        for sim in self.sims:
+            if sim.get_collection_schema(collection):
+                return sim.compute_doc_size(collection)
+        return 1
+
+    def _scenario(self, m: int, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Engine arguments of one query on one model, after resolving embedded collections"""
+        sim = self.sims[m]
+        operator = query["operator"]
+        if operator not in ("filter", "join", "aggregate") + WRITE_OPERATORS:
+            raise ValueError(f"Unknown operator {operator} in query {query.get('name')}")
+        root = resolve_collection(sim, query["collection"])
+        fields = sim.get_collection_schema(root)
+        key = query.get("shard_key")
+        if operator in WRITE_OPERATORS:
+            # The write model follows the embedding itself; its costs are already model-specific
+            return {"collection": query["collection"], "root": root, "operator": operator,
+                    "shard_key": key if key in fields else None, "other": None, "field": query.get("field"),
+                    "value": None, "changes": query.get("changes"), "size_factor": 1.0, "colocated": False,
+                    "aggregate": None}
+        other = resolve_collection(sim, query["other"]) if operator == "join" else None
+        colocated = other == root
+        if colocated:
+            operator, other = "filter", None      # both sides live in one document: a scan, no join
+        field = query.get("group_by") if query["operator"] == "aggregate" else query.get("field")
+        aggregate = None
+        if operator == "aggregate" and (isinstance(field, list) or query.get("functions") or query.get("where")):
+            aggregate = AggregateSpec.from_query(query)
+            grouped = all(key in fields for key in aggregate.group_by)
+            if not grouped or not all(sim.aggregation.has_field(root, f) for _, f in aggregate.functions if f):
+                aggregate = None     # grouped inside embedded documents: the rough ungrouped estimate
+            field = None
+        return {
+            "collection": root,
+            "root": root,
+            "operator": operator,
+            "shard_key": key if key in fields else None,
+            "other": other,
+            "field": field if field in fields else None,
+            "value": query.get("value"),
+            "size_factor": sim.compute_doc_size(root) / max(1, self._base_size(query["collection"])),
+            "colocated": colocated,
+            "changes": None,
+            "aggregate": aggregate,
+        }
+
+    def _servers_touched(self, m: int, scenario: Dict[str, Any]) -> int:
+        """Targeted filters and writes (on the shard key) hit one server, other sharded work every server"""
+        if not scenario["shard_key"]:
+            return 1
+        targeted = scenario["field"] in (None, scenario["shard_key"]) and not scenario["colocated"]
+        if scenario["operator"] in ("filter",) + WRITE_OPERATORS and targeted:
+            return 1
+        return self.sims[m].servers
+
+    def costed(self, workload: Dict[str, Any]):
+        """[(model, query, scenario)] for every (model, query) pair and their engine costs, in one batch"""
+        scenarios = [(m, q, self._scenario(m, q)) for m in range(len(self.sims)) for q in workload["queries"]]
+        costs = self.engine.evaluate(
+            collections=[s["collection"] for _, _, s in scenarios],
+            operators=[s["operator"] for _, _, s in scenarios],
+            shard_keys=[s["shard_key"] for _, _, s in scenarios],
+            models=[m for m, _, _ in scenarios],
+            others=[s["other"] for _, _, s in scenarios],
+            fields=[s["field"] for _, _, s in scenarios],
+            values=[s["value"] for _, _, s in scenarios],
+            changes=[s["changes"] for _, _, s in scenarios],
+            aggregates=[s["aggregate"] for _, _, s in scenarios],
+        )
+        return scenarios, costs
+
+    def rows(self, workload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """One row per (model, query), then a TOTAL row per model"""
+        queries = workload["queries"]
+        scenarios, costs = self.costed(workload)
+
+        totals: Dict[int, Dict[str, float]] = {}
+        for i, (m, query, s) in enumerate(scenarios):
+            rate = per_hour(query)
+            latency, carbon, price = scale_documents(
+                s["operator"], float(costs["time_seconds"][i]), float(costs["carbon_grams"][i]),
+                float(costs["price_usd"][i]), costs["disk_seconds"][i], s["size_factor"])
+            touched = self._servers_touched(m, s)
+            slo = query.get("slo_seconds")
+            row = {
+                "model": self.names[m],
+                "query": query.get("name", f"query{i % len(queries)}"),
+                "operator": s["operator"],
+                "collection": query["collection"],
+                "root": s["root"],
+                "per_hour": rate,
+                "docs_scanned": int(costs["docs_scanned"][i]),
+                "plan": costs["join_algorithm"][i] or costs["aggregate_strategy"][i] or costs["access_path"][i],
+                "latency_seconds": round(latency, 4),
+                "slo_seconds": slo,
+                "slo_met": slo is None or latency <= slo,
+                "price_usd_per_query": round(price, 8),
+                "hourly_price_usd": round(price * rate, 6),
+                "hourly_carbon_grams": round(carbon * rate, 4),
+                "servers_touched": touched,
+                "cpu_seconds_per_hour": round(latency * touched * rate, 4),
+                "docs_written": int(costs["docs_written"][i]),
+                "bytes_written": int(costs["bytes_written"][i]),
+            }
+            t = totals.setdefault(m, {"per_hour": 0.0, "hourly_price_usd": 0.0, "hourly_carbon_grams": 0.0,
+                                      "cpu_seconds_per_hour": 0.0, "write_cpu_seconds_per_hour": 0.0,
+                                      "slo_violations": 0})
+            for field in ("per_hour", "hourly_price_usd", "hourly_carbon_grams", "cpu_seconds_per_hour"):
+                t[field] += row[field]
+            if s["operator"] in WRITE_OPERATORS:
+                t["write_cpu_seconds_per_hour"] += row["cpu_seconds_per_hour"]
+            t["slo_violations"] += not row["slo_met"]
+            yield row
+
+            if i % len(queries) == len(queries) - 1:
+                yield self._total_row(m, totals[m])
+
+    def _total_row(self, m: int, t: Dict[str, float]) -> Dict[str, Any]:
+        """
+        Model totals; servers are the larger of the CPU and the storage requirement
+        (stored bytes of every replica, see placement.py). Every member of a replica
+        set applies the writes and takes its share of the reads (read_members); the
+        servers one member needs are bought once per member
+        """
+        sim = self.sims[m]
+        placement = sim.placement
+        storage_gb = ((sim.storage.database_size_gb() + sim.indexes.total_index_size_gb())
+                      * placement.replication_factor)
+        writes = t["write_cpu_seconds_per_hour"]
+        per_member = (t["cpu_seconds_per_hour"] - writes) / placement.read_members() + writes
+        compute = math.ceil(per_member / 3600 / TARGET_UTILIZATION) * placement.replication_factor
+        return {
+            "model": self.names[m],
+            "query": "TOTAL",
+            "per_hour": round(t["per_hour"], 2),
+            "hourly_price_usd": round(t["hourly_price_usd"], 6),
+            "hourly_carbon_grams": round(t["hourly_carbon_grams"], 4),
+            "cpu_seconds_per_hour": round(t["cpu_seconds_per_hour"], 4),
+            "storage_gb": round(storage_gb, 2),
+            "required_servers": max(1, compute, math.ceil(storage_gb / SERVER_DISK_GB)),
+            "slo_violations": t["slo_violations"],
+        }
+
+
+def stream_rows(rows: Iterable[Dict[str, Any]], csv_path: Optional[str] = None,
+                json_path: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Pass rows through while appending each one to a CSV and / or JSON Lines file"""
+    csv_file = open(csv_path, 'w', newline='', encoding='utf-8') if csv_path else None
+    json_file = open(json_path, 'w', encoding='utf-8') if json_path else None
+    try:
+        writer = csv.DictWriter(csv_file, fieldnames=FIELDS) if csv_file else None
+        if writer:
+            writer.writeheader()
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+                csv_file.flush()
+            if json_file:
+                json_file.write(json.dumps(row) + "\n")
+                json_file.flush()
+            yield row
+    finally:
+        for f in (csv_file, json_file):
+            if f:
+                f.close()
@@ -0,0 +1,149 @@
+# write_path.py
+# Write path: insert / update / delete costs, with the update amplification of embedding
+#
+# Where an entity is stored decides what one write touches (see embedding()):
+#   root   - its own collection: one document (with everything it embeds)
+#   array  - an array inside a parent (DB5 OrderLines in Product, DB2 Stock in Product):
+#            the whole parent document is rewritten
+#   object - a copy inside every referencing document (DB4 Product in each OrderLine):
+#            every copy is rewritten, cardinality(root) / cardinality(entity) of them
+# An entity kept in several places (its own collection and copies, or copies in
+# several roots: Product in Stock and in OrderLine) is written in every one of
+# them, one after the other: the costs of the places add up.
+#
+# The documents to rewrite are found with the index-or-scan planner (indexes.py)
+# and rewritten whole, at OPERATOR_COSTS["write"] per page of the stored,
+# compressed document (storage.py: a 9 MB DB5 Product is ~800 pages, a DB1
+# OrderLine one), and every index on a changed field is maintained
+# (IndexModel.maintenance).
+# Latency is the busiest shard's part of the work; carbon and price cover the
+# work on every shard, since a fan-out write is paid in full even in parallel.
+
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+from cost_engine import OPERATOR_COSTS, WRITE_OPERATORS
+from indexes import PAGE_BYTES
+from tracing import note, traced
+
+
+def embedding(sim, entity: str) -> List[Dict[str, Any]]:
+    """
+    Every place an entity's documents live: [{"root", "path" (embedding field), "kind"}],
+    its own collection first when it has one
+    """
+    places = [{"root": entity, "path": None, "kind": "root"}] if sim.get_collection_schema(entity) else []
+    name = entity.lower()
+    for root, props in sim.collections.items():
+        for field, spec in props.items():
+            if root != entity and field.lower() in (name, name + "s"):
+                places.append({"root": root, "path": field,
+                               "kind": "array" if spec.get("type") == "array" else "object"})
+    if not places:
+        raise ValueError(f"Collection {entity} is neither stored nor embedded in this model")
+    return places
+
+
+class WriteModel:
+    def __init__(self, nosql_simulator):
+        """Connects to the main NoSQLSimulator (stats, indexes, sharding, document sizes)"""
+        self.sim = nosql_simulator
+
+    def copies(self, entity: str, place: Dict[str, Any]) -> int:
+        """Documents holding one entity: one, or one per referencing document when embedded as an object"""
+        if place["kind"] != "object":
+            return 1
+        card = self.sim.stats.get("cardinality", {})
+        return max(1, math.ceil(card.get(place["root"], 0) / max(1, card.get(entity, 1))))
+
+    def _changed_fields(self, operator: str, place: Dict[str, Any],
+                        changes: Optional[Sequence[str]]) -> Optional[List[str]]:
+        """Root fields whose indexes change; None = every index (new or removed root documents)"""
+        if place["kind"] == "root":
+            return list(changes) if operator == "update" and changes else None
+        path = place["path"]
+        if operator == "update" and changes:
+            return [f"{path}.{field}" for field in changes]
+        # The embedded entity appears or disappears: every index under its path changes
+        return [f for index in self.sim.indexes.indexes(place["root"]) for f in index["fields"]
+                if f == path or f.startswith(path + ".")]
+
+    def _place_cost(self, operator: str, entity: str, place: Dict[str, Any], field: Optional[str],
+                    shard_key: Optional[str], changes: Optional[Sequence[str]], servers: int) -> Dict[str, Any]:
+        """The write in one place of the entity (its root sharded on shard_key if it has that field)"""
+        sim = self.sim
+        root = place["root"]
+        if shard_key not in sim.get_collection_schema(root):
+            shard_key = None
+        card = sim.stats.get("cardinality", {}).get(root, 0)
+        if operator == "insert" and place["kind"] == "object":
+            docs = 0      # copies only appear when a referencing document is written
+        else:
+            docs = self.copies(entity, place)
+
+        # Find the documents to rewrite (a new root document needs no lookup)
+        locate = {"access_path": None, "docs_examined": 0, "cost_docs": 0.0}
+        located_on = 1
+        if docs and not (operator == "insert" and place["kind"] == "root"):
+            key = field if field in sim.get_collection_schema(root) else None
+            locate = sim.indexes.plan_filter(root, key, shard_key, servers, min(1.0, docs / card) if card else 1.0)
+            located_on = servers if shard_key and shard_key != key else 1
+
+        # Spread of the rewritten documents: one shard when sharded on the locating key
+        shards = min(servers, docs) if shard_key and shard_key != field and docs else 1
+        busiest = math.ceil(docs / shards) if docs else 0
+        doc_bytes = sim.storage.stored_doc_size(root)     # rewritten as compressed blocks (storage.py)
+        pages = max(1, math.ceil(doc_bytes / PAGE_BYTES))
+        maintenance = sim.indexes.maintenance(root, docs, self._changed_fields(operator, place, changes))
+        index_per_doc = maintenance["cost_docs"] / docs if docs else 0.0
+        note(root=root, docs=docs, doc_bytes=doc_bytes, pages=pages, shards=shards, located_on=located_on,
+             index_cost_per_doc=index_per_doc)
+
+        read_s, _, _ = OPERATOR_COSTS["filter"]
+        write_s, write_carbon, write_price = OPERATOR_COSTS["write"]
+
+        def seconds(located_docs, written_docs):
+            return located_docs * read_s + written_docs * (pages * write_s + index_per_doc * read_s)
+
+        work = seconds(locate["cost_docs"] * located_on, docs)
+        return {
+            "access_path": locate["access_path"],
+            "docs_scanned": locate["docs_examined"],
+            "docs_written": docs,
+            "bytes_written": math.ceil(docs * doc_bytes),
+            "pages_written": docs * pages,
+            "shards": shards,
+            "index_writes": maintenance["index_writes"],
+            "indexes_touched": maintenance["indexes_touched"],
+            "time_seconds": seconds(locate["cost_docs"], busiest),
+            "carbon_grams": work * write_carbon / write_s,
+            "price_usd": work * write_price / write_s,
+        }
+
+    @traced
+    def cost(self, operator: str, entity: str, field: Optional[str] = None, shard_key: Optional[str] = None,
+             changes: Optional[Sequence[str]] = None, servers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        One write of `entity` located by `field` (e.g. update Product where IDP = ?,
+        changing ["price"]) on root collections sharded on `shard_key`, summed over every
+        place the entity is kept (root / embedding / access path: of the first place)
+        """
+        if operator not in WRITE_OPERATORS:
+            raise ValueError(f"Unknown write operator {operator!r} ({', '.join(WRITE_OPERATORS)})")
+        servers = servers or self.sim.servers
+        places = embedding(self.sim, entity)
+        costs = [self._place_cost(operator, entity, place, field, shard_key, changes, servers) for place in places]
+        total = {
+            "operator": operator,
+            "collection": entity,
+            "root": places[0]["root"],
+            "roots": [place["root"] for place in places],
+            "embedding": places[0]["kind"],
+            "access_path": costs[0]["access_path"],
+            "shards": max(c["shards"] for c in costs),
+            "indexes_touched": [fields for c in costs for fields in c["indexes_touched"]],
+        }
+        for key in ("docs_scanned", "docs_written", "bytes_written", "pages_written", "index_writes",
+                    "time_seconds", "carbon_grams", "price_usd"):
+            total[key] = sum(c[key] for c in costs)
+        return total